@@ -0,0 +1,156 @@
+"""
+Запуск без интерактивного меню:
+
+    python cli.py create-db [--groups]      создать базу (одиночные аккаунты / группы)
+    python cli.py run N                     режим N (1-5)
+    python cli.py cancel-all                режим 4
+    python cli.py stats                     режим 5
+    python cli.py worker                    воркер координатора
+    python cli.py                           интерактивное меню, как main.py
+
+Пароль базы берётся из переменной ETHEREAL_PASSWORD (--password-env)
+или первой строки файлового дескриптора (--password-fd). --config
+settings.toml (или .yaml при установленном PyYAML) переопределяет
+значения settings.py до импорта модулей софта, поэтому --help и разбор
+аргументов не грузят aiohttp, cryptography и остальное.
+"""
+from typing import Any, Dict, List, Optional
+import argparse
+import os
+import settings
+
+
+MODE_COMMANDS = {
+    "cancel-all": 4,
+    "stats": 5,
+}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="cli.py", description="Ethereal trading soft")
+    parser.add_argument("--config", default=os.environ.get("ETHEREAL_CONFIG"),
+                        help="TOML/YAML файл, переопределяющий settings.py")
+    parser.add_argument("--threads", type=int, help="одновременных аккаунтов (THREADS)")
+    parser.add_argument("--processes", type=int, help="процессов для аккаунтов (PROCESSES)")
+    parser.add_argument("--password-env", default="ETHEREAL_PASSWORD", metavar="NAME",
+                        help="переменная окружения с паролем базы")
+    parser.add_argument("--password-fd", type=int, metavar="FD", help="прочитать пароль базы из дескриптора")
+
+    commands = parser.add_subparsers(dest="command", metavar="command")
+
+    create_db = commands.add_parser("create-db", help="создать базу из input_data")
+    create_db.add_argument("--groups", action="store_true", help="дельта-нейтральные группы вместо аккаунтов")
+
+    run = commands.add_parser("run", help="запустить режим")
+    run.add_argument("mode", type=int, choices=[1, 2, 3, 4, 5])
+
+    commands.add_parser("cancel-all", help="отменить ордеры и закрыть позиции (режим 4)")
+    commands.add_parser("stats", help="собрать статистику (режим 5)")
+
+    worker = commands.add_parser("worker", help="выполнять задачи координатора")
+    worker.add_argument("--shard", type=int, help="шард воркера (задаёт родительский процесс)")
+
+    return parser
+
+
+def load_config(file_name: str) -> Dict[str, Any]:
+    """Прочитать файл конфигурации: TOML или YAML"""
+    if file_name.endswith((".yaml", ".yml")):
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError("YAML config requires PyYAML (pip install pyyaml), or use TOML")
+        with open(file_name, encoding="utf-8") as f:
+            return yaml.safe_load(f) or {}
+
+    import tomllib
+    with open(file_name, "rb") as f:
+        return tomllib.load(f)
+
+
+def apply_config(config: Dict[str, Any], target=settings) -> List[str]:
+    """
+    Переопределить настройки. Словари обновляются на месте (по ключам
+    верхнего уровня), списки становятся кортежами там, где были кортежи.
+    Неизвестный ключ - ошибка, чтобы опечатка не молча игнорировалась
+    """
+    applied = []
+    for name, value in config.items():
+        if not name.isupper() or not hasattr(target, name):
+            raise ValueError(f"Unknown setting {name}")
+
+        current = getattr(target, name)
+        if isinstance(current, dict) and isinstance(value, dict):
+            current.update(value)
+        else:
+            if isinstance(current, tuple) and isinstance(value, list):
+                value = tuple(value)
+            setattr(target, name, value)
+        applied.append(name)
+    return applied
+
+
+def read_password(args: argparse.Namespace) -> Optional[str]:
+    """Пароль базы из дескриптора или окружения (None - спросить в консоли)"""
+    if args.password_fd is not None:
+        with os.fdopen(args.password_fd, encoding="utf-8") as f:
+            return f.readline().rstrip("\r\n")
+
+    # Дочерним процессам пароль не нужен - ключи расшифровывает родитель
+    return os.environ.pop(args.password_env, None)
+
+
+def main(argv: Optional[List[str]] = None, app=None):
+    """
+    Точка входа. app - уже импортированный main (запуск через main.py);
+    иначе main импортируется после применения конфигурации
+    """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+
+    if args.config:
+        if app is not None:
+            parser.error("--config is applied before the soft is imported, run it with python cli.py")
+        try:
+            apply_config(load_config(args.config))
+        except (OSError, ValueError) as e:
+            parser.error(f"config {args.config}: {e}")
+        # Дочерние процессы --processes читают ту же конфигурацию
+        os.environ["ETHEREAL_CONFIG"] = os.path.abspath(args.config)
+
+    if args.threads is not None:
+        settings.THREADS = args.threads
+    if args.processes is not None:
+        settings.PROCESSES = args.processes
+
+    # Проверить настройки один раз, до импорта остального софта
+    from modules.config import get_settings
+    from modules.retry import SettingsError
+    try:
+        get_settings()
+    except SettingsError as e:
+        parser.error(str(e))
+
+    import asyncio
+    if os.name == "nt":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
+    if app is None:
+        import main as app
+
+    if args.command == "worker":
+        asyncio.run(app.run_worker(shard=args.shard, threads=settings.THREADS))
+        return
+
+    password = read_password(args)
+    if args.command is None:
+        app.interactive(password=password)
+    elif args.command == "create-db":
+        raise SystemExit(app.headless(mode=102 if args.groups else 101, password=password))
+    else:
+        mode = MODE_COMMANDS.get(args.command) or args.mode
+        raise SystemExit(app.headless(mode=mode, password=password))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,26 @@
-from os import name as os_name
+from os import name as os_name, getpid, environ, path as os_path
+from socket import gethostname
+from sys import executable, modules as sys_modules
+from tempfile import gettempdir
 from random import randint
+from secrets import token_hex
 from loguru import logger
 from time import sleep
 import asyncio
 from modules.retry import DataBaseError
 from modules.utils import choose_mode, async_sleep
 from modules import *
+from modules.pool import SESSION_POOL
+from modules.cache import MARKET_CACHE
+from modules.stream import start_market_stream, stop_market_stream
+from modules.tracker import ORDER_TRACKER
+from modules.monitor import DELTA_MONITOR, MonitorServer
+from modules.metrics import REGISTRY, MetricsServer, summary as metrics_summary, summary_loop
+from modules.stats import get_stats_collector, save_portfolio_snapshot
+from modules.scheduler import Scheduler
+from modules.distributed import Connection, Coordinator, RemoteDataBase, RemoteTgReport, Worker
+from modules.recovery import Recovery
+from modules.storage import checkpoint_key
 import settings
 
 
@@ -15,7 +30,13 @@ def initialize_account(module_data: dict, group_data: dict = None):
         private_key=module_data["apikey"],
         label=module_data["label"],
         proxy=module_data.get("proxy"),
-        base_url=settings.ETHEREAL_API_URL
+        base_url=settings.ETHEREAL_API_URL,
+        address=module_data["address"],
+    )
+    DELTA_MONITOR.register(
+        module_data["address"],
+        browser,
+        group_number=group_data["group_number"] if group_data else None,
     )
 
     ethereal_client = EtherealClient(
@@ -27,162 +48,395 @@ def initialize_account(module_data: dict, group_data: dict = None):
         proxy=module_data.get("proxy"),
         db=db,
         group_data=group_data,
+        checkpoint_key=checkpoint_key(module_data["encoded_apikey"], module_data["module_info"])
+        if group_data is None and module_data.get("module_info") else None,
     )
 
     return ethereal_client
 
 
-# Global address locks
-address_locks = {}
+tg_report = TgReport()
 
 
-async def run_modules(mode: int, module_data: dict, sem: asyncio.Semaphore):
+async def run_modules(mode: int, module_data: dict):
     """Запустить модуль торговли"""
-    address = module_data["address"]
-
-    # Создать лок для адреса если его нет
-    if address not in address_locks:
-        address_locks[address] = asyncio.Lock()
-
-    async with address_locks[address]:
-        async with sem:
-            ethereal_client = None
-            try:
-                ethereal_client = initialize_account(module_data)
-                module_data["module_info"]["status"] = await ethereal_client.run_mode(mode=mode)
-            except Exception as err:
-                if ethereal_client:
-                    logger.error(f'[-] {ethereal_client.label} | Account Error: {err}')
-                    await db.append_report(
-                        key=ethereal_client.encoded_apikey,
-                        text=str(err),
-                        success=False
-                    )
-                else:
-                    logger.error(f'[-] {module_data["label"]} | Global error: {err}')
-            finally:
-                if ethereal_client:
-                    await ethereal_client.browser.close_sessions()
-
-                if isinstance(module_data, dict):
-                    if mode in [1, 2]:
-                        await db.remove_module(module_data=module_data)
-                    else:
-                        await db.remove_account(module_data=module_data)
-
-                    reports = await db.get_account_reports(
-                        key=ethereal_client.encoded_apikey,
-                        label=ethereal_client.label,
-                        address=ethereal_client.address,
-                        last_module=True,
-                        mode=mode,
-                    )
-
-                    await TgReport().send_log(logs=reports)
-
-                    if module_data["module_info"]["status"] is True:
-                        await async_sleep(randint(*settings.SLEEP_AFTER_ACC))
-                    else:
-                        await async_sleep(10)
-
-
-async def run_pair(mode: int, group_data: dict, sem: asyncio.Semaphore):
-    """Запустить парную торговлю"""
-    addresses = [w["address"] for w in group_data["wallets_data"]]
-
-    # Создать локи для всех адресов в группе
-    for addr in addresses:
-        if addr not in address_locks:
-            address_locks[addr] = asyncio.Lock()
-
-    # Получить все локи для этой группы
-    group_locks = [address_locks[addr] for addr in addresses]
-
-    async with sem:
-        ethereal_clients = []
-        try:
-            # Захватить все локи
-            for lock in group_locks:
-                await lock.acquire()
-
-            ethereal_clients = [
-                initialize_account(wallet_data, group_data=group_data)
-                for wallet_data in group_data["wallets_data"]
-            ]
-
-            group_data["module_info"]["status"] = await PairAccounts(
-                accounts=ethereal_clients,
-                group_data=group_data
-            ).run(mode=mode)
-        except Exception as err:
-            logger.error(f'[-] Group {group_data["group_number"]} | Error: {err}')
+    ethereal_client = None
+    key = checkpoint_key(module_data["encoded_apikey"], module_data["module_info"])
+    await db.save_checkpoint(
+        key,
+        phase="started",
+        kind="module",
+        mode=mode,
+        owner=module_data["encoded_apikey"],
+        module_id=module_data["module_info"]["id"],
+    )
+    try:
+        ethereal_client = initialize_account(module_data)
+        module_data["module_info"]["status"] = await ethereal_client.run_mode(mode=mode)
+    except Exception as err:
+        if ethereal_client:
+            logger.error(f'[-] {ethereal_client.label} | Account Error: {err}')
             await db.append_report(
-                key=group_data.get("group_index"),
+                key=ethereal_client.encoded_apikey,
                 text=str(err),
                 success=False
             )
-        finally:
-            # Отпустить все локи
-            for lock in group_locks:
-                lock.release()
-
-            if ethereal_clients:
-                for ethereal_client in ethereal_clients:
-                    await ethereal_client.browser.close_sessions()
+        else:
+            logger.error(f'[-] {module_data["label"]} | Global error: {err}')
+    finally:
+        if ethereal_client:
+            await ethereal_client.browser.close_sessions()
 
-            await db.remove_group(group_data=group_data)
+        if isinstance(module_data, dict):
+            await db.save_checkpoint(key, phase="finished")
+            if mode in [1, 2]:
+                await db.remove_module(module_data=module_data)
+            else:
+                await db.remove_account(module_data=module_data)
+            await db.finish_checkpoint(key)
 
             reports = await db.get_account_reports(
-                key=group_data.get("group_index"),
-                label=f"Group {group_data['group_number']}",
-                address=None,
-                last_module=False,
+                key=ethereal_client.encoded_apikey,
+                label=ethereal_client.label,
+                address=ethereal_client.address,
+                last_module=True,
                 mode=mode,
             )
 
-            await TgReport().send_log(logs=reports)
+            await tg_report.send_log(logs=reports)
 
-            if group_data["module_info"]["status"] is True:
-                to_sleep = randint(*settings.SLEEP_AFTER_ACC)
-                logger.opt(colors=True).debug(
-                    f'[•] <white>Group {group_data["group_number"]}</white> | Sleep {to_sleep}s'
-                )
-                await async_sleep(to_sleep)
+            if module_data["module_info"]["status"] is True:
+                await async_sleep(randint(*settings.SLEEP_AFTER_ACC))
             else:
                 await async_sleep(10)
 
 
-async def runner(mode: int):
+async def run_pair(mode: int, group_data: dict):
+    """Запустить парную торговлю"""
+    ethereal_clients = []
+    watcher = None
+    key = checkpoint_key(group_data["group_index"], group_data["module_info"])
+    await db.save_checkpoint(
+        key,
+        phase="started",
+        kind="group",
+        mode=mode,
+        owner=group_data["group_index"],
+        module_id=group_data["module_info"]["id"],
+    )
+    try:
+        ethereal_clients = [
+            initialize_account(wallet_data, group_data=group_data)
+            for wallet_data in group_data["wallets_data"]
+        ]
+        stats_collector = get_stats_collector(db)
+        for wallet_data in group_data["wallets_data"]:
+            # Состав групп нужен портфелю режима 5 для дельты по группам
+            stats_collector.set_group(wallet_data["address"], group_data["group_number"], wallet_data["label"])
+
+        monitor_interval = settings.DELTA_MONITOR_SETTINGS["poll_interval"]
+        if monitor_interval and (settings.DELTA_MONITOR_SETTINGS["enable"] or DELTA_MONITOR.active):
+            # Живая дельта группы, пока она работает
+            watcher = asyncio.create_task(DELTA_MONITOR.watch(
+                [ethereal_client.browser for ethereal_client in ethereal_clients],
+                monitor_interval,
+            ))
+
+        group_data["module_info"]["status"] = await PairAccounts(
+            accounts=ethereal_clients,
+            group_data=group_data
+        ).run(mode=mode)
+    except Exception as err:
+        logger.error(f'[-] Group {group_data["group_number"]} | Error: {err}')
+        await db.append_report(
+            key=group_data.get("group_index"),
+            text=str(err),
+            success=False
+        )
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+            await asyncio.gather(watcher, return_exceptions=True)
+        # Хеджи монитора не должны открывать уже возвращённые сессии
+        await DELTA_MONITOR.release_group(group_data["group_number"])
+        if ethereal_clients:
+            for ethereal_client in ethereal_clients:
+                await ethereal_client.browser.close_sessions()
+
+        await db.save_checkpoint(key, phase="finished")
+        await db.remove_group(group_data=group_data)
+        await db.finish_checkpoint(key)
+
+        reports = await db.get_account_reports(
+            key=group_data.get("group_index"),
+            label=f"Group {group_data['group_number']}",
+            address=None,
+            last_module=False,
+            mode=mode,
+        )
+
+        await tg_report.send_log(logs=reports)
+
+        if group_data["module_info"]["status"] is True:
+            to_sleep = randint(*settings.SLEEP_AFTER_ACC)
+            logger.opt(colors=True).debug(
+                f'[•] <white>Group {group_data["group_number"]}</white> | Sleep {to_sleep}s'
+            )
+            await async_sleep(to_sleep)
+        else:
+            await async_sleep(10)
+
+
+JOB_HANDLERS = {
+    "module": run_modules,
+    "group": run_pair,
+}
+
+
+async def run_worker(shard: int = None, threads: int = None):
+    """Воркер распределённого режима: задачи, база и Telegram - у координатора"""
+    global db, tg_report
+
+    # Дочерний процесс --processes получает адрес и токен родителя через окружение
+    connection = Connection(
+        address=environ.get("ETHEREAL_COORDINATOR", settings.DISTRIBUTED_SETTINGS["address"]),
+        worker=f"{gethostname()}-{getpid()}" + (f"-shard{shard}" if shard is not None else ""),
+        token=environ.get("ETHEREAL_TOKEN", settings.DISTRIBUTED_SETTINGS["token"]),
+        shard=shard,
+    )
+    await connection.connect()
+    db = RemoteDataBase(connection)
+    tg_report = RemoteTgReport(connection)
+    if connection.mode == 5:
+        await db.load_stats()
+
+    try:
+        await Worker(
+            connection,
+            handlers=JOB_HANDLERS,
+            concurrency=threads or settings.THREADS,
+            heartbeat=settings.DISTRIBUTED_SETTINGS["heartbeat"],
+        ).run()
+        await db.flush()
+    finally:
+        await tg_report.close()
+        await ORDER_TRACKER.close()
+        await SESSION_POOL.close_all()
+        await connection.close()
+
+
+async def run_shard(coordinator: Coordinator, shard: int, threads: int, restarts: int = 3):
+    """Дочерний процесс-воркер шарда; перезапускается, пока у шарда остаются задачи"""
+    env = {**environ, "ETHEREAL_COORDINATOR": coordinator.address, "ETHEREAL_TOKEN": coordinator.token}
+    for attempt in range(restarts + 1):
+        process = await asyncio.create_subprocess_exec(
+            executable, os_path.join(os_path.dirname(os_path.abspath(__file__)), "cli.py"),
+            "--threads", str(threads),
+            "worker", "--shard", str(shard),
+            env=env,
+        )
+        code = await process.wait()
+        if coordinator.is_empty(shard):
+            return
+        logger.warning(f'[-] Shard {shard} | Process {process.pid} exited with code {code}, jobs left')
+
+    logger.error(f'[-] Shard {shard} | Gave up after {restarts} restarts')
+    coordinator.stop()
+
+
+async def runner(mode: int, processes: int = None, threads: int = None):
     """Основной runner"""
-    sem = asyncio.Semaphore(settings.THREADS)
+    processes = processes or settings.PROCESSES
+    threads = threads or settings.THREADS
+    if processes > threads:
+        # THREADS - общий предел одновременных аккаунтов, процессу нужен хотя бы один
+        logger.warning(f'[-] Soft | PROCESSES {processes} > THREADS {threads}, using {threads} processes')
+        processes = threads
+    scheduler = Scheduler(concurrency=threads)
+
+    coordinator = None
+    if settings.DISTRIBUTED_SETTINGS["enable"]:
+        # Задачи выполняют воркеры (python main.py worker), здесь только очередь и база
+        coordinator = Coordinator(
+            db,
+            address=settings.DISTRIBUTED_SETTINGS["address"],
+            token=settings.DISTRIBUTED_SETTINGS["token"],
+            lease_ttl=settings.DISTRIBUTED_SETTINGS["lease_ttl"],
+            mode=mode,
+            report=tg_report.send_log,
+        )
+    elif processes > 1:
+        # Аккаунты делятся на шарды по адресу, каждый шард - отдельный процесс.
+        # База и расшифрованные ключи остаются здесь, дети получают задачи по локальному сокету
+        address = (
+            settings.DISTRIBUTED_SETTINGS["address"] if os_name == "nt"
+            else f"unix:{os_path.join(gettempdir(), f'ethereal-{getpid()}.sock')}"
+        )
+        coordinator = Coordinator(
+            db,
+            address=address,
+            token=token_hex(16),
+            lease_ttl=settings.DISTRIBUTED_SETTINGS["lease_ttl"],
+            mode=mode,
+            shards=processes,
+            report=tg_report.send_log,
+        )
+
+    def submit(addresses: list, handler: str, **kwargs):
+        if coordinator is not None:
+            coordinator.submit(addresses, handler, **kwargs)
+        else:
+            scheduler.submit(addresses, JOB_HANDLERS[handler], **kwargs)
+
+    REGISTRY.gauge(
+        "scheduler_jobs", "Scheduler jobs by state", ["state"],
+        func=lambda: {(state,): value for state, value in (coordinator or scheduler).stats().items()},
+    )
+    REGISTRY.gauge("tg_queue_depth", "Telegram logs waiting to be sent", func=lambda: {(): tg_report.queue_size()})
+
+    # fsync журналов отчётов и чекпоинтов - фоном, не в записи под локом базы
+    db.start_sync()
+
+    metrics_server = None
+    summary_task = None
+    if settings.METRICS_SETTINGS["enable"]:
+        metrics_server = MetricsServer(
+            REGISTRY,
+            host=settings.METRICS_SETTINGS["host"],
+            port=settings.METRICS_SETTINGS["port"],
+        )
+        await metrics_server.start()
+    if settings.METRICS_SETTINGS["summary_interval"]:
+        summary_task = asyncio.create_task(summary_loop(settings.METRICS_SETTINGS["summary_interval"]))
+
+    monitor_server = None
+    if settings.DELTA_MONITOR_SETTINGS["enable"]:
+        REGISTRY.add_collector(DELTA_MONITOR.prometheus)
+        DELTA_MONITOR.alert_handler = tg_report.send_log
+        monitor_server = MonitorServer(
+            DELTA_MONITOR,
+            host=settings.DELTA_MONITOR_SETTINGS["host"],
+            port=settings.DELTA_MONITOR_SETTINGS["port"],
+        )
+        await monitor_server.start()
+
+    if settings.STREAM_SETTINGS["enable"] and mode in [2, 3]:
+        await start_market_stream(
+            url=settings.ETHEREAL_WS_URL,
+            tickers=settings.TOKENS_TO_TRADE.keys(),
+            max_age=settings.STREAM_SETTINGS["max_age"],
+        )
+
+    # Модули, прерванные падением прошлого запуска, сверяются с биржей до новых задач
+    recovery = Recovery(db, initialize=initialize_account, concurrency=threads)
 
     if mode == 3:
         # Парная торговля
         all_groups = db.get_all_groups()
         if all_groups != 'No more accounts left':
-            await asyncio.gather(*[
-                run_pair(group_data=group_data, mode=mode, sem=sem)
-                for group_data in all_groups
-            ])
+            all_groups = await recovery.run(all_groups, kind="group")
+            for group_data in all_groups:
+                submit(
+                    [wallet_data["address"] for wallet_data in group_data["wallets_data"]],
+                    "group",
+                    group_data=group_data,
+                    mode=mode,
+                )
     else:
         # Одиночная торговля
         all_modules = db.get_all_modules(unique_wallets=mode in [4, 5])
         if all_modules != 'No more accounts left':
-            await asyncio.gather(*[
-                run_modules(module_data=module_data, mode=mode, sem=sem)
-                for module_data in all_modules
-            ])
+            all_modules = await recovery.run(all_modules, kind="module")
+            for module_data in all_modules:
+                submit(
+                    [module_data["address"]],
+                    "module",
+                    module_data=module_data,
+                    mode=mode,
+                )
+
+    if coordinator is not None:
+        shards = []
+        await coordinator.start()
+        if coordinator.shards > 1 and not coordinator.is_empty():
+            # THREADS делятся между шардами без округления вверх: в сумме ровно threads
+            per_shard, extra = divmod(threads, coordinator.shards)
+            shards = [
+                asyncio.create_task(run_shard(coordinator, shard, per_shard + (shard < extra)))
+                for shard in range(coordinator.shards)
+            ]
+        await coordinator.serve()
+        if shards:
+            await asyncio.gather(*shards)
+    else:
+        await scheduler.run()
+
+    if mode == 5:
+        stats_collector = get_stats_collector(db)
+        csv_file = stats_collector.export_csv()
+        logger.success(f'[+] Statistics saved to {csv_file}')
+
+        portfolio = stats_collector.portfolio()
+        if portfolio.tickers:
+            marks_browser = Browser(private_key="", label="Portfolio", base_url=settings.ETHEREAL_API_URL)
+            try:
+                await stats_collector.load_marks(portfolio, marks_browser)
+            finally:
+                await marks_browser.close_sessions()
+        totals = portfolio.totals()
+        changes = save_portfolio_snapshot(portfolio)
+        logger.info(
+            f'[•] Portfolio | {totals["accounts"]} accounts | volume ${totals["volume"]:.2f} '
+            f'(+${changes["volume"]:.2f}) | pnl ${totals["realized_pnl"]:.2f} '
+            f'(+${changes["realized_pnl"]:.2f}) | fees ${totals["fees"]:.2f} | '
+            f'changed {len(changes["changed_accounts"])} accounts'
+        )
+        for address, exposure in portfolio.top_exposures(settings.STATS_SETTINGS["top_exposures"]):
+            if exposure:
+                logger.info(f'[•] Portfolio | {address} exposure ${exposure:.2f}')
+        for ticker, net in portfolio.ticker_net().items():
+            if net:
+                logger.info(f'[•] Portfolio | {ticker} net ${net:.2f}')
+        group_deltas = portfolio.group_net_delta()
+        if group_deltas:
+            worst = sorted(group_deltas.items(), key=lambda item: abs(item[1]), reverse=True)
+            logger.info(
+                f'[•] Portfolio | {len(group_deltas)} groups | largest net delta: ' + ', '.join(
+                    f'Group {group_number} ${delta:+.2f}'
+                    for group_number, delta in worst[:settings.STATS_SETTINGS["top_exposures"]]
+                )
+            )
+
+    if monitor_server is not None:
+        await monitor_server.stop()
+    if metrics_server is not None:
+        await metrics_server.stop()
+    if summary_task is not None:
+        summary_task.cancel()
+    logger.info(f'[•] Metrics | {metrics_summary()}')
+    await tg_report.close()
+    await ORDER_TRACKER.close()
+    await stop_market_stream()
+    await SESSION_POOL.close_all()
+    await db.stop_sync()
+
+    cache_stats = MARKET_CACHE.stats()
+    logger.debug(
+        f'[•] Market cache | hits {cache_stats["hits"]} | misses {cache_stats["misses"]} | '
+        f'coalesced {cache_stats["coalesced"]} | hit rate {cache_stats["hit_rate"]:.1%}'
+    )
 
     logger.success('✓ All accounts done.')
     return 'Ended'
 
 
-if __name__ == '__main__':
-    if os_name == "nt":
-        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+def interactive(password: str = None):
+    """Меню выбора режима (python main.py / python cli.py без команды)"""
+    global db
 
+    db = None
     try:
-        db = DataBase()
+        db = DataBase(password=password)
 
         while True:
             mode = choose_mode()
@@ -202,4 +456,36 @@ if __name__ == '__main__':
     except KeyboardInterrupt:
         logger.info('[•] Interrupted by user')
     finally:
+        if db is not None:
+            db.close()
+        logger.info('[•] Soft | Closed')
+
+
+def headless(mode: int, password: str = None) -> int:
+    """Один режим без меню (python cli.py). Возвращает код выхода"""
+    global db
+
+    db = None
+    try:
+        db = DataBase(password=password)
+        if mode in [101, 102]:
+            db.create_modules(mode=mode)
+        else:
+            asyncio.run(runner(mode=mode))
+        return 0
+    except DataBaseError as e:
+        logger.error(f'[-] Database | {e}')
+        return 1
+    except KeyboardInterrupt:
+        logger.info('[•] Interrupted by user')
+        return 130
+    finally:
+        if db is not None:
+            db.close()
         logger.info('[•] Soft | Closed')
+
+
+if __name__ == '__main__':
+    from cli import main
+
+    main(app=sys_modules[__name__])
@@ -1,9 +1,52 @@
-from modules.browser import Browser
-from modules.client import EtherealClient, PairAccounts
-from modules.database import DataBase
-from modules.retry import async_retry, CustomError, DataBaseError, APIError
-from modules.config import EtherealConfig
-from modules.utils.logging import TgReport
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+# Имя -> модуль. Модуль импортируется при первом обращении к имени (PEP 562),
+# поэтому `import modules.storage` или cli.py --help не тянут aiohttp и cryptography
+_LAZY = {
+    'Browser': 'modules.browser',
+    'EtherealClient': 'modules.client',
+    'PairAccounts': 'modules.client',
+    'DataBase': 'modules.database',
+    'async_retry': 'modules.retry',
+    'RetryPolicy': 'modules.retry',
+    'CustomError': 'modules.retry',
+    'DataBaseError': 'modules.retry',
+    'SettingsError': 'modules.retry',
+    'APIError': 'modules.retry',
+    'CircuitOpenError': 'modules.retry',
+    'EtherealConfig': 'modules.config',
+    'get_settings': 'modules.config',
+    'Order': 'modules.models',
+    'Position': 'modules.models',
+    'OrderBookTop': 'modules.models',
+    'Market': 'modules.models',
+    'TgReport': 'modules.utils.logging',
+}
+
+if TYPE_CHECKING:
+    from modules.browser import Browser
+    from modules.client import EtherealClient, PairAccounts
+    from modules.database import DataBase
+    from modules.retry import async_retry, RetryPolicy, CustomError, DataBaseError, SettingsError, APIError, CircuitOpenError
+    from modules.config import EtherealConfig, get_settings
+    from modules.models import Order, Position, OrderBookTop, Market
+    from modules.utils.logging import TgReport
+
+
+def __getattr__(name: str):
+    module_name = _LAZY.get(name)
+    if module_name is None:
+        raise AttributeError(f"module 'modules' has no attribute '{name}'")
+
+    value = getattr(import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
+
 
 __all__ = [
     'Browser',
@@ -11,9 +54,17 @@ __all__ = [
     'PairAccounts',
     'DataBase',
     'async_retry',
+    'RetryPolicy',
     'CustomError',
     'DataBaseError',
+    'SettingsError',
     'APIError',
+    'CircuitOpenError',
     'EtherealConfig',
+    'get_settings',
+    'Order',
+    'Position',
+    'OrderBookTop',
+    'Market',
     'TgReport',
 ]
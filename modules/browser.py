@@ -1,29 +1,64 @@
 from decimal import Decimal
 from loguru import logger
-from modules.retry import async_retry, APIError
-from typing import Dict, List, Optional
+from modules.retry import async_retry, get_breaker, APIError, RetryPolicy
+from typing import Dict, List, Optional, Set, Tuple
+from time import perf_counter
 import aiohttp
 import asyncio
 from modules.config import ETHEREAL_CONFIG
-import json
+from modules.pool import SESSION_POOL
+from modules.cache import MARKET_CACHE
+from modules.stream import get_live_book
+from modules.monitor import DELTA_MONITOR
+from modules.codec import loads, to_decimal, to_float, DecodeError
+from modules.models import Fill, Market, Order, OrderBookTop, Position
+from modules.ratelimit import RateLimiter
+from modules.metrics import RATE_LIMIT_WAIT, REQUEST_ERRORS, REQUEST_LATENCY
+from settings import RETRY_SETTINGS, CIRCUIT_BREAKER, RATE_LIMITS, BULK_ORDERS
+
+
+RETRY_POLICY = RetryPolicy(
+    max_retries=RETRY_SETTINGS["max_retries"],
+    base_delay=RETRY_SETTINGS["base_delay"],
+    max_delay=RETRY_SETTINGS["max_delay"],
+)
+
+# Создание ордера не идемпотентно (client order id API не принимает)
+ORDER_RETRY_POLICY = RetryPolicy(
+    max_retries=RETRY_SETTINGS["max_retries"],
+    base_delay=RETRY_SETTINGS["base_delay"],
+    max_delay=RETRY_SETTINGS["max_delay"],
+    idempotent=False,
+)
+
+RATE_LIMITER = RateLimiter(
+    global_limit=RATE_LIMITS["global"],
+    proxy_limit=RATE_LIMITS["proxy"],
+    account_limit=RATE_LIMITS["account"],
+    weights=RATE_LIMITS["weights"],
+)
 
 
 class Browser:
     """HTTP клиент для Ethereal REST API (без SDK)"""
 
+    # (base_url, endpoint) batch запросов, которых нет в API
+    _unsupported_batches: Set[Tuple[str, str]] = set()
+
     def __init__(
             self,
             private_key: str,
             label: str,
             proxy: Optional[str] = None,
-            base_url: str = "https://api.ethereal.trade"
+            base_url: str = "https://api.ethereal.trade",
+            address: Optional[str] = None,
     ):
         self.private_key = private_key
         self.label = label
+        self.address = address
         self.proxy = self._format_proxy(proxy)
         self.base_url = base_url.rstrip('/')
         self.session: Optional[aiohttp.ClientSession] = None
-        self.max_retries = 5
 
     @staticmethod
     def _format_proxy(proxy: Optional[str]) -> Optional[str]:
@@ -37,20 +72,9 @@ class Browser:
         return f"http://{proxy}"
 
     async def initialize(self):
-        """Инициализировать сессию"""
+        """Взять сессию из общего пула"""
         try:
-            headers = {
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-                "Accept": "application/json",
-                "Content-Type": "application/json",
-            }
-
-            connector = aiohttp.TCPConnector(ssl=False, limit_per_host=5)
-            self.session = aiohttp.ClientSession(
-                headers=headers,
-                connector=connector,
-                timeout=aiohttp.ClientTimeout(total=30)
-            )
+            self.session = await SESSION_POOL.acquire(self.base_url, self.proxy)
 
             logger.opt(colors=True).debug(
                 f'[•] <white>{self.label}</white> | Initialized Ethereal HTTP client'
@@ -59,13 +83,31 @@ class Browser:
             raise APIError(f"Failed to initialize HTTP client: {e}")
 
     async def close_sessions(self):
-        """Закрыть сессию"""
+        """Вернуть сессию в пул"""
         if self.session:
             try:
-                await self.session.close()
-                await asyncio.sleep(0.25)
+                await SESSION_POOL.release(self.base_url, self.proxy)
             except Exception as e:
                 logger.warning(f"Error closing session: {e}")
+            finally:
+                self.session = None
+
+    @staticmethod
+    def _endpoint_name(method: str, endpoint: str) -> str:
+        """Шаблон endpoint для circuit breaker: /orders/<uuid> -> /orders/{id}"""
+        parts = [
+            "{id}" if part.isdigit() or (len(part) >= 32 and '-' in part) else part
+            for part in endpoint.split('?')[0].split('/')
+        ]
+        return f"{method} {'/'.join(parts)}"
+
+    @staticmethod
+    def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+        """Retry-After в секундах (формат даты не поддерживается)"""
+        try:
+            return float(value) if value else None
+        except ValueError:
+            return None
 
     async def _request(self, method: str, endpoint: str, **kwargs) -> Dict:
         """Генерический метод для HTTP запросов"""
@@ -73,7 +115,39 @@ class Browser:
             await self.initialize()
 
         url = f"{self.base_url}{endpoint}"
+        endpoint_name = self._endpoint_name(method, endpoint)
+        breaker = get_breaker(
+            f"{self.base_url} {endpoint_name}",
+            failure_threshold=CIRCUIT_BREAKER["failure_threshold"],
+            recovery_timeout=CIRCUIT_BREAKER["recovery_timeout"],
+        )
+        breaker.before_call()
+
+        started = perf_counter()
+        await RATE_LIMITER.acquire(
+            base_url=self.base_url,
+            proxy=self.proxy,
+            account=self.address or self.label,  # Лимит биржи на аккаунт, а label может повторяться
+            weight=RATE_LIMITER.get_weight(endpoint_name),
+        )
+        sent = perf_counter()
+        RATE_LIMIT_WAIT.observe(sent - started)
+
+        labels = (endpoint_name,)
+        try:
+            data = await self._send(method, url, **kwargs)
+        except APIError as e:
+            REQUEST_LATENCY.observe(perf_counter() - sent, labels)
+            REQUEST_ERRORS.inc((endpoint_name, str(e.status or "network")))
+            breaker.record_failure(e)
+            raise
+
+        REQUEST_LATENCY.observe(perf_counter() - sent, labels)
+        breaker.record_success()
+        return data
 
+    async def _send(self, method: str, url: str, **kwargs) -> Dict:
+        """Выполнить HTTP запрос и разобрать ответ"""
         try:
             async with self.session.request(
                     method,
@@ -81,38 +155,53 @@ class Browser:
                     proxy=self.proxy,
                     **kwargs
             ) as response:
-                text = await response.text()
+                body = await response.read()
 
                 try:
-                    data = json.loads(text) if text else {}
-                except json.JSONDecodeError:
+                    data = loads(body) if body else {}
+                except DecodeError:
                     data = {}
 
                 if response.status >= 400:
-                    error_msg = data.get('message') or data.get('error') or text[:200]
-                    raise APIError(f"API Error {response.status}: {error_msg}")
+                    error_msg = (
+                        data.get('message') or data.get('error')
+                        or body[:200].decode(errors='replace')
+                    )
+                    raise APIError(
+                        f"API Error {response.status}: {error_msg}",
+                        status=response.status,
+                        retry_after=self._parse_retry_after(response.headers.get("Retry-After")),
+                    )
 
                 return data
         except asyncio.TimeoutError:
-            raise APIError(f"Request timeout to {url}")
+            raise APIError(f"Request timeout to {url}", network=True)
+        except (aiohttp.ClientConnectorError, aiohttp.ClientHttpProxyError) as e:
+            # Соединение (или CONNECT через прокси) не открылось - запрос не ушёл
+            raise APIError(f"Connection failed: {e}", network=True, sent=False)
         except aiohttp.ClientError as e:
-            raise APIError(f"HTTP Client Error: {e}")
+            raise APIError(f"HTTP Client Error: {e}", network=True)
         except APIError:
             raise
         except Exception as e:
             raise APIError(f"Request failed: {e}")
 
-    @async_retry(max_retries=3)
+    @async_retry(policy=RETRY_POLICY)
     async def get_products(self) -> List[Dict]:
         """Получить список доступных продуктов"""
         try:
-            data = await self._request("GET", "/products")
+            data = await MARKET_CACHE.get(
+                self.base_url, "/products", None,
+                lambda: self._request("GET", "/products")
+            )
             products = data if isinstance(data, list) else data.get("products", [])
             return products
+        except APIError:
+            raise
         except Exception as e:
             raise APIError(f"Failed to get products: {e}")
 
-    @async_retry(max_retries=3)
+    @async_retry(policy=RETRY_POLICY)
     async def get_balance(self) -> Decimal:
         """Получить баланс USDE"""
         try:
@@ -120,50 +209,61 @@ class Browser:
 
             if isinstance(data, dict):
                 balance = data.get("balance") or data.get("free_balance") or 0
-                return Decimal(str(balance))
+                return to_decimal(balance)
 
             return Decimal("0")
         except Exception as e:
             logger.warning(f"Failed to get balance: {e}")
             return Decimal("0")
 
-    @async_retry(max_retries=3)
-    async def get_price(self, ticker: str) -> Decimal:
-        """Получить текущую цену токена"""
+    @async_retry(policy=RETRY_POLICY)
+    async def get_market(self, ticker: str) -> Market:
+        """Получить данные рынка"""
         try:
-            data = await self._request("GET", f"/markets/{ticker}")
+            endpoint = f"/markets/{ticker}"
+            data = await MARKET_CACHE.get(
+                self.base_url, endpoint, ticker,
+                lambda: self._request("GET", endpoint)
+            )
 
             if isinstance(data, dict):
-                price = (data.get("price") or
-                         data.get("mark_price") or
-                         data.get("lastPrice") or
-                         data.get("indexPrice"))
-                if price:
-                    return Decimal(str(price))
+                return Market.from_response(ticker, data)
 
-            raise APIError(f"No price data for {ticker}")
+            raise APIError(f"Invalid market data for {ticker}")
         except APIError:
             raise
         except Exception as e:
-            raise APIError(f"Failed to get price for {ticker}: {e}")
+            raise APIError(f"Failed to get market for {ticker}: {e}")
+
+    async def get_price(self, ticker: str) -> Decimal:
+        """Получить текущую цену токена"""
+        book = get_live_book(ticker)
+        if book is not None:
+            price = book.mid_price()
+            if price:
+                return price
+
+        market = await self.get_market(ticker)
+        if market.price is None:
+            raise APIError(f"No price data for {ticker}")
+        return market.price
 
-    @async_retry(max_retries=3)
-    async def get_order_book(self, ticker: str) -> Dict[str, Decimal]:
+    @async_retry(policy=RETRY_POLICY)
+    async def get_order_book(self, ticker: str) -> OrderBookTop:
         """Получить стакан заявок"""
+        book = get_live_book(ticker)
+        if book is not None:
+            return book.top()
+
         try:
-            data = await self._request("GET", f"/orderbooks/{ticker}?limit=5")
+            endpoint = f"/orderbooks/{ticker}?limit=5"
+            data = await MARKET_CACHE.get(
+                self.base_url, endpoint, ticker,
+                lambda: self._request("GET", endpoint)
+            )
 
             if isinstance(data, dict):
-                bids = data.get("bids", [])
-                asks = data.get("asks", [])
-
-                bid_price = Decimal(str(bids[0][0])) if bids else Decimal("0")
-                ask_price = Decimal(str(asks[0][0])) if asks else Decimal("0")
-
-                return {
-                    "BUY": bid_price,
-                    "SELL": ask_price
-                }
+                return OrderBookTop.from_response(data)
 
             raise APIError(f"Invalid order book data for {ticker}")
         except APIError:
@@ -171,39 +271,178 @@ class Browser:
         except Exception as e:
             raise APIError(f"Failed to get order book for {ticker}: {e}")
 
-    @async_retry(max_retries=3)
-    async def create_order(self, order_data: Dict) -> Dict:
+    @async_retry(policy=ORDER_RETRY_POLICY)
+    async def create_order(self, order_data: Dict) -> Order:
         """Создать ордер"""
         try:
-            payload = {
-                "order_type": order_data.get("type", "LIMIT"),
-                "quantity": str(order_data.get("quantity", 0)),
-                "side": "buy" if order_data.get("side") == 0 else "sell",
-                "ticker": order_data.get("ticker"),
-            }
-
-            if order_data.get("type") == "LIMIT":
-                payload["price"] = str(order_data.get("price", 0))
-
-            data = await self._request("POST", "/orders", json=payload)
-
-            return {
-                "orderId": data.get("id") or data.get("order_id"),
-                "status": "PENDING",
-                "symbol": order_data.get("ticker"),
-                "side": "BUY" if order_data.get("side") == 0 else "SELL",
-                "quantity": float(order_data.get("quantity")),
-                "price": float(order_data.get("price", 0)),
-                "executedQty": 0.0,
-                "avgPrice": float(order_data.get("price", 0)),
-                "cumQuote": 0.0,
-            }
+            data = await self._request("POST", "/orders", json=self._order_payload(order_data))
+            return self._created_order(order_data, data)
         except APIError:
             raise
         except Exception as e:
             raise APIError(f"Failed to create order: {e}")
 
-    @async_retry(max_retries=3)
+    @staticmethod
+    def _order_payload(order_data: Dict) -> Dict:
+        """Тело запроса на создание ордера"""
+        payload = {
+            "order_type": order_data.get("type", "LIMIT"),
+            "quantity": str(order_data.get("quantity", 0)),
+            "side": "buy" if order_data.get("side") == 0 else "sell",
+            "ticker": order_data.get("ticker"),
+        }
+
+        if order_data.get("type") == "LIMIT":
+            payload["price"] = str(order_data.get("price", 0))
+        if order_data.get("reduce_only"):
+            payload["reduce_only"] = True
+
+        return payload
+
+    @staticmethod
+    def _created_order(order_data: Dict, data: Dict) -> Order:
+        """Ордер из ответа на создание"""
+        price = to_float(order_data.get("price"))
+        return Order(
+            order_id=data.get("id") or data.get("order_id"),
+            status="PENDING",
+            symbol=order_data.get("ticker"),
+            side="BUY" if order_data.get("side") == 0 else "SELL",
+            quantity=to_float(order_data.get("quantity")),
+            price=price,
+            avg_price=price,
+        )
+
+    def _batch_supported(self, endpoint: str) -> bool:
+        return bool(endpoint) and (self.base_url, endpoint) not in Browser._unsupported_batches
+
+    def _mark_batch_unsupported(
+            self,
+            endpoint: str,
+            error: APIError,
+            permanent: Tuple[int, ...] = (404, 405, 501),
+    ) -> bool:
+        """
+        True - batch запрос не прошёл, нужно перейти на одиночные запросы.
+        Статусы из permanent запоминают, что endpoint'а в API нет
+        """
+        if error.status not in (404, 405, 501):
+            return False
+
+        if error.status in permanent:
+            Browser._unsupported_batches.add((self.base_url, endpoint))
+            logger.debug(f"Batch endpoint {endpoint} not supported, falling back to single requests")
+        else:
+            logger.debug(f"Batch endpoint {endpoint} returned {error.status}, falling back to single requests")
+        return True
+
+    async def _gather_limited(self, coros: List) -> List:
+        """Выполнить корутины параллельно, не больше BULK_ORDERS["concurrency"] сразу"""
+        sem = asyncio.Semaphore(BULK_ORDERS["concurrency"])
+
+        async def run(coro):
+            async with sem:
+                return await coro
+
+        return await asyncio.gather(*[run(coro) for coro in coros], return_exceptions=True)
+
+    async def create_orders(self, orders_data: List[Dict]) -> List[Order]:
+        """
+        Создать несколько ордеров сразу (ноги парной сделки).
+        Batch endpoint, если API его поддерживает, иначе параллельно.
+        Ошибка отдельной ноги возвращается в списке как исключение.
+        """
+        endpoint = BULK_ORDERS["create_endpoint"]
+
+        if self._batch_supported(endpoint):
+            try:
+                data = await self._request(
+                    "POST", endpoint,
+                    json={"orders": [self._order_payload(order_data) for order_data in orders_data]}
+                )
+                created = data if isinstance(data, list) else data.get("orders") if isinstance(data, dict) else None
+                if not isinstance(created, list):
+                    created = []
+                results = [
+                    self._created_order(order_data, order) if isinstance(order, dict)
+                    else APIError(f"Failed to create order: {order}")
+                    for order_data, order in zip(orders_data, created)
+                ]
+                # Ответ короче запроса: судьба остальных ног неизвестна - это ошибка, а не пропуск
+                return results + [
+                    APIError(f"Failed to create order: no result in batch response for {order_data.get('ticker')}")
+                    for order_data in orders_data[len(results):]
+                ]
+            except APIError as e:
+                if not self._mark_batch_unsupported(endpoint, e):
+                    raise
+
+        return await self._gather_limited([self.create_order(order_data) for order_data in orders_data])
+
+    @async_retry(policy=RETRY_POLICY)
+    async def _cancel_batch(self, endpoint: str, order_ids: List[str]) -> Dict[str, bool]:
+        """Отменить пачку ордеров одним запросом. Ордеров без ответа в результате нет"""
+        data = await self._request("POST", endpoint, json={"order_ids": order_ids})
+
+        canceled = data.get("canceled") if isinstance(data, dict) else None
+        if not isinstance(canceled, list):
+            # Ответ без списка отменённых: результат неизвестен, проверяется по статусам
+            return {}
+
+        canceled = set(canceled)
+        return {order_id: order_id in canceled for order_id in order_ids}
+
+    async def _canceled_status(self, order_id: str) -> bool:
+        """Ордер отменён - по его текущему статусу"""
+        order = await self.get_order_status(order_id)
+        return str(order.status).lower() in ("canceled", "cancelled")
+
+    async def cancel_orders(self, order_ids: List[str]) -> Dict[str, bool]:
+        """Отменить несколько ордеров: пачками или параллельно"""
+        endpoint = BULK_ORDERS["cancel_endpoint"]
+        batch_size = BULK_ORDERS["batch_size"]
+        result = {}
+
+        if self._batch_supported(endpoint):
+            try:
+                for i in range(0, len(order_ids), batch_size):
+                    result.update(await self._cancel_batch(endpoint, order_ids[i:i + batch_size]))
+            except APIError as e:
+                # 404 может значить "неизвестные id", а не отсутствие endpoint'а - не запоминаем
+                if not self._mark_batch_unsupported(endpoint, e, permanent=(405, 501)):
+                    raise
+            else:
+                unknown = [order_id for order_id in order_ids if order_id not in result]
+                outcomes = await self._gather_limited([self._canceled_status(order_id) for order_id in unknown])
+                for order_id, outcome in zip(unknown, outcomes):
+                    if isinstance(outcome, Exception):
+                        logger.warning(f"Failed to check cancel of order {order_id}: {outcome}")
+                    result[order_id] = outcome is True
+                return result
+
+        pending = [order_id for order_id in order_ids if order_id not in result]
+        outcomes = await self._gather_limited([self.cancel_order(order_id) for order_id in pending])
+        for order_id, outcome in zip(pending, outcomes):
+            if isinstance(outcome, Exception):
+                logger.warning(f"Failed to cancel order {order_id}: {outcome}")
+            result[order_id] = outcome is True
+
+        return result
+
+    async def cancel_all_orders(self, ticker: Optional[str] = None) -> int:
+        """Отменить все открытые ордеры (по тикеру или все). Возвращает количество отменённых"""
+        orders = await self.get_open_orders()
+        order_ids = [
+            order.order_id for order in orders
+            if order.order_id and (ticker is None or ticker in (order.symbol or ""))
+        ]
+        if not order_ids:
+            return 0
+
+        result = await self.cancel_orders(order_ids)
+        return sum(result.values())
+
+    @async_retry(policy=RETRY_POLICY)
     async def cancel_order(self, order_id: str, ticker: str = "") -> bool:
         """Отменить ордер"""
         try:
@@ -218,30 +457,20 @@ class Browser:
         except Exception as e:
             raise APIError(f"Failed to cancel order {order_id}: {e}")
 
-    @async_retry(max_retries=3)
-    async def get_order_status(self, order_id: str, ticker: str = "") -> Dict:
+    @async_retry(policy=RETRY_POLICY)
+    async def get_order_status(self, order_id: str, ticker: str = "") -> Order:
         """Получить статус ордера"""
         try:
             data = await self._request("GET", f"/orders/{order_id}")
-
-            executed_qty = float(data.get("filled_quantity") or 0)
-            price = float(data.get("price") or 0)
-
-            return {
-                "orderId": data.get("id") or order_id,
-                "status": data.get("status") or "PENDING",
-                "executedQty": executed_qty,
-                "avgPrice": price,
-                "cumQuote": executed_qty * price,
-            }
+            return Order.from_response(data, order_id=order_id)
         except APIError:
             raise
         except Exception as e:
             raise APIError(f"Failed to get order status: {e}")
 
-    @async_retry(max_retries=3)
-    async def get_positions(self) -> List[Dict]:
-        """Получить открытые позиции"""
+    @async_retry(policy=RETRY_POLICY)
+    async def fetch_positions(self) -> List[Position]:
+        """Получить открытые позиции. Ошибка запроса или ответа - APIError"""
         try:
             data = await self._request("GET", "/positions")
 
@@ -249,56 +478,69 @@ class Browser:
 
             result = []
             for pos in positions:
-                size = float(pos.get("size") or 0)
-                if size != 0:
-                    result.append({
-                        "symbol": pos.get("product_id") or pos.get("ticker"),
-                        "positionAmt": size,
-                        "entryPrice": float(pos.get("entry_price") or 0),
-                    })
-
-            return result
+                position = Position.from_response(pos)
+                if position.position_amt != 0:
+                    result.append(position)
+        except APIError:
+            raise
+        except Exception as e:
+            raise APIError(f"Failed to get positions: {e}")
+
+        if self.address:
+            DELTA_MONITOR.on_positions(self.address, result)
+        return result
+
+    async def get_positions(self) -> List[Position]:
+        """Получить открытые позиции (пустой список при ошибке)"""
+        try:
+            return await self.fetch_positions()
         except Exception as e:
             logger.warning(f"Failed to get positions: {e}")
             return []
 
-    @async_retry(max_retries=3)
-    async def get_open_orders(self) -> List[Dict]:
-        """Получить открытые ордеры"""
+    @async_retry(policy=RETRY_POLICY)
+    async def fetch_open_orders(self) -> List[Order]:
+        """Получить открытые ордеры. Ошибка запроса или ответа - APIError"""
         try:
             data = await self._request("GET", "/orders?status=pending")
 
             orders = data if isinstance(data, list) else data.get("orders", [])
 
-            result = []
-            for order in orders:
-                result.append({
-                    "orderId": order.get("id") or order.get("order_id"),
-                    "symbol": order.get("ticker") or order.get("product_id"),
-                    "status": order.get("status"),
-                    "quantity": float(order.get("quantity") or 0),
-                    "price": float(order.get("price") or 0),
-                })
-
-            return result
+            return [Order.from_response(order) for order in orders]
+        except APIError:
+            raise
+        except Exception as e:
+            raise APIError(f"Failed to get open orders: {e}")
+
+    async def get_open_orders(self) -> List[Order]:
+        """Получить открытые ордеры (пустой список при ошибке)"""
+        try:
+            return await self.fetch_open_orders()
         except Exception as e:
             logger.warning(f"Failed to get open orders: {e}")
             return []
 
-    @async_retry(max_retries=3)
-    async def close_all_orders(self, ticker: str) -> bool:
-        """Закрыть все ордеры по символу"""
+    @async_retry(policy=RETRY_POLICY)
+    async def get_fills(self, since: float = 0, limit: int = 100) -> List[Fill]:
+        """Сделки аккаунта начиная с since (включительно), по возрастанию времени"""
         try:
-            orders = await self.get_open_orders()
-            order_ids = [o["orderId"] for o in orders if ticker in o.get("symbol", "")]
+            data = await self._request(
+                "GET", "/fills",
+                params={"since": repr(since), "limit": limit, "order": "asc"},
+            )
 
-            if order_ids:
-                for order_id in order_ids:
-                    try:
-                        await self.cancel_order(order_id, ticker)
-                    except Exception as e:
-                        logger.warning(f"Failed to cancel order {order_id}: {e}")
+            fills = data if isinstance(data, list) else data.get("data", data.get("fills", []))
 
+            return [Fill.from_response(fill) for fill in fills]
+        except APIError:
+            raise
+        except Exception as e:
+            raise APIError(f"Failed to get fills: {e}")
+
+    async def close_all_orders(self, ticker: str) -> bool:
+        """Закрыть все ордеры по символу"""
+        try:
+            await self.cancel_all_orders(ticker)
             return True
         except Exception as e:
             raise APIError(f"Failed to close all orders for {ticker}: {e}")
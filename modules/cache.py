@@ -0,0 +1,121 @@
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from time import monotonic
+import asyncio
+from settings import MARKET_CACHE_SETTINGS
+
+
+CacheKey = Tuple[str, str]
+
+
+class MarketCache:
+    """
+    Общий кэш рыночных данных (цены, стаканы, продукты).
+
+    Ключ - (base_url, endpoint). Одновременные запросы одного ключа
+    ждут один и тот же запрос к API (single-flight).
+    """
+
+    def __init__(
+            self,
+            enable: bool = True,
+            default_ttl: float = 1.0,
+            tickers_ttl: Optional[Dict[str, float]] = None,
+            products_ttl: float = 300.0,
+    ):
+        self.enable = enable
+        self.default_ttl = default_ttl
+        self.tickers_ttl = tickers_ttl or {}
+        self.products_ttl = products_ttl
+
+        self._values: Dict[CacheKey, Tuple[float, Any]] = {}
+        self._inflight: Dict[CacheKey, asyncio.Task] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.endpoint_stats: Dict[str, Dict[str, int]] = {}
+
+    def get_ttl(self, ticker: Optional[str]) -> float:
+        """TTL для тикера (None - список продуктов)"""
+        if ticker is None:
+            return self.products_ttl
+        return self.tickers_ttl.get(ticker, self.default_ttl)
+
+    def _count(self, endpoint: str, field: str):
+        """Увеличить счётчик hit/miss/coalesced"""
+        setattr(self, field, getattr(self, field) + 1)
+
+        # Счётчики по endpoint без query, чтобы не плодить ключи
+        name = endpoint.split('?')[0]
+        counters = self.endpoint_stats.setdefault(name, {"hits": 0, "misses": 0, "coalesced": 0})
+        counters[field] += 1
+
+    async def get(
+            self,
+            base_url: str,
+            endpoint: str,
+            ticker: Optional[str],
+            fetch: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """Вернуть значение из кэша или загрузить его один раз для всех"""
+        if not self.enable:
+            return await fetch()
+
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._inflight.clear()
+            self._loop = loop
+
+        key = (base_url, endpoint)
+        cached = self._values.get(key)
+        if cached is not None and cached[0] > monotonic():
+            self._count(endpoint, "hits")
+            return cached[1]
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self._count(endpoint, "coalesced")
+        else:
+            self._count(endpoint, "misses")
+            task = asyncio.ensure_future(self._load(key, ticker, fetch))
+            self._inflight[key] = task
+
+        # shield: отмена одного ожидающего не отменяет общий запрос
+        return await asyncio.shield(task)
+
+    async def _load(self, key: CacheKey, ticker: Optional[str], fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """Выполнить запрос и положить результат в кэш"""
+        try:
+            value = await fetch()
+            self._values[key] = (monotonic() + self.get_ttl(ticker), value)
+            return value
+        finally:
+            self._inflight.pop(key, None)
+
+    def invalidate(self, base_url: Optional[str] = None):
+        """Сбросить кэш (весь или для одного base_url)"""
+        if base_url is None:
+            self._values.clear()
+        else:
+            for key in [k for k in self._values if k[0] == base_url]:
+                self._values.pop(key)
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики попаданий для подбора TTL"""
+        total = self.hits + self.misses + self.coalesced
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round((self.hits + self.coalesced) / total, 4) if total else 0.0,
+            "endpoints": self.endpoint_stats,
+        }
+
+
+MARKET_CACHE = MarketCache(
+    enable=MARKET_CACHE_SETTINGS["enable"],
+    default_ttl=MARKET_CACHE_SETTINGS["ttl"],
+    tickers_ttl=MARKET_CACHE_SETTINGS["tickers_ttl"],
+    products_ttl=MARKET_CACHE_SETTINGS["products_ttl"],
+)
@@ -2,6 +2,10 @@ from decimal import Decimal
 from loguru import logger
 from modules.browser import Browser
 from modules.database import DataBase
+from modules.legs import Leg, LegExecutor
+from modules.monitor import DELTA_MONITOR
+from modules.stats import get_stats_collector
+from modules.storage import checkpoint_key
 from modules.retry import async_retry, CustomError
 from typing import Dict, Optional, List
 import asyncio
@@ -51,7 +55,8 @@ class EtherealClient:
             label: str,
             proxy: Optional[str],
             db: DataBase,
-            group_data: Optional[Dict] = None
+            group_data: Optional[Dict] = None,
+            checkpoint_key: Optional[str] = None,
     ):
         self.browser = browser
         self.apikey = apikey
@@ -59,6 +64,7 @@ class EtherealClient:
         self.address = address
         self.label = label
         self.db = db
+        self.checkpoint_key = checkpoint_key
 
         if group_data:
             self.group_number = group_data["group_number"]
@@ -68,15 +74,179 @@ class EtherealClient:
             self.group_number = None
             self.prefix = f"[{self.label}] "
 
+    async def checkpoint(self, **fields):
+        """Сохранить фазу модуля для восстановления после падения"""
+        if self.checkpoint_key:
+            await self.db.save_checkpoint(self.checkpoint_key, **fields)
+
+    async def run_mode(self, mode: int) -> bool:
+        """Запустить режим для аккаунта"""
+        if mode == 4:
+            return await self.cancel_all()
+        elif mode == 5:
+            return await self.parse_stats()
+        raise CustomError(f"Mode {mode} is not supported for single accounts")
+
+    async def parse_stats(self) -> bool:
+        """Режим 5: догрузить новые сделки и обновить статистику"""
+        stats = await get_stats_collector(self.db).update(
+            browser=self.browser,
+            address=self.address,
+            label=self.label,
+        )
+        await self.db.append_report(
+            key=self.encoded_apikey,
+            text=f"{stats['trades']} trades | volume ${stats['volume']:.2f} | "
+                 f"pnl ${stats['pnl']:.2f} | fees ${stats['fees']:.2f}",
+            success=True,
+        )
+        return True
+
+    async def cancel_all(self) -> bool:
+        """Режим 4: отменить все ордеры и закрыть все позиции"""
+        if CANCEL_ORDERS["orders"]:
+            canceled = await self.browser.cancel_all_orders()
+            logger.opt(colors=True).success(f'[+] {self.prefix}Canceled {canceled} orders')
+            await self.db.append_report(
+                key=self.encoded_apikey,
+                text=f"canceled {canceled} orders",
+                success=True,
+            )
+
+        if CANCEL_ORDERS["positions"]:
+            positions = await self.browser.get_positions()
+            if positions:
+                await self.checkpoint(phase="close", tickers=[position.symbol for position in positions])
+                results = await self.browser.create_orders([
+                    {
+                        "type": "MARKET",
+                        "quantity": abs(position.position_amt),
+                        "side": 1 if position.position_amt > 0 else 0,
+                        "ticker": position.symbol,
+                    }
+                    for position in positions
+                ])
+
+                failed = [result for result in results if isinstance(result, Exception)]
+                closed = len(results) - len(failed)
+                logger.opt(colors=True).success(f'[+] {self.prefix}Closed {closed}/{len(positions)} positions')
+                await self.db.append_report(
+                    key=self.encoded_apikey,
+                    text=f"closed {closed}/{len(positions)} positions",
+                    success=not failed,
+                )
+                if failed:
+                    raise CustomError(f"Failed to close {len(failed)} positions: {failed[0]}")
+
+        return True
+
 
 class PairAccounts:
     """Класс для работы с парами аккаунтов"""
 
+    executor = LegExecutor(
+        max_skew=PAIR_SETTINGS["max_leg_skew"],
+        fill_timeout=PAIR_SETTINGS["fill_timeout"],
+        tolerance=PAIR_SETTINGS["neutral_tolerance"],
+    )
+
+    PHASES_DONE = {
+        "open": "opened",
+        "close": "closed",
+    }
+
     def __init__(self, accounts: List[EtherealClient], group_data: Dict):
         self.accounts = accounts
         self.group_data = group_data
 
+        self.checkpoint_key = None
+        if group_data.get("module_info"):
+            self.checkpoint_key = checkpoint_key(group_data["group_index"], group_data["module_info"])
+
+    def _legs_state(self, legs: List[Leg]) -> List[Dict]:
+        """Ноги для чекпоинта: кошелёк - индекс в группе, без адресов и ключей"""
+        wallets = {
+            wallet_data["address"]: index
+            for index, wallet_data in enumerate(self.group_data.get("wallets_data", []))
+        }
+        return [
+            {
+                "wallet": wallets.get(leg.client.address),
+                "ticker": leg.order_data.get("ticker"),
+                "side": leg.order_data.get("side"),
+                "order_id": leg.order.order_id if leg.order else None,
+                "filled": None if leg.fill_unknown else leg.filled,
+            }
+            for leg in legs
+        ]
+
+    async def checkpoint(self, **fields):
+        """Сохранить фазу группы для восстановления после падения"""
+        if self.checkpoint_key:
+            await self.accounts[0].db.save_checkpoint(self.checkpoint_key, **fields)
+
     async def run(self, mode):
         # Заглушка для PairAccounts
         logger.info(f"Running PairAccounts for mode {mode}")
         return "completed"
+
+    async def execute_legs(self, orders_data: List[Dict], action: str = "open") -> Dict:
+        """
+        Исполнить ноги группы одновременно.
+        orders_data[i] - ордер для accounts[i]
+        """
+        legs = [Leg(account, order_data) for account, order_data in zip(self.accounts, orders_data)]
+        await self.checkpoint(
+            phase=action,
+            tickers=sorted({order_data.get("ticker") for order_data in orders_data}),
+        )
+        # Свой хедж LegExecutor делает сам - авто-хедж монитора на это время ждёт
+        with DELTA_MONITOR.executing(self.group_data["group_number"]):
+            result = await self.executor.execute(
+                legs,
+                on_update=lambda legs: self.checkpoint(legs=self._legs_state(legs)),
+            )
+        await self.checkpoint(phase=self.PHASES_DONE.get(action, action), net_delta=result["net_delta"])
+
+        if result["neutral"]:
+            text = f"{action} {len(legs)} legs, neutral in {result['time_to_neutral']:.2f}s"
+            logger.success(
+                f'[+] Group {self.group_data["group_number"]} | {text}, skew {result["skew"] * 1000:.0f}ms'
+            )
+        else:
+            text = f"{action} {len(legs)} legs, residual delta {result['net_delta']:.8f}"
+            if result["unknown_legs"]:
+                text += f", fill unknown for {result['unknown_legs']} legs"
+            logger.error(f'[-] Group {self.group_data["group_number"]} | {text}')
+
+        await self.accounts[0].db.append_report(
+            key=self.group_data["group_index"],
+            text=text,
+            success=result["neutral"],
+        )
+        return result
+
+    async def close_legs(self) -> Dict:
+        """Закрыть позиции всех аккаунтов группы одновременно"""
+        # fetch_positions: при ошибке биржи закрытие падает, а не считает группу пустой
+        positions = await asyncio.gather(*[account.browser.fetch_positions() for account in self.accounts])
+
+        accounts, orders_data = [], []
+        for account, account_positions in zip(self.accounts, positions):
+            for position in account_positions:
+                if position.position_amt:
+                    accounts.append(account)
+                    orders_data.append({
+                        "type": "MARKET",
+                        "quantity": abs(position.position_amt),
+                        "side": 1 if position.position_amt > 0 else 0,
+                        "ticker": position.symbol,
+                    })
+
+        if not orders_data:
+            return {
+                "neutral": True, "skew": 0.0, "time_to_neutral": 0.0, "net_delta": 0.0, "net_deltas": {},
+                "failed_legs": 0, "unknown_legs": 0,
+            }
+
+        return await PairAccounts(accounts, self.group_data).execute_legs(orders_data, action="close")
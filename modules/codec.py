@@ -0,0 +1,84 @@
+from decimal import Decimal
+from typing import Any, Callable, Dict
+from time import perf_counter
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def _stdlib_loads(body: bytes) -> Any:
+    return json.loads(body)
+
+
+DECODERS: Dict[str, Callable[[bytes], Any]] = {"json": _stdlib_loads}
+if msgspec is not None:
+    DECODERS["msgspec"] = msgspec.json.Decoder().decode
+if orjson is not None:
+    DECODERS["orjson"] = orjson.loads
+
+# Самый быстрый из доступных: orjson > msgspec > json
+DECODER_NAME = next(name for name in ("orjson", "msgspec", "json") if name in DECODERS)
+_decode = DECODERS[DECODER_NAME]
+
+# orjson/json.JSONDecodeError - наследники ValueError, msgspec.DecodeError - нет (MsgspecError(Exception))
+DecodeError = (ValueError, TypeError)
+if msgspec is not None:
+    DecodeError += (msgspec.DecodeError,)
+
+
+def loads(body: bytes) -> Any:
+    """Разобрать тело ответа прямо из bytes, без промежуточной str"""
+    return _decode(body)
+
+
+def to_decimal(value: Any) -> Decimal:
+    """Число из ответа API в Decimal (API отдаёт цены строками)"""
+    if value is None or value == "":
+        return Decimal("0")
+    if isinstance(value, (str, int)):
+        return Decimal(value)
+    if isinstance(value, Decimal):
+        return value
+    # float - через repr, чтобы не тащить двоичный хвост
+    return Decimal(repr(value))
+
+
+def to_float(value: Any) -> float:
+    """Число из ответа API во float"""
+    if not value:
+        return 0.0
+    return float(value)
+
+
+def benchmark(body: bytes, rounds: int = 10_000) -> Dict[str, float]:
+    """Микробенчмарк: микросекунд на разбор одного ответа каждым декодером"""
+    results = {}
+    for name, decode in DECODERS.items():
+        decode(body)
+        started = perf_counter()
+        for _ in range(rounds):
+            decode(body)
+        results[name] = (perf_counter() - started) / rounds * 1_000_000
+    return results
+
+
+if __name__ == "__main__":
+    sample = json.dumps({
+        "bids": [[f"{95000 - i * 0.5:.1f}", f"{0.01 * (i + 1):.4f}"] for i in range(50)],
+        "asks": [[f"{95001 + i * 0.5:.1f}", f"{0.01 * (i + 1):.4f}"] for i in range(50)],
+        "positions": [
+            {"product_id": "BTCUSD", "size": "0.015", "entry_price": "95000.5"}
+            for _ in range(50)
+        ],
+    }).encode()
+
+    for decoder_name, micros in benchmark(sample).items():
+        print(f"{decoder_name:>8}: {micros:8.2f} us / response ({len(sample)} bytes)")
@@ -1,4 +1,6 @@
+from typing import Any, List
 from dataclasses import dataclass
+from functools import lru_cache
 
 
 @dataclass
@@ -21,3 +23,83 @@ class EtherealConfig:
 
 # Текущая конфигурация (по умолчанию mainnet)
 ETHEREAL_CONFIG = EtherealConfig()
+
+
+# Настройки-диапазоны [от, до]: первое значение не больше второго
+RANGE_SETTINGS = (
+    "SLEEP_AFTER_ACC",
+    "SLEEP_AFTER_FUTURE",
+    "SLEEP_BETWEEN_OPEN_ORDERS",
+    "SLEEP_BETWEEN_CLOSE_ORDERS",
+    "TRADES_COUNT",
+    "TRADE_AMOUNTS",
+    "FUTURES_LIMITS",
+    "STOP_LOSS_SETTING",
+    "PAIR_SETTINGS",
+    "TOKENS_TO_TRADE",
+)
+
+# Ключи-длительности (секунды), которые не могут быть отрицательными
+DURATION_SUFFIXES = ("interval", "timeout", "ttl", "delay", "cooldown")
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _check_ranges(name: str, value: Any, errors: List[str]):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _check_ranges(f"{name}.{key}", item, errors)
+    elif isinstance(value, (list, tuple)) and len(value) == 2 and all(map(_is_number, value)):
+        if value[0] > value[1]:
+            errors.append(f"{name}: range {list(value)} is reversed")
+
+
+def _check_durations(name: str, value: Any, errors: List[str]):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _check_durations(f"{name}.{key}", item, errors)
+    elif _is_number(value) and name.lower().endswith(DURATION_SUFFIXES) and value < 0:
+        errors.append(f"{name}: must not be negative, got {value}")
+
+
+def validate_settings(settings) -> List[str]:
+    """Ошибки в настройках (пустой список - всё в порядке)"""
+    from modules.storage import BACKENDS
+
+    errors = []
+    for name, minimum in (("THREADS", 1), ("PROCESSES", 1), ("RETRY", 0)):
+        value = getattr(settings, name)
+        if not isinstance(value, int) or value < minimum:
+            errors.append(f"{name}: expected integer >= {minimum}, got {value!r}")
+
+    if settings.DB_BACKEND not in BACKENDS:
+        errors.append(f"DB_BACKEND: expected one of {list(BACKENDS)}, got {settings.DB_BACKEND!r}")
+
+    if settings.DISTRIBUTED_SETTINGS["enable"] and not settings.DISTRIBUTED_SETTINGS["token"]:
+        errors.append("DISTRIBUTED_SETTINGS.token: must be set, workers receive decrypted private keys")
+
+    for name in RANGE_SETTINGS:
+        _check_ranges(name, getattr(settings, name), errors)
+
+    for name in dir(settings):
+        if name.isupper():
+            _check_durations(name, getattr(settings, name), errors)
+
+    return errors
+
+
+@lru_cache(maxsize=None)
+def get_settings():
+    """
+    settings.py, проверенный один раз за процесс. cli.py вызывает его
+    после --config, поэтому ошибка в настройках видна до запуска модулей
+    """
+    from modules.retry import SettingsError
+    import settings
+
+    errors = validate_settings(settings)
+    if errors:
+        raise SettingsError("Invalid settings:\n  " + "\n  ".join(errors))
+    return settings
@@ -1,21 +1,27 @@
+from contextlib import asynccontextmanager
 from random import choice, randint, shuffle
-from cryptography.fernet import Fernet, InvalidToken
-from base64 import urlsafe_b64encode
-from time import sleep, time
+from time import perf_counter, sleep, time
 from os import path, mkdir
 from loguru import logger
-from hashlib import md5
 import asyncio
-import json
 from modules.retry import DataBaseError
+from modules.metrics import DB_LOCK_WAIT, DB_WRITE
+from modules.storage import CheckpointJournal, ReportJournal, SQLiteStorage, get_storage, migrate_json
 from settings import (
     SHUFFLE_WALLETS,
     PAIR_SETTINGS,
     TRADES_COUNT,
+    REPORT_JOURNAL,
+    CHECKPOINTS,
+    VAULT_SETTINGS,
+    DB_BACKEND,
     RETRY,
 )
 
 
+DEFAULT_PASSWORD = "@karamelniy dumb shit encrypting"
+
+
 class DataBase:
     """Управление базой данных с шифрованием"""
 
@@ -28,25 +34,31 @@ class DataBase:
 
     lock = asyncio.Lock()
 
-    def __init__(self):
-        self.modules_db_name = 'databases/modules.json'
-        self.report_db_name = 'databases/report.json'
-        self.stats_db_name = 'databases/stats.json'
-        self.personal_key = None
+    def __init__(self, backend: str = DB_BACKEND, password: str = None):
+        self.vault = None
+        # Пароль из cli.py (окружение / дескриптор); None - спросить в консоли
+        self.password = password
 
         # Создать папки если их нет
         if not path.isdir('databases'):
             mkdir('databases')
 
-        # Создать БД если их нет
-        for db_params in [
-            {"name": self.modules_db_name, "value": "{}"},
-            {"name": self.report_db_name, "value": "{}"},
-            {"name": self.stats_db_name, "value": "{}"},
-        ]:
-            if not path.isfile(db_params["name"]):
-                with open(db_params["name"], 'w') as f:
-                    f.write(db_params["value"])
+        self.storage = get_storage(backend)
+        if isinstance(self.storage, SQLiteStorage):
+            migrate_json(self.storage)
+
+        # Отчёты пишутся в журнал или в само хранилище. Записи в хранилище при включённом журнале -
+        # старые (report.json, перенесённый migrate_json): они читаются вместе с журналом
+        if REPORT_JOURNAL["enable"]:
+            self.reports = ReportJournal(fsync_interval=REPORT_JOURNAL["fsync_interval"])
+        else:
+            self.reports = self.storage
+
+        self.checkpoints = None
+        if CHECKPOINTS["enable"]:
+            self.checkpoints = CheckpointJournal(fsync_interval=CHECKPOINTS["fsync_interval"])
+
+        self._sync_tasks = []
 
         amounts = self.get_amounts()
         if amounts.get("groups_amount"):
@@ -54,74 +66,92 @@ class DataBase:
         else:
             logger.info(f'Loaded {amounts["modules_amount"]} modules for {amounts["accs_amount"]} accounts\n')
 
+    def _open_vault(self, raw_password: str):
+        """Создать хранилище ключей под пароль (cryptography грузится только здесь)"""
+        from modules.vault import KeyVault
+        return KeyVault(
+            raw_password,
+            kdf=VAULT_SETTINGS["kdf"],
+            max_cached=VAULT_SETTINGS["max_cached"],
+            process_pool_threshold=VAULT_SETTINGS["process_pool_threshold"],
+        )
+
     def set_password(self):
         """Установить пароль для шифрования"""
-        if self.personal_key is not None:
+        if self.vault is not None:
             return
 
-        logger.debug('Enter password to encrypt API keys (empty for default):')
-        raw_password = input("")
+        if self.password is not None:
+            raw_password = self.password
+        else:
+            logger.debug('Enter password to encrypt API keys (empty for default):')
+            raw_password = input("")
 
         if not raw_password:
-            raw_password = "@karamelniy dumb shit encrypting"
+            raw_password = DEFAULT_PASSWORD
             logger.success('[+] Soft | You set empty password for Database\n')
         else:
             print('')
             sleep(0.2)
 
-        password = md5(raw_password.encode()).hexdigest().encode()
-        self.personal_key = Fernet(urlsafe_b64encode(password))
+        self.vault = self._open_vault(raw_password)
+        self.password = None
 
     def get_password(self):
         """Получить пароль для дешифровки"""
-        if self.personal_key is not None:
+        if self.vault is not None:
             return
 
-        with open(self.modules_db_name, encoding="utf-8") as f:
-            modules_db = json.load(f)
-
-        if not modules_db:
+        first_key = self.storage.get_first_key()
+        if first_key is None:
             return
 
+        from modules.vault import InvalidToken
+
         # Попробовать default пароль
-        first_key = list(modules_db.keys())[0]
+        vault = self._open_vault(DEFAULT_PASSWORD)
         try:
-            temp_key = Fernet(
-                urlsafe_b64encode(
-                    md5("@karamelniy dumb shit encrypting".encode()).hexdigest().encode()
-                )
-            )
-            self.decode_pk(pk=first_key, key=temp_key)
-            self.personal_key = temp_key
+            vault.check(first_key)
+            self.vault = vault
             return
         except InvalidToken:
-            pass
+            vault.close()
+
+        if self.password is not None:
+            vault = self._open_vault(self.password)
+            try:
+                vault.check(first_key)
+            except InvalidToken:
+                vault.close()
+                raise DataBaseError('Invalid password')
+            self.vault = vault
+            self.password = None
+            return
 
         # Попросить пароль у пользователя
         while True:
+            logger.debug('Enter password to decrypt your API keys (empty for default):')
+            vault = self._open_vault(input(""))
             try:
-                logger.debug('Enter password to decrypt your API keys (empty for default):')
-                raw_password = input("")
-                password = md5(raw_password.encode()).hexdigest().encode()
-                temp_key = Fernet(urlsafe_b64encode(password))
-                self.decode_pk(pk=first_key, key=temp_key)
-                self.personal_key = temp_key
+                vault.check(first_key)
+                self.vault = vault
                 logger.success('[+] Soft | Access granted!\n')
                 return
             except InvalidToken:
+                vault.close()
                 logger.error('[-] Soft | Invalid password\n')
 
-    def encode_pk(self, pk: str, key=None):
+    def encode_pk(self, pk: str):
         """Зашифровать ключ"""
-        if key is None:
-            return self.personal_key.encrypt(pk.encode()).decode()
-        return key.encrypt(pk.encode()).decode()
+        return self.vault.encrypt(pk)
 
-    def decode_pk(self, pk: str, key=None):
+    def decode_pk(self, pk: str):
         """Расшифровать ключ"""
-        if key is None:
-            return self.personal_key.decrypt(pk).decode()
-        return key.decrypt(pk).decode()
+        return self.vault.decrypt(pk)
+
+    def decode_all(self, tokens: list):
+        """Расшифровать все ключи одной пачкой"""
+        return self.vault.decrypt_many(tokens)
 
     def create_modules(self, mode: int):
         """Создать модули торговли"""
@@ -223,16 +253,16 @@ class DataBase:
         else:
             proxies = list(proxies * (len(api_keys) // len(proxies) + 1))[:len(api_keys)]
 
-        with open(self.report_db_name, 'w') as f:
-            f.write('{}')
+        self.reports.clear_reports()
+        if self.reports is not self.storage:
+            self.storage.clear_reports()
 
         if mode == 102:
             new_modules = create_pair_trades(api_keys, labels, proxies)
         else:
             new_modules = create_single_trades(api_keys, labels, proxies)
 
-        with open(self.modules_db_name, 'w', encoding="utf-8") as f:
-            json.dump(new_modules, f)
+        self.storage.replace_modules(new_modules)
 
         logger.opt(colors=True).critical(
             'Dont Forget To Remove API Keys from <white>apikeys.txt</white>!'
@@ -249,35 +279,200 @@ class DataBase:
 
     def get_amounts(self):
         """Получить количество модулей и аккаунтов"""
-        with open(self.modules_db_name, encoding="utf-8") as f:
-            modules_db = json.load(f)
+        return self.storage.get_amounts()
 
-        if not modules_db:
-            return {"accs_amount": 0, "modules_amount": 0, "groups_amount": 0}
+    def get_all_modules(self, unique_wallets: bool = False):
+        """Получить все модули для выполнения"""
+        self.get_password()
 
-        first_val = list(modules_db.values())[0]
-        is_group = "group_number" in first_val
+        if self.storage.is_empty():
+            return 'No more accounts left'
 
-        modules_len = sum([len(modules_db[acc].get("modules", [])) for acc in modules_db])
+        if self.storage.is_group():
+            raise DataBaseError('Unexpected database type for this mode')
 
-        return {
-            "groups_amount" if is_group else "accs_amount": len(modules_db),
-            "modules_amount": modules_len
-        }
+        all_modules = self.storage.get_all_modules(unique_wallets=unique_wallets)
+        if not all_modules:
+            return 'No more accounts left'
 
-    def get_all_modules(self, unique_wallets: bool = False):
-        """Получить все модули для выполнения"""
-        self.get_password()
+        decoded = self.decode_all(
+            [module_data["encoded_apikey"] for module_data in all_modules] +
+            [module_data["address"] for module_data in all_modules]
+        )
+        for module_data in all_modules:
+            module_data["apikey"] = decoded[module_data["encoded_apikey"]]
+            module_data["address"] = decoded[module_data["address"]]
+
+        return all_modules
 
-        with open(self.modules_db_name, encoding="utf-8") as f:
-            modules_db = json.load(f)
+    def get_all_groups(self):
+        """Получить все группы для парной торговли"""
+        self.get_password()
 
-        if not modules_db:
+        if self.storage.is_empty():
             return 'No more accounts left'
 
-        is_group = "group_number" in list(modules_db.values())[0]
-        if is_group:
+        if not self.storage.is_group():
             raise DataBaseError('Unexpected database type for this mode')
 
-        all_modules = list(modules_db.values())
-        return all_modules
+        all_groups = self.storage.get_all_groups()
+        if not all_groups:
+            return 'No more accounts left'
+
+        decoded = self.decode_all([
+            token
+            for group_data in all_groups
+            for wallet_data in group_data["wallets_data"]
+            for token in (wallet_data["encoded_apikey"], wallet_data["address"])
+        ])
+        for group_data in all_groups:
+            group_data["wallets_data"] = [
+                {
+                    **wallet_data,
+                    "apikey": decoded[wallet_data["encoded_apikey"]],
+                    "address": decoded[wallet_data["address"]],
+                }
+                for wallet_data in group_data["wallets_data"]
+            ]
+
+        return all_groups
+
+    @asynccontextmanager
+    async def _locked(self, operation: str):
+        """Лок базы + замер ожидания лока и времени записи"""
+        started = perf_counter()
+        async with self.lock:
+            acquired = perf_counter()
+            DB_LOCK_WAIT.observe(acquired - started)
+            try:
+                yield
+            finally:
+                DB_WRITE.observe(perf_counter() - acquired, (operation,))
+
+    async def remove_module(self, module_data: dict):
+        """Завершить один модуль аккаунта"""
+        async with self._locked("finish_module"):
+            return self.storage.finish_module(
+                owner=module_data["encoded_apikey"],
+                module_id=module_data["module_info"]["id"],
+                success=module_data["module_info"]["status"] is True,
+            )
+
+    async def remove_account(self, module_data: dict):
+        """Завершить все модули аккаунта"""
+        async with self._locked("finish_owner"):
+            self.storage.finish_owner(
+                owner=module_data["encoded_apikey"],
+                success=module_data["module_info"]["status"] is True,
+            )
+
+    async def remove_group(self, group_data: dict):
+        """Завершить модули группы"""
+        async with self._locked("finish_owner"):
+            self.storage.finish_owner(
+                owner=group_data["group_index"],
+                success=group_data["module_info"]["status"] is True,
+            )
+
+    async def append_report(self, key: str, text: str, success=True):
+        """Добавить запись в отчёт"""
+        async with self._locked("append_report"):
+            self.reports.append_report(key=key, text=text, success=success)
+
+    async def get_account_reports(
+            self,
+            key: str,
+            label: str,
+            address: str = None,
+            last_module: bool = False,
+            mode: int = None,
+    ):
+        """
+        Собрать отчёт аккаунта/группы для Telegram.
+        last_module=True - только записи с прошлого вызова (они удаляются)
+        """
+        async with self._locked("pop_reports" if last_module else "get_reports"):
+            reports = self.reports.get_reports(key=key)
+            legacy = self.storage.get_reports(key=key) if self.reports is not self.storage else []
+            if last_module:
+                self.reports.delete_reports(key=key)
+                if legacy:
+                    self.storage.delete_reports(key=key)
+            reports = legacy + reports
+
+        if not reports:
+            return 'No actions'
+
+        header = f'<b>{label}</b>'
+        if mode is not None:
+            header += f' | Mode {mode}'
+        if address:
+            header += f'\n<code>{address}</code>'
+
+        texts = [f'{self.STATUS_SMILES.get(success, "")}{text}' for text, success in reports]
+        return header + '\n\n' + '\n'.join(texts)
+
+    def save_stats(self, address: str, data: dict):
+        """Сохранить статистику аккаунта"""
+        with DB_WRITE.time(("save_stats",)):
+            self.storage.save_stats(address=address, data=data)
+
+    def get_stats(self):
+        """Получить статистику всех аккаунтов"""
+        return self.storage.get_stats()
+
+    async def save_checkpoint(self, key: str, **fields):
+        """Записать состояние выполняемого модуля (фаза, ордера, объём)"""
+        if self.checkpoints is not None:
+            async with self._locked("save_checkpoint"):
+                self.checkpoints.save(key, **fields)
+
+    async def finish_checkpoint(self, key: str):
+        """Модуль завершён и убран из базы - чекпоинт не нужен"""
+        if self.checkpoints is not None:
+            async with self._locked("finish_checkpoint"):
+                self.checkpoints.finish(key)
+
+    def get_checkpoints(self):
+        """Незавершённые модули прошлых запусков"""
+        if self.checkpoints is None:
+            return {}
+        return self.checkpoints.pending()
+
+    def _journals(self):
+        journals = [self.checkpoints]
+        if self.reports is not self.storage:
+            journals.append(self.reports)
+        return [journal for journal in journals if journal is not None]
+
+    @staticmethod
+    async def _sync_loop(journal):
+        """fsync журнала раз в fsync_interval секунд в потоке, без лока базы"""
+        while True:
+            await asyncio.sleep(journal.fsync_interval)
+            if journal.dirty:
+                await asyncio.to_thread(journal.sync)
+
+    def start_sync(self):
+        """Запустить фоновый fsync журналов (на время runner)"""
+        if not self._sync_tasks:
+            self._sync_tasks = [asyncio.create_task(self._sync_loop(journal)) for journal in self._journals()]
+
+    async def stop_sync(self):
+        """Остановить фоновый fsync и сбросить остаток записей"""
+        for task in self._sync_tasks:
+            task.cancel()
+        await asyncio.gather(*self._sync_tasks, return_exceptions=True)
+        self._sync_tasks = []
+        for journal in self._journals():
+            await asyncio.to_thread(journal.sync)
+
+    def close(self):
+        """Сбросить отчёты на диск, затереть ключи и закрыть хранилище"""
+        if self.vault is not None:
+            self.vault.close()
+        if self.checkpoints is not None:
+            self.checkpoints.close()
+        if self.reports is not self.storage:
+            self.reports.close()
+        self.storage.close()
@@ -0,0 +1,608 @@
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from itertools import count
+from loguru import logger
+from time import monotonic
+import asyncio
+import inspect
+import hmac
+import json
+import os
+from modules.scheduler import Job, Scheduler
+from modules.sharding import assign_shards
+
+
+# Методы DataBase, которые воркер вызывает у координатора
+DB_METHODS = {
+    "append_report",
+    "remove_module",
+    "remove_account",
+    "remove_group",
+    "get_account_reports",
+    "save_stats",
+    "get_stats",
+    "save_checkpoint",
+    "finish_checkpoint",
+}
+
+
+# Предел строки протокола: get_stats/load_stats передаёт статистику всех
+# аккаунтов одной строкой, стандартных 64 KiB не хватает уже на тысячи аккаунтов
+STREAM_LIMIT = 64 * 1024 * 1024
+
+
+def parse_address(address: str) -> Tuple[Optional[str], Optional[int], Optional[str]]:
+    """'host:port' или 'unix:/path/to.sock' -> (host, port, path)"""
+    if address.startswith("unix:"):
+        return None, None, address[len("unix:"):]
+    host, port = address.rsplit(":", 1)
+    return host, int(port), None
+
+
+async def _send(writer: asyncio.StreamWriter, message: Dict):
+    writer.write(json.dumps(message).encode() + b"\n")
+    await writer.drain()
+
+
+class Lease:
+    """Задача, выданная воркеру на время ttl (продлевается heartbeat'ами)"""
+
+    __slots__ = ("lease_id", "job", "worker", "expires_at", "shard")
+
+    def __init__(self, lease_id: int, job: Job, worker: str, expires_at: float, shard: int = 0):
+        self.lease_id = lease_id
+        self.job = job
+        self.worker = worker
+        self.expires_at = expires_at
+        self.shard = shard
+
+
+class Coordinator:
+    """
+    Координатор распределённого запуска.
+
+    Владеет базой и очередью модулей. Очередь - тот же Scheduler с
+    очередями по адресам: воркер получает только задачу, все адреса
+    которой свободны, поэтому один адрес не выполняется на двух нодах.
+    Аренда задачи продлевается heartbeat'ами воркера; просроченная задача
+    возвращается в очередь. Обрыв соединения аренду не снимает: воркер мог
+    ещё не заметить обрыв и торговать по этим адресам, поэтому задача уходит
+    другому воркеру только по истечении lease_ttl.
+
+    Задачи несут расшифрованные ключи аккаунтов (apikey) открытым JSON:
+    любой, кто знает token и может подключиться к address, получает их.
+    Пустой token запрещён; TCP адрес - только в доверенной сети или через
+    SSH/WireGuard туннель.
+
+    При shards > 1 задачи делятся на шарды по адресам (modules.sharding):
+    у каждого шарда своя очередь, воркер с shard=N берёт задачи только из
+    неё. Задачи с общими адресами всегда попадают в один шард.
+    """
+
+    def __init__(
+            self,
+            db,
+            address: str,
+            token: str,
+            lease_ttl: float = 60.0,
+            mode: Optional[int] = None,
+            shards: int = 1,
+            report: Optional[Callable[[str], Awaitable]] = None,
+    ):
+        if not token:
+            raise ValueError("Coordinator token must not be empty: workers receive private keys")
+
+        self.db = db
+        self.address = address
+        self.token = token
+        self.lease_ttl = lease_ttl
+        self.mode = mode
+        self.shards = max(1, shards)
+        self.report = report
+
+        self.queues = [Scheduler(concurrency=1) for _ in range(self.shards)]
+        self.leases: Dict[int, Lease] = {}
+        self._submitted: List[Tuple[Tuple[str, ...], str, Dict]] = []
+        self._lease_ids = count(1)
+        self._done: Optional[asyncio.Event] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._clients: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+        self._unix_path: Optional[str] = None
+
+        self.total = 0
+        self.completed = 0
+        self.expired = 0
+        self.shard_completed = [0] * self.shards
+        self._progress_step = 1
+        self._next_progress = 1
+
+    def submit(self, addresses: Iterable[str], func: str, **kwargs):
+        """Добавить задачу: func - имя обработчика на воркере"""
+        self._submitted.append((tuple(addresses), func, kwargs))
+
+    def _distribute(self):
+        """Разложить добавленные задачи по очередям шардов"""
+        if not self._submitted:
+            return
+
+        shard_ids = assign_shards([addresses for addresses, _, _ in self._submitted], self.shards)
+        for shard, (addresses, func, kwargs) in zip(shard_ids, self._submitted):
+            self.queues[shard].submit(addresses, func, **kwargs)
+        self.total += len(self._submitted)
+        self._submitted = []
+
+        # Прогресс в лог примерно каждые 5%
+        self._progress_step = max(1, self.total // 20)
+        self._next_progress = self.completed + self._progress_step
+
+    def is_empty(self, shard: Optional[int] = None) -> bool:
+        if shard is not None:
+            return self.queues[shard].is_empty()
+        return not self._submitted and all(queue.is_empty() for queue in self.queues)
+
+    def stats(self) -> Dict[str, int]:
+        """Суммарное состояние очередей всех шардов"""
+        total = {"pending": len(self._submitted), "running": 0, "ready": 0, "addresses": 0}
+        for queue in self.queues:
+            for key, value in queue.stats().items():
+                total[key] += value
+        return total
+
+    # ---------- аренда ----------
+
+    def _lease(self, worker: str, shard: Optional[int] = None) -> Optional[Lease]:
+        shards = range(self.shards) if shard is None else [shard]
+        for index in shards:
+            job = self.queues[index].take_ready()
+            if job is not None:
+                lease = Lease(next(self._lease_ids), job, worker, monotonic() + self.lease_ttl, index)
+                self.leases[lease.lease_id] = lease
+                return lease
+        return None
+
+    def _complete(self, lease_id: int):
+        lease = self.leases.pop(lease_id, None)
+        if lease is None:
+            return
+
+        self.completed += 1
+        self.shard_completed[lease.shard] += 1
+        self.queues[lease.shard].complete(lease.job)
+        if self.completed >= self._next_progress and self.completed < self.total:
+            self._next_progress = self.completed + self._progress_step
+            logger.info(f'[•] Coordinator | {self.completed}/{self.total} jobs done')
+        if self.is_empty():
+            self._done.set()
+
+    def _requeue(self, lease: Lease, reason: str):
+        """Вернуть задачу в начало очереди (её адреса остаются за ней)"""
+        self.leases.pop(lease.lease_id, None)
+        self.expired += 1
+        self.queues[lease.shard].requeue(lease.job)
+        logger.warning(f'[-] Coordinator | Lease {lease.lease_id} of {lease.worker} {reason}, job requeued')
+
+    async def _reaper(self):
+        """Забирать задачи у воркеров, переставших слать heartbeat"""
+        while True:
+            await asyncio.sleep(max(1.0, self.lease_ttl / 4))
+            now = monotonic()
+            for lease in list(self.leases.values()):
+                if lease.expires_at < now:
+                    self._requeue(lease, "expired")
+
+    # ---------- протокол ----------
+
+    async def _call_db(self, method: str, params: Dict) -> Any:
+        if method not in DB_METHODS:
+            raise ValueError(f"Unknown method {method}")
+
+        result = getattr(self.db, method)(**params)
+        if inspect.isawaitable(result):
+            result = await result
+        return result
+
+    async def _dispatch(self, message: Dict, worker: str, shard: Optional[int] = None) -> Dict:
+        op = message.get("op")
+
+        if op == "lease":
+            lease = self._lease(worker, shard)
+            if lease is not None:
+                return {
+                    "op": "job",
+                    "lease_id": lease.lease_id,
+                    "func": lease.job.func,
+                    "kwargs": lease.job.args,
+                    "ttl": self.lease_ttl,
+                }
+            return {"op": "done"} if self.is_empty(shard) else {"op": "wait"}
+
+        if op == "heartbeat":
+            now = monotonic()
+            lost = []
+            for lease_id in message.get("leases", []):
+                lease = self.leases.get(lease_id)
+                if lease is None or lease.worker != worker:
+                    lost.append(lease_id)
+                else:
+                    lease.expires_at = now + self.lease_ttl
+            return {"op": "ok", "lost": lost}
+
+        if op == "complete":
+            lease = self.leases.get(message.get("lease_id"))
+            if lease is not None and lease.worker == worker:
+                self._complete(lease.lease_id)
+            return {"op": "ok"}
+
+        if op == "report":
+            # Отчёты воркеров уходят в Telegram одной очередью координатора (общий лимит бота)
+            if self.report is not None:
+                await self.report(str(message.get("logs", "")))
+            return {"op": "ok"}
+
+        if op == "db":
+            try:
+                return {"op": "result", "result": await self._call_db(message["method"], message.get("params", {}))}
+            except Exception as e:
+                return {"op": "error", "error": str(e)}
+
+        return {"op": "error", "error": f"Unknown op {op}"}
+
+    async def _handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        worker = None
+        self._clients[asyncio.current_task()] = writer
+        try:
+            hello = json.loads(await reader.readline() or b"{}")
+            token = str(hello.get("token") or "").encode()
+            if hello.get("op") != "hello" or not hmac.compare_digest(token, self.token.encode()):
+                await _send(writer, {"op": "error", "error": "Unauthorized"})
+                return
+
+            shard = hello.get("shard")
+            if shard is not None and not 0 <= shard < self.shards:
+                await _send(writer, {"op": "error", "error": f"Unknown shard {shard}"})
+                return
+
+            worker = str(hello.get("worker"))
+            logger.info(f'[•] Coordinator | Worker {worker} connected')
+            await _send(writer, {"op": "welcome", "lease_ttl": self.lease_ttl, "mode": self.mode})
+
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                response = await self._dispatch(message, worker, shard)
+                response["id"] = message.get("id")
+                await _send(writer, response)
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logger.debug(f'Coordinator | Worker {worker} connection error: {e}')
+        except ValueError as e:
+            logger.error(f'[-] Coordinator | Worker {worker} sent a bad message: {e}')
+        finally:
+            self._clients.pop(asyncio.current_task(), None)
+            writer.close()
+            if worker is not None:
+                held = sum(lease.worker == worker for lease in self.leases.values())
+                logger.info(
+                    f'[•] Coordinator | Worker {worker} disconnected'
+                    + (f', {held} leases are returned after ttl' if held else '')
+                )
+
+    async def start(self):
+        """Начать принимать воркеров (serve вызывает сам, если не вызван раньше)"""
+        self._done = asyncio.Event()
+        self._distribute()
+        if self.is_empty() or self._server is not None:
+            return
+
+        host, port, unix_path = parse_address(self.address)
+        if unix_path:
+            if os.path.exists(unix_path):
+                os.remove(unix_path)
+            self._server = await asyncio.start_unix_server(self._handle_client, path=unix_path, limit=STREAM_LIMIT)
+            self._unix_path = unix_path
+        else:
+            self._server = await asyncio.start_server(self._handle_client, host, port, limit=STREAM_LIMIT)
+            logger.warning(f'[-] Coordinator | Private keys are sent to workers unencrypted over {self.address}')
+
+        shards = f" in {self.shards} shards" if self.shards > 1 else ""
+        logger.info(f'[•] Coordinator | Serving {self.total} jobs{shards} on {self.address}')
+
+    def stop(self):
+        """Завершить serve, не дожидаясь оставшихся задач"""
+        if self._done is not None:
+            self._done.set()
+
+    async def serve(self):
+        """Раздавать задачи, пока очередь не опустеет"""
+        if self._server is None:
+            await self.start()
+        if self.is_empty():
+            return
+
+        reaper = asyncio.create_task(self._reaper())
+        try:
+            await self._done.wait()
+        finally:
+            reaper.cancel()
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+            # Воркеры получили done или получат обрыв соединения - оба значат "работы нет"
+            clients = list(self._clients)
+            for writer in self._clients.values():
+                writer.close()
+            if clients:
+                await asyncio.wait(clients, timeout=5)
+            if self._unix_path and os.path.exists(self._unix_path):
+                os.remove(self._unix_path)
+
+        logger.info(f'[•] Coordinator | {self.completed} jobs done, {self.expired} leases reclaimed')
+        if self.shards > 1:
+            per_shard = ", ".join(f"#{shard}: {done}" for shard, done in enumerate(self.shard_completed))
+            logger.info(f'[•] Coordinator | Jobs by shard - {per_shard}')
+
+
+class Connection:
+    """Соединение воркера с координатором: запрос -> ответ по id"""
+
+    def __init__(self, address: str, worker: str, token: str = "", shard: Optional[int] = None):
+        self.address = address
+        self.worker = worker
+        self.token = token
+        self.shard = shard
+
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._waiters: Dict[int, asyncio.Future] = {}
+        self._ids = count(1)
+        self._task: Optional[asyncio.Task] = None
+        self.closed = asyncio.Event()
+        self.lease_ttl = 60.0
+        self.mode: Optional[int] = None
+
+    async def connect(self):
+        host, port, unix_path = parse_address(self.address)
+        if unix_path:
+            self._reader, self._writer = await asyncio.open_unix_connection(unix_path, limit=STREAM_LIMIT)
+        else:
+            self._reader, self._writer = await asyncio.open_connection(host, port, limit=STREAM_LIMIT)
+
+        await _send(self._writer, {"op": "hello", "worker": self.worker, "token": self.token, "shard": self.shard})
+        welcome = json.loads(await self._reader.readline() or b"{}")
+        if welcome.get("op") != "welcome":
+            raise ConnectionError(f"Coordinator refused connection: {welcome.get('error')}")
+
+        self.lease_ttl = welcome["lease_ttl"]
+        self.mode = welcome.get("mode")
+        self._task = asyncio.create_task(self._read())
+
+    async def _read(self):
+        try:
+            while True:
+                line = await self._reader.readline()
+                if not line:
+                    break
+                message = json.loads(line)
+                waiter = self._waiters.pop(message.get("id"), None)
+                if waiter is not None and not waiter.done():
+                    waiter.set_result(message)
+        except (ConnectionError, ValueError) as e:
+            # ValueError - строка больше STREAM_LIMIT или не JSON
+            logger.error(f'[-] Worker | Coordinator connection error: {e}')
+        finally:
+            self.closed.set()
+            for waiter in self._waiters.values():
+                if not waiter.done():
+                    waiter.set_exception(ConnectionError("Coordinator connection closed"))
+            self._waiters.clear()
+
+    async def request(self, op: str, **params) -> Dict:
+        if self.closed.is_set():
+            raise ConnectionError("Coordinator connection closed")
+        message_id = next(self._ids)
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[message_id] = waiter
+        await _send(self._writer, {"op": op, "id": message_id, **params})
+        return await waiter
+
+    async def close(self):
+        self.closed.set()
+        if self._task:
+            self._task.cancel()
+        if self._writer:
+            self._writer.close()
+
+
+class RemoteDataBase:
+    """
+    DataBase воркера: асинхронные методы выполняются на координаторе.
+    Синхронные save_stats/get_stats - через локальный кэш и фоновую отправку
+    """
+
+    STATUS_SMILES = {
+        True: '✅ ',
+        False: "❌ ",
+        None: "",
+        "WARNING": "⚠️ ",
+    }
+
+    def __init__(self, connection: Connection):
+        self.connection = connection
+        self._stats: Dict[str, Dict] = {}
+        self._pending: Set[asyncio.Task] = set()
+
+    async def _call(self, method: str, **params) -> Any:
+        response = await self.connection.request("db", method=method, params=params)
+        if response["op"] == "error":
+            raise RuntimeError(f"Coordinator {method} failed: {response['error']}")
+        return response["result"]
+
+    async def load_stats(self):
+        self._stats = await self._call("get_stats")
+
+    async def append_report(self, key: str, text: str, success=True):
+        await self._call("append_report", key=key, text=text, success=success)
+
+    async def remove_module(self, module_data: dict):
+        await self._call("remove_module", module_data=module_data)
+
+    async def remove_account(self, module_data: dict):
+        await self._call("remove_account", module_data=module_data)
+
+    async def remove_group(self, group_data: dict):
+        await self._call("remove_group", group_data=group_data)
+
+    async def get_account_reports(self, **kwargs) -> str:
+        return await self._call("get_account_reports", **kwargs)
+
+    async def save_checkpoint(self, key: str, **fields):
+        await self._call("save_checkpoint", key=key, **fields)
+
+    async def finish_checkpoint(self, key: str):
+        await self._call("finish_checkpoint", key=key)
+
+    def save_stats(self, address: str, data: dict):
+        self._stats[address] = data
+        task = asyncio.ensure_future(self._call("save_stats", address=address, data=data))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    def get_stats(self) -> Dict[str, Dict]:
+        return dict(self._stats)
+
+    async def flush(self):
+        """Дождаться отправки статистики"""
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    def close(self):
+        pass
+
+
+class RemoteTgReport:
+    """TgReport воркера: логи отправляет координатор своей очередью Telegram"""
+
+    def __init__(self, connection: Connection):
+        self.connection = connection
+
+    def queue_size(self) -> int:
+        return 0
+
+    async def send_log(self, logs: str):
+        if logs == 'No actions':
+            return
+        await self.connection.request("report", logs=logs)
+
+    async def close(self):
+        pass
+
+
+class Worker:
+    """
+    Воркер: берёт задачи у координатора и выполняет до concurrency сразу.
+    Пока задача выполняется, её аренда продлевается heartbeat'ом;
+    если координатор сообщил, что аренда потеряна - задача отменяется.
+    При обрыве соединения (или heartbeat без ответа) отменяются все задачи:
+    после lease_ttl координатор отдаст их адреса другому воркеру.
+    """
+
+    def __init__(
+            self,
+            connection: Connection,
+            handlers: Dict[str, Callable[..., Awaitable[Any]]],
+            concurrency: int = 1,
+            heartbeat: float = 15.0,
+            wait_interval: float = 1.0,
+    ):
+        self.connection = connection
+        self.handlers = handlers
+        self.concurrency = max(1, concurrency)
+        self.heartbeat = heartbeat
+        self.wait_interval = wait_interval
+
+        self.tasks: Dict[int, asyncio.Task] = {}
+        self.completed = 0
+
+    async def _run_job(self, lease_id: int, func: str, kwargs: Dict):
+        try:
+            await self.handlers[func](**kwargs)
+        except Exception as e:
+            logger.error(f'[-] Worker | Job {lease_id} error: {e}')
+
+        try:
+            await self.connection.request("complete", lease_id=lease_id)
+            self.completed += 1
+        except ConnectionError as e:
+            logger.error(f'[-] Worker | Failed to complete job {lease_id}: {e}')
+
+    def _cancel_jobs(self, reason: str):
+        """Отменить все выполняемые задачи"""
+        if self.tasks:
+            logger.warning(f'[-] Worker | {reason}, cancelling {len(self.tasks)} jobs')
+        for task in self.tasks.values():
+            task.cancel()
+
+    async def _heartbeat(self):
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self.connection.closed.wait(), self.heartbeat)
+                    raise ConnectionError("Coordinator connection closed")
+                except asyncio.TimeoutError:
+                    pass
+                if not self.tasks:
+                    continue
+
+                # Ответ должен прийти раньше, чем координатор сочтёт аренду просроченной
+                response = await asyncio.wait_for(
+                    self.connection.request("heartbeat", leases=list(self.tasks)),
+                    self.heartbeat,
+                )
+                for lease_id in response.get("lost", []):
+                    task = self.tasks.pop(lease_id, None)
+                    if task is not None:
+                        logger.warning(f'[-] Worker | Lease {lease_id} lost, cancelling job')
+                        task.cancel()
+        except (ConnectionError, asyncio.TimeoutError) as e:
+            self._cancel_jobs(f"Heartbeat failed ({e or 'timeout'})")
+            await self.connection.close()
+
+    async def run(self):
+        """Брать задачи, пока координатор не скажет done"""
+        heartbeat = asyncio.create_task(self._heartbeat())
+        try:
+            while True:
+                if len(self.tasks) >= self.concurrency:
+                    await asyncio.wait(list(self.tasks.values()), return_when=asyncio.FIRST_COMPLETED)
+                    continue
+
+                try:
+                    response = await self.connection.request("lease")
+                except ConnectionError:
+                    self._cancel_jobs("Coordinator closed the connection")
+                    break
+                if response["op"] == "job":
+                    lease_id = response["lease_id"]
+                    task = asyncio.create_task(self._run_job(lease_id, response["func"], response["kwargs"]))
+                    self.tasks[lease_id] = task
+                    task.add_done_callback(lambda _, lease_id=lease_id: self.tasks.pop(lease_id, None))
+                elif response["op"] == "wait":
+                    # Свободных адресов нет - ждём, пока освободятся
+                    if self.tasks:
+                        await asyncio.wait(
+                            list(self.tasks.values()),
+                            timeout=self.wait_interval,
+                            return_when=asyncio.FIRST_COMPLETED,
+                        )
+                    else:
+                        await asyncio.sleep(self.wait_interval)
+                else:
+                    break
+
+            if self.tasks:
+                await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+        finally:
+            heartbeat.cancel()
+
+        logger.success(f'[+] Worker | {self.completed} jobs done')
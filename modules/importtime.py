@@ -0,0 +1,48 @@
+from typing import Dict, Tuple
+from statistics import median
+import subprocess
+import sys
+import os
+
+
+# Бюджет холодного импорта, секунд (с запасом под медленные машины).
+# modules и cli не должны тянуть aiohttp/cryptography/numpy/inquirer
+IMPORT_BUDGETS = {
+    "modules": 0.01,
+    "cli": 0.05,
+    "modules.database": 0.4,
+    "main": 1.0,
+}
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(module: str, runs: int = 5) -> float:
+    """Медиана времени импорта модуля в чистом процессе (python -X importtime), секунд"""
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+        # "import time: self [us] | cumulative | imported package"
+        for line in reversed(result.stderr.splitlines()):
+            parts = line.split("|")
+            if len(parts) == 3 and parts[2].strip() == module:
+                timings.append(int(parts[1]) / 1e6)
+                break
+    return median(timings) if timings else 0.0
+
+
+def check(budgets: Dict[str, float] = IMPORT_BUDGETS, runs: int = 5) -> Dict[str, Tuple[float, float]]:
+    """module -> (время, бюджет)"""
+    return {module: (measure(module, runs), budget) for module, budget in budgets.items()}
+
+
+if __name__ == "__main__":
+    over = 0
+    for module, (seconds, budget) in check().items():
+        status = "ok" if seconds <= budget else "OVER"
+        over += seconds > budget
+        print(f"{module:>18}: {seconds * 1000:8.1f} ms  (budget {budget * 1000:.0f} ms)  {status}")
+    raise SystemExit(1 if over else 0)
@@ -0,0 +1,283 @@
+from typing import Awaitable, Callable, Dict, List, Optional
+from time import monotonic
+from loguru import logger
+import asyncio
+from modules.models import Order
+from modules.tracker import ORDER_TRACKER
+from modules.metrics import LEG_SKEW, TIME_TO_NEUTRAL
+
+
+class Leg:
+    """Одна нога дельта-нейтральной сделки"""
+
+    __slots__ = ("client", "order_data", "order", "filled", "fill_unknown", "sent_at", "acked_at", "error")
+
+    def __init__(self, client, order_data: Dict):
+        self.client = client
+        self.order_data = order_data
+        self.order: Optional[Order] = None
+        self.filled = 0.0
+        # Статус ордера получить не удалось: filled не известен, хеджировать по нему нельзя
+        self.fill_unknown = False
+        self.sent_at: Optional[float] = None
+        self.acked_at: Optional[float] = None
+        self.error: Optional[Exception] = None
+
+    @property
+    def sign(self) -> int:
+        """+1 для лонга (side 0), -1 для шорта"""
+        return 1 if self.order_data.get("side") == 0 else -1
+
+    @property
+    def ticker(self) -> str:
+        return self.order_data.get("ticker")
+
+    @property
+    def target(self) -> float:
+        return float(self.order_data.get("quantity", 0))
+
+    @property
+    def remaining(self) -> float:
+        return max(0.0, self.target - self.filled)
+
+
+class LegExecutor:
+    """
+    Одновременное исполнение ног группы.
+
+    Все ордера готовятся заранее и отправляются разом по общему сигналу.
+    Разброс подтверждений (ack) ног больше max_skew секунд попадает в лог.
+    После отправки исполнения отслеживает ORDER_TRACKER: нога, которая
+    закрылась частично исполненной, сразу добирается маркет ордером, не
+    дожидаясь остальных. Остаток дельты после fill_timeout добивается по
+    каждому тикеру отдельно. Тикер с ногой неизвестного исполнения не
+    хеджируется, группа считается не нейтральной.
+    Разброс и время до нейтральности - метрики legs_skew_seconds и
+    group_time_to_neutral_seconds.
+    """
+
+    def __init__(
+            self,
+            max_skew: float = 0.5,
+            fill_timeout: float = 30.0,
+            tolerance: float = 1e-8,
+    ):
+        self.max_skew = max_skew
+        self.fill_timeout = fill_timeout
+        self.tolerance = tolerance
+
+        self.time_to_neutral: List[float] = []
+
+    @staticmethod
+    def net_deltas(legs: List[Leg]) -> Dict[str, float]:
+        """Дельта исполненных объёмов по тикерам (монеты разных рынков не складываются)"""
+        deltas: Dict[str, float] = {}
+        for leg in legs:
+            deltas[leg.ticker] = deltas.get(leg.ticker, 0.0) + leg.sign * leg.filled
+        return deltas
+
+    @classmethod
+    def net_delta(cls, legs: List[Leg]) -> float:
+        """Наибольшая по модулю дельта среди тикеров"""
+        return max(cls.net_deltas(legs).values(), key=abs, default=0.0)
+
+    @staticmethod
+    async def _prepare(legs: List[Leg]):
+        """Подготовить ноги заранее: сессии открыты, объёмы проверены"""
+        for leg in legs:
+            if leg.target <= 0:
+                raise ValueError(f"Leg quantity must be positive: {leg.order_data}")
+        await asyncio.gather(*[
+            leg.client.browser.initialize()
+            for leg in legs
+            if not leg.client.browser.session
+        ])
+
+    async def _send(self, leg: Leg, start: asyncio.Event):
+        """Отправить ногу по общему сигналу"""
+        await start.wait()
+        leg.sent_at = monotonic()
+        try:
+            leg.order = await leg.client.browser.create_order(leg.order_data)
+        except Exception as e:
+            leg.error = e
+        leg.acked_at = monotonic()
+
+    async def _fire(self, legs: List[Leg]) -> float:
+        """Отправить все ноги одновременно. Возвращает разброс подтверждений биржи"""
+        start = asyncio.Event()
+        tasks = [asyncio.create_task(self._send(leg, start)) for leg in legs]
+        start.set()
+
+        done, pending = await asyncio.wait(tasks, timeout=self.max_skew)
+        if pending:
+            # Одна нога отстаёт - ждём её, но считаем превышение разброса
+            await asyncio.wait(pending)
+
+        acked = [leg.acked_at for leg in legs if leg.order is not None]
+        skew = max(acked) - min(acked) if acked else 0.0
+        LEG_SKEW.observe(skew)
+        if pending:
+            logger.warning(f'[-] Legs | {len(pending)} legs acked later than {self.max_skew}s')
+        return skew
+
+    @staticmethod
+    async def _market(leg: Leg, sign: int, amount: float) -> Order:
+        """Маркет ордер на аккаунте ноги: sign +1 покупка, -1 продажа"""
+        return await leg.client.browser.create_order({
+            "type": "MARKET",
+            "quantity": amount,
+            "side": 0 if sign > 0 else 1,
+            "ticker": leg.ticker,
+        })
+
+    async def _top_up(self, leg: Leg):
+        """Добрать частично исполненную ногу, ордер которой больше не исполнится"""
+        amount = leg.remaining
+        logger.warning(f'[-] Legs | {leg.ticker} leg filled {leg.filled:.8f}/{leg.target:.8f}, topping up {amount:.8f}')
+        try:
+            await self._market(leg, leg.sign, amount)
+        except Exception as e:
+            logger.error(f'[-] Legs | Top up order failed: {e}')
+            return
+        # Маркет ордер считаем исполненным
+        leg.filled += amount
+
+    async def _follow(self, leg: Leg):
+        """Дождаться исполнения одной ноги через общий трекер ордеров"""
+        order = await ORDER_TRACKER.wait_filled(leg.order.order_id, self.fill_timeout)
+        if order is not None:
+            leg.filled = order.executed_qty
+            if leg.filled > 0 and leg.remaining > self.tolerance:
+                # Финальный статус с частичным исполнением: остаток уже не исполнится
+                await self._top_up(leg)
+            return
+
+        # Не исполнилась за fill_timeout: снимаем остаток, иначе он исполнится поверх хеджа
+        try:
+            await leg.client.browser.cancel_order(leg.order.order_id, leg.ticker)
+        except Exception as e:
+            logger.error(f'[-] Legs | Failed to cancel leg order {leg.order.order_id}: {e}')
+        try:
+            order = await leg.client.browser.get_order_status(leg.order.order_id, leg.ticker)
+        except Exception as e:
+            logger.error(f'[-] Legs | Failed to get leg order {leg.order.order_id}, fill unknown: {e}')
+            leg.fill_unknown = True
+            return
+        leg.filled = order.executed_qty
+
+    async def _track_fills(self, legs: List[Leg]):
+        """Дождаться исполнения ног (каждая обрабатывается, как только закончилась)"""
+        active = [leg for leg in legs if leg.order is not None]
+        for leg in active:
+            ORDER_TRACKER.track(leg.client.browser, leg.order)
+        await asyncio.gather(*[self._follow(leg) for leg in active])
+
+    def _hedge_orders(self, legs: List[Leg], residual: float) -> List[tuple]:
+        """Маркет ордера, закрывающие остаток дельты. legs - ноги одного тикера"""
+        orders = []
+        # Сначала добираем недоисполненные ноги отстающей стороны
+        deficit_sign = -1 if residual > 0 else 1
+        left = abs(residual)
+        for leg in legs:
+            if left <= self.tolerance:
+                break
+            if leg.sign == deficit_sign and leg.error is None and leg.remaining > 0:
+                amount = min(leg.remaining, left)
+                orders.append((leg, deficit_sign, amount))
+                left -= amount
+
+        # Если добирать некому - уменьшаем переисполненную сторону
+        if left > self.tolerance:
+            for leg in legs:
+                if left <= self.tolerance:
+                    break
+                if leg.sign == -deficit_sign and leg.filled > 0:
+                    amount = min(leg.filled, left)
+                    orders.append((leg, deficit_sign, amount))
+                    left -= amount
+
+        return orders
+
+    def _neutral(self, legs: List[Leg]) -> bool:
+        if any(leg.fill_unknown for leg in legs):
+            return False
+        return all(abs(delta) <= self.tolerance for delta in self.net_deltas(legs).values())
+
+    async def _rebalance(self, legs: List[Leg]) -> bool:
+        """Добить остаток дельты по каждому тикеру. True - группа нейтральна"""
+        unknown = {leg.ticker for leg in legs if leg.fill_unknown}
+        hedges = []
+        for ticker, residual in self.net_deltas(legs).items():
+            if ticker in unknown:
+                # Хедж по догадке может удвоить позицию - оставляем тикер как есть
+                logger.error(f'[-] Legs | {ticker} leg fill is unknown, not hedging')
+                continue
+            if abs(residual) <= self.tolerance:
+                continue
+            ticker_hedges = self._hedge_orders([leg for leg in legs if leg.ticker == ticker], residual)
+            logger.warning(
+                f'[-] Legs | {ticker} residual delta {residual:.8f}, sending {len(ticker_hedges)} hedge orders'
+            )
+            hedges += ticker_hedges
+        if not hedges:
+            return self._neutral(legs)
+
+        results = await asyncio.gather(*[
+            self._market(leg, sign, amount)
+            for leg, sign, amount in hedges
+        ], return_exceptions=True)
+
+        for (leg, sign, amount), result in zip(hedges, results):
+            if isinstance(result, Exception):
+                logger.error(f'[-] Legs | Hedge order failed: {result}')
+            else:
+                # Маркет ордер считаем исполненным: знак ноги мог поменяться
+                leg.filled += amount if sign == leg.sign else -amount
+
+        return self._neutral(legs)
+
+    async def execute(
+            self,
+            legs: List[Leg],
+            on_update: Optional[Callable[[List[Leg]], Awaitable]] = None,
+    ) -> Dict:
+        """
+        Открыть/закрыть все ноги группы и вернуть метрики.
+        on_update(legs) вызывается после отправки и после исполнения (чекпоинт)
+        """
+        await self._prepare(legs)
+        started = monotonic()
+
+        skew = await self._fire(legs)
+        if on_update is not None:
+            await on_update(legs)
+        await self._track_fills(legs)
+        neutral = await self._rebalance(legs)
+        if on_update is not None:
+            await on_update(legs)
+
+        elapsed = monotonic() - started
+        if neutral:
+            self.time_to_neutral.append(elapsed)
+            TIME_TO_NEUTRAL.observe(elapsed)
+
+        return {
+            "neutral": neutral,
+            "skew": skew,
+            "time_to_neutral": elapsed if neutral else None,
+            "net_delta": self.net_delta(legs),
+            "net_deltas": self.net_deltas(legs),
+            "failed_legs": sum(1 for leg in legs if leg.error is not None),
+            "unknown_legs": sum(1 for leg in legs if leg.fill_unknown),
+        }
+
+    def stats(self) -> Dict[str, float]:
+        """Время до нейтральности по всем группам"""
+        if not self.time_to_neutral:
+            return {"groups": 0, "avg": 0.0, "max": 0.0}
+        return {
+            "groups": len(self.time_to_neutral),
+            "avg": sum(self.time_to_neutral) / len(self.time_to_neutral),
+            "max": max(self.time_to_neutral),
+        }
@@ -0,0 +1,360 @@
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence, Tuple
+from bisect import bisect_left
+from time import perf_counter
+from loguru import logger
+import asyncio
+
+if TYPE_CHECKING:
+    from aiohttp import web
+
+
+Labels = Tuple[str, ...]
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _format_labels(names: Sequence[str], values: Labels, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Metric:
+    """Базовая метрика: имя, описание, имена меток"""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    """Монотонный счётчик"""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, description, labelnames)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, labels: Labels = (), amount: float = 1):
+        values = self.values
+        values[labels] = values.get(labels, 0) + amount
+
+    def total(self) -> float:
+        return sum(self.values.values())
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+            for labels, value in self.values.items()
+        ]
+
+
+class Gauge(Metric):
+    """Текущее значение. func - значения считаются только при выдаче"""
+
+    kind = "gauge"
+
+    def __init__(
+            self,
+            name: str,
+            description: str,
+            labelnames: Sequence[str] = (),
+            func: Optional[Callable[[], Dict[Labels, float]]] = None,
+    ):
+        super().__init__(name, description, labelnames)
+        self.values: Dict[Labels, float] = {}
+        self.func = func
+
+    def set(self, value: float, labels: Labels = ()):
+        self.values[labels] = value
+
+    def collect(self) -> Dict[Labels, float]:
+        if self.func is None:
+            return self.values
+        try:
+            return self.func()
+        except Exception as e:
+            logger.debug(f"Metrics | {self.name} collect failed: {e}")
+            return {}
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {value}"
+            for labels, value in self.collect().items()
+        ]
+
+
+class _HistogramTimer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: "Histogram", labels: Labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(perf_counter() - self.started, self.labels)
+
+
+class Histogram(Metric):
+    """Гистограмма с фиксированными корзинами (секунды)"""
+
+    kind = "histogram"
+
+    def __init__(
+            self,
+            name: str,
+            description: str,
+            labelnames: Sequence[str] = (),
+            buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, description, labelnames)
+        self.buckets = tuple(buckets)
+        # labels -> [счётчики корзин..., +Inf, sum]
+        self.values: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, labels: Labels = ()):
+        row = self.values.get(labels)
+        if row is None:
+            row = self.values[labels] = [0] * (len(self.buckets) + 2)
+        row[bisect_left(self.buckets, value)] += 1
+        row[-1] += value
+
+    def time(self, labels: Labels = ()) -> _HistogramTimer:
+        """with HISTOGRAM.time(labels): ..."""
+        return _HistogramTimer(self, labels)
+
+    def count(self, labels: Optional[Labels] = None) -> int:
+        rows = self.values.values() if labels is None else [self.values.get(labels, [0, 0])]
+        return int(sum(sum(row[:-1]) for row in rows))
+
+    def quantile(self, q: float, labels: Optional[Labels] = None) -> float:
+        """Оценка квантиля по корзинам (верхняя граница корзины)"""
+        rows = list(self.values.values()) if labels is None else [self.values.get(labels)]
+        rows = [row for row in rows if row]
+        if not rows:
+            return 0.0
+
+        counts = [sum(row[i] for row in rows) for i in range(len(self.buckets) + 1)]
+        total = sum(counts)
+        if not total:
+            return 0.0
+
+        rank = q * total
+        seen = 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for labels, row in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), row):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                label_text = _format_labels(self.labelnames, labels, f'le="{le}"')
+                lines.append(f"{self.name}_bucket{label_text} {cumulative}")
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_text} {row[-1]}")
+            lines.append(f"{self.name}_count{label_text} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Все метрики процесса + текстовый формат Prometheus"""
+
+    def __init__(self, prefix: str = "ethereal_"):
+        self.prefix = prefix
+        self.metrics: Dict[str, Metric] = {}
+        self.collectors: List[Callable[[], str]] = []
+
+    def _register(self, metric: Metric) -> Metric:
+        existing = self.metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, description: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(self.prefix + name, description, labelnames))
+
+    def gauge(
+            self,
+            name: str,
+            description: str,
+            labelnames: Sequence[str] = (),
+            func: Optional[Callable[[], Dict[Labels, float]]] = None,
+    ) -> Gauge:
+        gauge = self._register(Gauge(self.prefix + name, description, labelnames))
+        if func is not None:
+            gauge.func = func
+        return gauge
+
+    def histogram(
+            self,
+            name: str,
+            description: str,
+            labelnames: Sequence[str] = (),
+            buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._register(Histogram(self.prefix + name, description, labelnames, buckets))
+
+    def add_collector(self, collector: Callable[[], str]):
+        """Сторонний источник готового текста Prometheus (монитор дельты)"""
+        if collector not in self.collectors:
+            self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        text = "\n".join(lines) + "\n"
+        for collector in self.collectors:
+            text += collector()
+        return text
+
+
+REGISTRY = Registry()
+
+# Метрики горячих путей
+REQUEST_LATENCY = REGISTRY.histogram("request_seconds", "HTTP request latency", ["endpoint"])
+REQUEST_ERRORS = REGISTRY.counter("request_errors_total", "Failed HTTP requests", ["endpoint", "status"])
+RATE_LIMIT_WAIT = REGISTRY.histogram("ratelimit_wait_seconds", "Time waiting for rate limit tokens")
+RETRIES = REGISTRY.counter("retries_total", "Retried calls", ["function"])
+CIRCUIT_STATE = REGISTRY.gauge("circuit_state", "Circuit breaker state (0 closed, 1 half open, 2 open)", ["endpoint"])
+SCHEDULER_ADDRESS_WAIT = REGISTRY.histogram(
+    "scheduler_address_wait_seconds", "Time a job waited for its addresses to be free",
+    buckets=(0.1, 1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600),
+)
+SCHEDULER_WORKER_WAIT = REGISTRY.histogram(
+    "scheduler_worker_wait_seconds", "Time a ready job waited for a free worker",
+    buckets=(0.1, 1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600),
+)
+DB_WRITE = REGISTRY.histogram(
+    "db_write_seconds", "Database write time", ["operation"],
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0),
+)
+DB_LOCK_WAIT = REGISTRY.histogram(
+    "db_lock_wait_seconds", "Time waiting for the database lock",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0),
+)
+
+LEG_SKEW = REGISTRY.histogram(
+    "legs_skew_seconds", "Spread of exchange acks between legs of one group",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+TIME_TO_NEUTRAL = REGISTRY.histogram(
+    "group_time_to_neutral_seconds", "Time from sending group legs to a neutral position",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0),
+)
+
+
+def summary() -> str:
+    """Короткая сводка для периодического лога"""
+    requests = REQUEST_LATENCY.count()
+    return (
+        f"requests {requests} | errors {int(REQUEST_ERRORS.total())} | "
+        f"p50 {REQUEST_LATENCY.quantile(0.5) * 1000:.0f}ms | p95 {REQUEST_LATENCY.quantile(0.95) * 1000:.0f}ms | "
+        f"retries {int(RETRIES.total())} | "
+        f"address wait p95 {SCHEDULER_ADDRESS_WAIT.quantile(0.95):.1f}s | "
+        f"worker wait p95 {SCHEDULER_WORKER_WAIT.quantile(0.95):.1f}s | "
+        f"db write p95 {DB_WRITE.quantile(0.95) * 1000:.1f}ms"
+    )
+
+
+async def summary_loop(interval: float):
+    """Периодически писать сводку метрик в лог"""
+    while True:
+        await asyncio.sleep(interval)
+        logger.info(f'[•] Metrics | {summary()}')
+
+
+class MetricsServer:
+    """Локальный HTTP /metrics для Prometheus"""
+
+    def __init__(self, registry: Registry = REGISTRY, host: str = "127.0.0.1", port: int = 8687):
+        self.registry = registry
+        self.host = host
+        self.port = port
+        self._runner: Optional["web.AppRunner"] = None
+
+    async def _metrics(self, request: "web.Request") -> "web.Response":
+        from aiohttp import web
+        return web.Response(text=self.registry.render(), content_type="text/plain")
+
+    async def start(self):
+        # aiohttp.web нужен только при включённом сервере метрик
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get("/metrics", self._metrics)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f'[•] Metrics on http://{self.host}:{self.port}/metrics')
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+def benchmark(rounds: int = 200_000) -> Dict[str, float]:
+    """Наносекунд на операцию инструментирования"""
+    registry = Registry(prefix="bench_")
+    counter = registry.counter("counter", "", ["endpoint"])
+    histogram = registry.histogram("histogram", "", ["endpoint"])
+    labels = ("GET /positions",)
+
+    results = {}
+
+    started = perf_counter()
+    for _ in range(rounds):
+        counter.inc(labels)
+    results["counter.inc"] = (perf_counter() - started) / rounds * 1e9
+
+    started = perf_counter()
+    for i in range(rounds):
+        histogram.observe(i % 1000 / 1000, labels)
+    results["histogram.observe"] = (perf_counter() - started) / rounds * 1e9
+
+    started = perf_counter()
+    for _ in range(rounds):
+        request_started = perf_counter()
+        histogram.observe(perf_counter() - request_started, labels)
+    results["timed request"] = (perf_counter() - started) / rounds * 1e9
+
+    started = perf_counter()
+    for _ in range(rounds):
+        with histogram.time(labels):
+            pass
+    results["histogram.time()"] = (perf_counter() - started) / rounds * 1e9
+
+    return results
+
+
+if __name__ == "__main__":
+    timings = benchmark()
+    for operation, nanos in timings.items():
+        print(f"{operation:>18}: {nanos:8.1f} ns")
+
+    # Запрос к API - десятки миллисекунд, на него приходится замер + счётчик
+    per_request = timings["timed request"] + timings["counter.inc"]
+    print(f"overhead per 50 ms request: {per_request / 50e6 * 100:.5f}%")
@@ -0,0 +1,254 @@
+from decimal import Decimal
+from typing import Any, Dict, Iterator, Optional
+from modules.codec import to_decimal, to_float
+
+
+FINAL_STATUSES = {"filled", "canceled", "cancelled", "expired", "rejected"}
+
+
+class Model:
+    """
+    Базовый класс компактных моделей ответа API.
+
+    Поля лежат в __slots__, а старые ключи словарей (orderId, positionAmt, ...)
+    доступны через model["orderId"] - для кода, который работал с dict.
+    """
+
+    __slots__ = ()
+    _aliases: Dict[str, str] = {}
+
+    def __getitem__(self, key: str) -> Any:
+        try:
+            return getattr(self, self._aliases[key])
+        except KeyError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key: str, value: Any):
+        setattr(self, self._aliases[key], value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._aliases
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._aliases)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        attr = self._aliases.get(key)
+        return default if attr is None else getattr(self, attr)
+
+    def keys(self):
+        return self._aliases.keys()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Старый формат словаря"""
+        return {key: getattr(self, attr) for key, attr in self._aliases.items()}
+
+    def __eq__(self, other: Any) -> bool:
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        if type(other) is type(self):
+            return all(getattr(self, attr) == getattr(other, attr) for attr in self.__slots__)
+        return NotImplemented
+
+    # Модели изменяемы (model["executedQty"] = ...) и равны своему dict, а dict не хешируется -
+    # согласованного хеша нет. Явно нехешируемые: ключом словаря/множества служит order_id / symbol
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{attr}={getattr(self, attr)!r}" for attr in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class Order(Model):
+    """Ордер"""
+
+    __slots__ = ("order_id", "status", "symbol", "side", "quantity", "price",
+                 "executed_qty", "avg_price", "cum_quote")
+    _aliases = {
+        "orderId": "order_id",
+        "status": "status",
+        "symbol": "symbol",
+        "side": "side",
+        "quantity": "quantity",
+        "price": "price",
+        "executedQty": "executed_qty",
+        "avgPrice": "avg_price",
+        "cumQuote": "cum_quote",
+    }
+
+    def __init__(
+            self,
+            order_id: Optional[str],
+            status: str = "PENDING",
+            symbol: Optional[str] = None,
+            side: Optional[str] = None,
+            quantity: float = 0.0,
+            price: float = 0.0,
+            executed_qty: float = 0.0,
+            avg_price: float = 0.0,
+            cum_quote: float = 0.0,
+    ):
+        self.order_id = order_id
+        self.status = status
+        self.symbol = symbol
+        self.side = side
+        self.quantity = quantity
+        self.price = price
+        self.executed_qty = executed_qty
+        self.avg_price = avg_price
+        self.cum_quote = cum_quote
+
+    @property
+    def is_final(self) -> bool:
+        """Ордер больше не изменится (исполнен, отменён, ...)"""
+        return str(self.status).lower() in FINAL_STATUSES
+
+    @classmethod
+    def from_response(cls, data: Dict, order_id: Optional[str] = None) -> "Order":
+        """Ордер из ответа /orders"""
+        executed_qty = to_float(data.get("filled_quantity"))
+        price = to_float(data.get("price"))
+        side = data.get("side")
+        return cls(
+            order_id=data.get("id") or data.get("order_id") or order_id,
+            status=data.get("status") or "PENDING",
+            symbol=data.get("ticker") or data.get("product_id"),
+            side=side.upper() if isinstance(side, str) else side,
+            quantity=to_float(data.get("quantity")),
+            price=price,
+            executed_qty=executed_qty,
+            avg_price=to_float(data.get("avg_price")) or price,
+            cum_quote=executed_qty * price,
+        )
+
+
+class Fill(Model):
+    """Сделка (исполнение ордера)"""
+
+    __slots__ = ("fill_id", "order_id", "symbol", "side", "quantity", "price",
+                 "fee", "realized_pnl", "created_at")
+    _aliases = {
+        "id": "fill_id",
+        "orderId": "order_id",
+        "symbol": "symbol",
+        "side": "side",
+        "quantity": "quantity",
+        "price": "price",
+        "fee": "fee",
+        "realizedPnl": "realized_pnl",
+        "createdAt": "created_at",
+    }
+
+    def __init__(
+            self,
+            fill_id: str,
+            order_id: Optional[str],
+            symbol: Optional[str],
+            side: Optional[str],
+            quantity: float,
+            price: float,
+            fee: float,
+            realized_pnl: float,
+            created_at: float,
+    ):
+        self.fill_id = fill_id
+        self.order_id = order_id
+        self.symbol = symbol
+        self.side = side
+        self.quantity = quantity
+        self.price = price
+        self.fee = fee
+        self.realized_pnl = realized_pnl
+        self.created_at = created_at
+
+    @property
+    def notional(self) -> float:
+        return self.quantity * self.price
+
+    @classmethod
+    def from_response(cls, data: Dict) -> "Fill":
+        """Сделка из ответа /fills"""
+        side = data.get("side")
+        return cls(
+            fill_id=str(data.get("id")),
+            order_id=data.get("order_id"),
+            symbol=data.get("ticker") or data.get("product_id"),
+            side=side.upper() if isinstance(side, str) else side,
+            quantity=to_float(data.get("filled") or data.get("quantity")),
+            price=to_float(data.get("price")),
+            fee=to_float(data.get("fee")),
+            realized_pnl=to_float(data.get("realized_pnl")),
+            created_at=to_float(data.get("created_at")),
+        )
+
+
+class Position(Model):
+    """Открытая позиция"""
+
+    __slots__ = ("symbol", "position_amt", "entry_price")
+    _aliases = {
+        "symbol": "symbol",
+        "positionAmt": "position_amt",
+        "entryPrice": "entry_price",
+    }
+
+    def __init__(self, symbol: Optional[str], position_amt: float, entry_price: float):
+        self.symbol = symbol
+        self.position_amt = position_amt
+        self.entry_price = entry_price
+
+    @classmethod
+    def from_response(cls, data: Dict) -> "Position":
+        """Позиция из ответа /positions"""
+        return cls(
+            symbol=data.get("product_id") or data.get("ticker"),
+            position_amt=to_float(data.get("size")),
+            entry_price=to_float(data.get("entry_price")),
+        )
+
+
+class OrderBookTop(Model):
+    """Лучшие цены стакана"""
+
+    __slots__ = ("bid", "ask")
+    _aliases = {
+        "BUY": "bid",
+        "SELL": "ask",
+    }
+
+    def __init__(self, bid: Decimal, ask: Decimal):
+        self.bid = bid
+        self.ask = ask
+
+    @classmethod
+    def from_response(cls, data: Dict) -> "OrderBookTop":
+        """Верх стакана из ответа /orderbooks"""
+        bids = data.get("bids", [])
+        asks = data.get("asks", [])
+        return cls(
+            bid=to_decimal(bids[0][0]) if bids else Decimal("0"),
+            ask=to_decimal(asks[0][0]) if asks else Decimal("0"),
+        )
+
+
+class Market(Model):
+    """Данные рынка тикера"""
+
+    __slots__ = ("ticker", "price")
+    _aliases = {
+        "ticker": "ticker",
+        "price": "price",
+    }
+
+    def __init__(self, ticker: str, price: Optional[Decimal]):
+        self.ticker = ticker
+        self.price = price
+
+    @classmethod
+    def from_response(cls, ticker: str, data: Dict) -> "Market":
+        """Рынок из ответа /markets"""
+        price = (data.get("price") or
+                 data.get("mark_price") or
+                 data.get("lastPrice") or
+                 data.get("indexPrice"))
+        return cls(ticker=ticker, price=to_decimal(price) if price else None)
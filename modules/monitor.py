@@ -0,0 +1,305 @@
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+from collections import defaultdict
+from contextlib import contextmanager
+from loguru import logger
+from time import monotonic, time
+import asyncio
+from settings import DELTA_MONITOR_SETTINGS
+
+if TYPE_CHECKING:
+    from aiohttp import web
+    from modules.browser import Browser
+
+
+class DeltaMonitor:
+    """
+    Живая чистая дельта по тикерам для всех аккаунтов и групп.
+
+    Позиции аккаунтов приходят из get_positions (полная замена) и из
+    исполнений ордеров (приращение). Суммы по тикерам и группам не
+    пересчитываются, а сдвигаются на разницу, поэтому обновление стоит
+    O(позиций аккаунта). Превышение порога проверяется только для
+    затронутых тикеров и групп.
+
+    Пока группа работает, run_pair опрашивает её позиции (watch), а
+    исполнения ног приходят из ORDER_TRACKER. Авто-хедж не трогает
+    группу, пока её ноги исполняет LegExecutor (executing), и группу,
+    закончившую работу (release_group): её сессии уже возвращены в пул.
+    """
+
+    def __init__(
+            self,
+            thresholds: Optional[Dict[str, float]] = None,
+            default_threshold: float = 0.0,
+            action: str = "alert",
+            hedge_cooldown: float = 30.0,
+            hedge_delay: float = 45.0,
+    ):
+        self.thresholds = thresholds or {}
+        self.default_threshold = default_threshold
+        self.action = action
+        self.hedge_cooldown = hedge_cooldown
+        self.hedge_delay = hedge_delay
+
+        self._positions: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._groups: Dict[str, int] = {}
+        self._browsers: Dict[str, "Browser"] = {}
+
+        self.net: Dict[str, float] = defaultdict(float)
+        self.group_net: Dict[Tuple[int, str], float] = defaultdict(float)
+
+        self._alerted: Set[Tuple[Optional[int], str]] = set()
+        self._hedged_at: Dict[Tuple[int, str], float] = {}
+        self._hedge_tasks: Dict[Tuple[int, str], asyncio.Task] = {}
+        self._sending: Set[Tuple[int, str]] = set()
+        self._executing: Dict[int, int] = {}
+        self.alert_handler: Optional[Callable[[str], Awaitable]] = None
+
+        self.updated_at = 0.0
+        self.alerts = 0
+        self.hedges = 0
+
+    def register(self, address: str, browser: "Browser", group_number: Optional[int] = None):
+        """Привязать аккаунт к группе и браузеру (для авто-хеджа)"""
+        old_group = self._groups.get(address)
+        if old_group != group_number:
+            # Позиции аккаунта переезжают в новую группу
+            for ticker, amount in self._positions.get(address, {}).items():
+                if old_group is not None:
+                    self.group_net[(old_group, ticker)] -= amount
+                if group_number is not None:
+                    self.group_net[(group_number, ticker)] += amount
+
+        if group_number is None:
+            self._groups.pop(address, None)
+        else:
+            self._groups[address] = group_number
+        self._browsers[address] = browser
+
+    def threshold(self, ticker: str) -> float:
+        return self.thresholds.get(ticker, self.default_threshold)
+
+    @property
+    def active(self) -> bool:
+        """Заданы пороги - дельту групп нужно обновлять и без HTTP сервера"""
+        return bool(self.default_threshold or any(self.thresholds.values()))
+
+    async def watch(self, browsers: List["Browser"], interval: float):
+        """Опрашивать позиции аккаунтов, пока задачу не отменят"""
+        while True:
+            # get_positions сам передаёт позиции в монитор; ошибка опроса не обнуляет их
+            await asyncio.gather(*[browser.get_positions() for browser in browsers])
+            await asyncio.sleep(interval)
+
+    @contextmanager
+    def executing(self, group_number: int):
+        """Ноги группы исполняются и хеджируются LegExecutor'ом - авто-хедж ждёт"""
+        self._executing[group_number] = self._executing.get(group_number, 0) + 1
+        try:
+            yield
+        finally:
+            self._executing[group_number] -= 1
+            if not self._executing[group_number]:
+                del self._executing[group_number]
+
+    async def release_group(self, group_number: int):
+        """
+        Группа закончила работу: отменить ещё ждущие хеджи, дождаться
+        отправленных и больше не использовать браузеры её аккаунтов
+        """
+        keys = [key for key in self._hedge_tasks if key[0] == group_number]
+        for key in keys:
+            if key not in self._sending:
+                self._hedge_tasks[key].cancel()
+        await asyncio.gather(*[self._hedge_tasks[key] for key in keys], return_exceptions=True)
+
+        for address, group in self._groups.items():
+            if group == group_number:
+                self._browsers.pop(address, None)
+
+    def _apply(self, address: str, ticker: str, change: float):
+        """Сдвинуть позицию аккаунта и все суммы на change"""
+        if not change:
+            return
+
+        positions = self._positions[address]
+        amount = positions.get(ticker, 0.0) + change
+        if abs(amount) < 1e-12:
+            positions.pop(ticker, None)
+        else:
+            positions[ticker] = amount
+
+        self.net[ticker] += change
+        group_number = self._groups.get(address)
+        if group_number is not None:
+            self.group_net[(group_number, ticker)] += change
+        self.updated_at = time()
+
+        self._check(None, ticker, self.net[ticker])
+        if group_number is not None:
+            self._check(group_number, ticker, self.group_net[(group_number, ticker)])
+
+    def on_positions(self, address: str, positions: Iterable):
+        """Полные позиции аккаунта из get_positions"""
+        new = {}
+        for position in positions:
+            new[position.symbol] = new.get(position.symbol, 0.0) + position.position_amt
+
+        old = self._positions.get(address, {})
+        for ticker in set(old) | set(new):
+            self._apply(address, ticker, new.get(ticker, 0.0) - old.get(ticker, 0.0))
+
+    def on_fill(self, address: str, ticker: str, quantity: float):
+        """Исполнение ордера: quantity со знаком (+ покупка, - продажа)"""
+        self._apply(address, ticker, quantity)
+
+    # ---------- пороги ----------
+
+    def _check(self, group_number: Optional[int], ticker: str, delta: float):
+        """Сработать при пересечении порога (один раз, до возврата под порог)"""
+        threshold = self.threshold(ticker)
+        key = (group_number, ticker)
+        if not threshold or abs(delta) < threshold:
+            self._alerted.discard(key)
+            return
+
+        if key not in self._alerted:
+            self._alerted.add(key)
+            self.alerts += 1
+            scope = "All accounts" if group_number is None else f"Group {group_number}"
+            text = f"{scope} | {ticker} net delta {delta:+.8f} exceeds {threshold}"
+            logger.warning(f'[-] Delta monitor | {text}')
+            if self.alert_handler is not None:
+                asyncio.ensure_future(self.alert_handler(text))
+
+        if self.action == "hedge" and group_number is not None:
+            self._schedule_hedge(group_number, ticker)
+
+    def _schedule_hedge(self, group_number: int, ticker: str):
+        key = (group_number, ticker)
+        if key in self._hedge_tasks or monotonic() - self._hedged_at.get(key, -self.hedge_cooldown) < self.hedge_cooldown:
+            return
+        self._hedge_tasks[key] = asyncio.ensure_future(self._hedge(group_number, ticker))
+
+    async def _hedge(self, group_number: int, ticker: str):
+        """Уменьшить reduce-only маркет ордером позицию аккаунта, который перевешивает группу"""
+        from modules.tracker import ORDER_TRACKER
+
+        key = (group_number, ticker)
+        try:
+            # Ноги группы могут ещё исполняться - хеджируем только устойчивый дисбаланс
+            await asyncio.sleep(self.hedge_delay)
+            while group_number in self._executing:
+                await asyncio.sleep(self.hedge_delay)
+
+            delta = self.group_net[key]
+            members = [address for address, group in self._groups.items()
+                       if group == group_number and address in self._browsers]
+            if not members or abs(delta) < self.threshold(ticker):
+                return
+
+            address = max(members, key=lambda member: self._positions[member].get(ticker, 0.0) * delta)
+            # Reduce-only не даёт перевернуть позицию: хеджируется не больше, чем есть у аккаунта
+            quantity = min(abs(delta), abs(self._positions[address].get(ticker, 0.0)))
+            if self._positions[address].get(ticker, 0.0) * delta <= 0 or not quantity:
+                return
+
+            self._sending.add(key)
+            browser = self._browsers[address]
+            order = await browser.create_order({
+                "type": "MARKET",
+                "quantity": round(quantity, 8),
+                "side": 1 if delta > 0 else 0,
+                "ticker": ticker,
+                "reduce_only": True,
+            })
+            self.hedges += 1
+            logger.warning(f'[-] Delta monitor | Group {group_number} | Hedge {ticker} {quantity:.8f} sent')
+
+            # Исполнение приходит в монитор через трекер (on_fill), а не считается мгновенным
+            ORDER_TRACKER.track(browser, order)
+            filled = await ORDER_TRACKER.wait_filled(order.order_id, self.hedge_delay)
+            if filled is None:
+                logger.error(f'[-] Delta monitor | Group {group_number} | Hedge {order.order_id} not final in time')
+        except Exception as e:
+            logger.error(f'[-] Delta monitor | Group {group_number} | Hedge failed: {e}')
+        finally:
+            self._hedged_at[key] = monotonic()
+            self._hedge_tasks.pop(key, None)
+            self._sending.discard(key)
+
+    # ---------- выдача ----------
+
+    def snapshot(self) -> Dict:
+        """Текущее состояние для HTTP"""
+        groups: Dict[int, Dict[str, float]] = defaultdict(dict)
+        for (group_number, ticker), delta in self.group_net.items():
+            if delta:
+                groups[group_number][ticker] = delta
+        return {
+            "net": {ticker: delta for ticker, delta in self.net.items() if delta},
+            "groups": groups,
+            "accounts": len(self._positions),
+            "alerts": self.alerts,
+            "hedges": self.hedges,
+            "updated_at": self.updated_at,
+        }
+
+    def prometheus(self) -> str:
+        """Состояние в текстовом формате Prometheus"""
+        lines = ["# TYPE ethereal_net_delta gauge"]
+        lines += [f'ethereal_net_delta{{ticker="{ticker}"}} {delta}' for ticker, delta in self.net.items()]
+        lines.append("# TYPE ethereal_group_net_delta gauge")
+        lines += [
+            f'ethereal_group_net_delta{{group="{group_number}",ticker="{ticker}"}} {delta}'
+            for (group_number, ticker), delta in self.group_net.items()
+        ]
+        lines.append("# TYPE ethereal_delta_alerts_total counter")
+        lines.append(f"ethereal_delta_alerts_total {self.alerts}")
+        lines.append("# TYPE ethereal_delta_hedges_total counter")
+        lines.append(f"ethereal_delta_hedges_total {self.hedges}")
+        return "\n".join(lines) + "\n"
+
+
+DELTA_MONITOR = DeltaMonitor(
+    thresholds=DELTA_MONITOR_SETTINGS["thresholds"],
+    default_threshold=DELTA_MONITOR_SETTINGS["default_threshold"],
+    action=DELTA_MONITOR_SETTINGS["action"],
+    hedge_cooldown=DELTA_MONITOR_SETTINGS["hedge_cooldown"],
+    hedge_delay=DELTA_MONITOR_SETTINGS["hedge_delay"],
+)
+
+
+class MonitorServer:
+    """Локальный HTTP: /delta (JSON) и /metrics (Prometheus)"""
+
+    def __init__(self, monitor: DeltaMonitor, host: str = "127.0.0.1", port: int = 8686):
+        self.monitor = monitor
+        self.host = host
+        self.port = port
+        self._runner: Optional["web.AppRunner"] = None
+
+    async def _delta(self, request: "web.Request") -> "web.Response":
+        from aiohttp import web
+        return web.json_response(self.monitor.snapshot())
+
+    async def _metrics(self, request: "web.Request") -> "web.Response":
+        from aiohttp import web
+        return web.Response(text=self.monitor.prometheus(), content_type="text/plain")
+
+    async def start(self):
+        # aiohttp.web нужен только при включённом мониторе
+        from aiohttp import web
+        app = web.Application()
+        app.router.add_get("/delta", self._delta)
+        app.router.add_get("/metrics", self._metrics)
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f'[•] Delta monitor on http://{self.host}:{self.port}/delta')
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
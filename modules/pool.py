@@ -0,0 +1,182 @@
+from loguru import logger
+from typing import Dict, Optional, Tuple
+from time import monotonic
+import aiohttp
+import asyncio
+from settings import POOL_SETTINGS
+
+
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+    "Accept": "application/json",
+    "Content-Type": "application/json",
+}
+
+
+class _ConnectorEntry:
+    """Коннектор одного прокси + количество сессий на нём"""
+
+    __slots__ = ("connector", "sessions")
+
+    def __init__(self, connector: aiohttp.TCPConnector):
+        self.connector = connector
+        self.sessions = 0
+
+
+class _SessionEntry:
+    """Сессия + счётчик ссылок + время последнего освобождения"""
+
+    __slots__ = ("session", "refs", "idle_since")
+
+    def __init__(self, session: aiohttp.ClientSession):
+        self.session = session
+        self.refs = 0
+        self.idle_since = monotonic()
+
+
+class SessionPool:
+    """
+    Общий на процесс реестр HTTP сессий.
+
+    Сессии хранятся по ключу (base_url, proxy), коннекторы - по прокси,
+    поэтому аккаунты за одним прокси переиспользуют тёплые keep-alive
+    соединения, а лимит соединений считается на прокси целиком. Без прокси
+    все аккаунты делят один коннектор и его limit_per_proxy соединений.
+    Сессия общая для разных аккаунтов, поэтому cookies не хранятся
+    (DummyCookieJar): ответ одному аккаунту не попадёт в запросы другого.
+    verify_ssl=False отключает проверку сертификатов для всего пула.
+    """
+
+    def __init__(
+            self,
+            limit_per_proxy: int = 5,
+            idle_timeout: float = 60.0,
+            keepalive_timeout: float = 30.0,
+            verify_ssl: bool = True,
+    ):
+        self.limit_per_proxy = limit_per_proxy
+        self.verify_ssl = verify_ssl
+        self.idle_timeout = idle_timeout
+        self.keepalive_timeout = keepalive_timeout
+
+        self._sessions: Dict[Tuple[str, Optional[str]], _SessionEntry] = {}
+        self._connectors: Dict[Optional[str], _ConnectorEntry] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _check_loop(self):
+        """Сбросить пул если он был создан в другом event loop"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Сессии старого loop уже невалидны, закрыть их нельзя
+            self._sessions.clear()
+            self._connectors.clear()
+            self._loop = loop
+
+    def _get_connector(self, proxy: Optional[str]) -> aiohttp.TCPConnector:
+        """Получить или создать коннектор для прокси"""
+        entry = self._connectors.get(proxy)
+        if entry is None or entry.connector.closed:
+            entry = _ConnectorEntry(aiohttp.TCPConnector(
+                ssl=self.verify_ssl,
+                limit=self.limit_per_proxy,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300,
+            ))
+            self._connectors[proxy] = entry
+        return entry.connector
+
+    async def acquire(self, base_url: str, proxy: Optional[str] = None) -> aiohttp.ClientSession:
+        """Взять сессию из пула"""
+        self._check_loop()
+
+        key = (base_url, proxy)
+        entry = self._sessions.get(key)
+
+        if entry is not None and entry.session.closed:
+            await self._close_session(key)
+            entry = None
+
+        if entry is None:
+            entry = _SessionEntry(aiohttp.ClientSession(
+                headers=DEFAULT_HEADERS,
+                connector=self._get_connector(proxy),
+                connector_owner=False,
+                cookie_jar=aiohttp.DummyCookieJar(),
+                timeout=aiohttp.ClientTimeout(total=30),
+            ))
+            self._sessions[key] = entry
+            self._connectors[proxy].sessions += 1
+
+        entry.refs += 1
+        return entry.session
+
+    async def release(self, base_url: str, proxy: Optional[str] = None):
+        """Вернуть сессию в пул"""
+        entry = self._sessions.get((base_url, proxy))
+        if entry is not None and entry.refs > 0:
+            entry.refs -= 1
+            if entry.refs == 0:
+                entry.idle_since = monotonic()
+
+        await self.evict_idle()
+
+    async def evict_idle(self):
+        """Закрыть сессии, которые простаивают дольше idle_timeout"""
+        now = monotonic()
+        expired = [
+            key for key, entry in self._sessions.items()
+            if entry.refs == 0 and now - entry.idle_since >= self.idle_timeout
+        ]
+
+        for key in expired:
+            await self._close_session(key)
+
+    async def _close_session(self, key: Tuple[str, Optional[str]]):
+        """Закрыть сессию и её коннектор, если он больше никому не нужен"""
+        entry = self._sessions.pop(key)
+        proxy = key[1]
+
+        try:
+            await entry.session.close()
+        except Exception as e:
+            logger.warning(f"Error closing session: {e}")
+
+        connector_entry = self._connectors.get(proxy)
+        if connector_entry is not None:
+            connector_entry.sessions -= 1
+            if connector_entry.sessions <= 0:
+                self._connectors.pop(proxy)
+                await connector_entry.connector.close()
+
+    async def close_all(self):
+        """Закрыть все сессии пула"""
+        if self._loop is not asyncio.get_running_loop():
+            self._sessions.clear()
+            self._connectors.clear()
+            return
+
+        for key in list(self._sessions):
+            await self._close_session(key)
+
+        for connector_entry in self._connectors.values():
+            await connector_entry.connector.close()
+        self._connectors.clear()
+
+        # Дать SSL соединениям корректно закрыться
+        await asyncio.sleep(0.25)
+
+    def stats(self) -> Dict[str, int]:
+        """Текущее состояние пула"""
+        return {
+            "sessions": len(self._sessions),
+            "connectors": len(self._connectors),
+            "in_use": sum(entry.refs for entry in self._sessions.values()),
+        }
+
+
+SESSION_POOL = SessionPool(
+    limit_per_proxy=POOL_SETTINGS["limit_per_proxy"],
+    idle_timeout=POOL_SETTINGS["idle_timeout"],
+    keepalive_timeout=POOL_SETTINGS["keepalive_timeout"],
+    verify_ssl=POOL_SETTINGS["verify_ssl"],
+)
@@ -0,0 +1,274 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from modules.models import Position
+
+
+class PortfolioSnapshot:
+    """Неизменяемая копия таблицы на момент снимка"""
+
+    __slots__ = ("addresses", "tickers", "positions", "realized_pnl", "volume", "fees")
+
+    def __init__(
+            self,
+            addresses: List[str],
+            tickers: List[str],
+            positions: np.ndarray,
+            realized_pnl: np.ndarray,
+            volume: np.ndarray,
+            fees: np.ndarray,
+    ):
+        self.addresses = addresses
+        self.tickers = tickers
+        self.positions = positions
+        self.realized_pnl = realized_pnl
+        self.volume = volume
+        self.fees = fees
+
+    def save(self, file_name: str):
+        """Сохранить снимок в .npz"""
+        with open(file_name, "wb") as f:
+            np.savez_compressed(
+                f,
+                addresses=np.array(self.addresses, dtype=str),
+                tickers=np.array(self.tickers, dtype=str),
+                positions=self.positions,
+                realized_pnl=self.realized_pnl,
+                volume=self.volume,
+                fees=self.fees,
+            )
+
+    @classmethod
+    def load(cls, file_name: str) -> "PortfolioSnapshot":
+        """Загрузить снимок из .npz"""
+        with np.load(file_name) as data:
+            return cls(
+                addresses=data["addresses"].tolist(),
+                tickers=data["tickers"].tolist(),
+                positions=data["positions"],
+                realized_pnl=data["realized_pnl"],
+                volume=data["volume"],
+                fees=data["fees"],
+            )
+
+
+class PortfolioTable:
+    """
+    Портфель всех аккаунтов в колонках NumPy.
+
+    Строка - аккаунт, столбец - тикер. Позиции и цены входа лежат в
+    матрицах accounts x tickers, объём/PnL/комиссии - в векторах по
+    аккаунтам. Сводки считаются целыми массивами без циклов по
+    аккаунтам: 50k аккаунтов сворачиваются за миллисекунды.
+    """
+
+    def __init__(self, capacity: int = 1024, tickers: Iterable[str] = ()):
+        self.addresses: List[str] = []
+        self.tickers: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._cols: Dict[str, int] = {}
+
+        self.positions = np.zeros((capacity, 0))
+        self.entry_prices = np.zeros((capacity, 0))
+        self.realized_pnl = np.zeros(capacity)
+        self.volume = np.zeros(capacity)
+        self.fees = np.zeros(capacity)
+        self.groups = np.full(capacity, -1, dtype=np.int64)
+        self.marks = np.zeros(0)
+
+        for ticker in tickers:
+            self._col(ticker)
+
+    def __len__(self) -> int:
+        return len(self.addresses)
+
+    # ---------- индексы ----------
+
+    def _row(self, address: str) -> int:
+        """Строка аккаунта (добавляется при первом обращении)"""
+        row = self._rows.get(address)
+        if row is not None:
+            return row
+
+        row = len(self.addresses)
+        if row == len(self.volume):
+            self._grow_rows(max(1, row * 2))
+        self.addresses.append(address)
+        self._rows[address] = row
+        return row
+
+    def _col(self, ticker: str) -> int:
+        """Столбец тикера (добавляется при первом обращении)"""
+        col = self._cols.get(ticker)
+        if col is not None:
+            return col
+
+        col = len(self.tickers)
+        self.tickers.append(ticker)
+        self._cols[ticker] = col
+
+        pad = ((0, 0), (0, 1))
+        self.positions = np.pad(self.positions, pad)
+        self.entry_prices = np.pad(self.entry_prices, pad)
+        self.marks = np.append(self.marks, 0.0)
+        return col
+
+    def _grow_rows(self, capacity: int):
+        """Увеличить ёмкость по аккаунтам (удвоением, как list)"""
+        extra = capacity - len(self.volume)
+        self.positions = np.pad(self.positions, ((0, extra), (0, 0)))
+        self.entry_prices = np.pad(self.entry_prices, ((0, extra), (0, 0)))
+        self.realized_pnl = np.pad(self.realized_pnl, (0, extra))
+        self.volume = np.pad(self.volume, (0, extra))
+        self.fees = np.pad(self.fees, (0, extra))
+        self.groups = np.pad(self.groups, (0, extra), constant_values=-1)
+
+    # ---------- заполнение ----------
+
+    def set_positions(self, address: str, positions: List[Position]):
+        """Заменить позиции аккаунта"""
+        row = self._row(address)
+        cols = [self._col(position.symbol) for position in positions]
+
+        self.positions[row] = 0.0
+        self.entry_prices[row] = 0.0
+        for col, position in zip(cols, positions):
+            self.positions[row, col] = position.position_amt
+            self.entry_prices[row, col] = position.entry_price
+
+    def set_stats(self, address: str, stats: Dict):
+        """Накопленные агрегаты аккаунта из статистики режима 5"""
+        row = self._row(address)
+        self.realized_pnl[row] = stats.get("pnl", 0.0)
+        self.volume[row] = stats.get("volume", 0.0)
+        self.fees[row] = stats.get("fees", 0.0)
+
+    def set_group(self, address: str, group_number: int):
+        self.groups[self._row(address)] = group_number
+
+    def set_marks(self, prices: Dict[str, float]):
+        """Текущие цены тикеров для оценки notional и нереализованного PnL"""
+        for ticker, price in prices.items():
+            self.marks[self._col(ticker)] = float(price)
+
+    @classmethod
+    def from_stats(cls, stats: Dict[str, Dict]) -> "PortfolioTable":
+        """Таблица из get_stats() (адрес -> агрегаты)"""
+        table = cls(capacity=max(1, len(stats)))
+        for address, account_stats in stats.items():
+            table.set_stats(address, account_stats)
+            if account_stats.get("group") is not None:
+                table.set_group(address, account_stats["group"])
+            if account_stats.get("positions"):
+                table.set_positions(address, [
+                    Position(symbol, position_amt, entry_price)
+                    for symbol, position_amt, entry_price in account_stats["positions"]
+                ])
+        return table
+
+    # ---------- сводки ----------
+
+    def _view(self, array: np.ndarray) -> np.ndarray:
+        """Только заполненные строки"""
+        return array[:len(self.addresses)]
+
+    def notional(self) -> np.ndarray:
+        """Знаковый notional accounts x tickers (по цене входа, если нет текущей)"""
+        positions = self._view(self.positions)
+        prices = np.where(self.marks > 0, self.marks, self._view(self.entry_prices))
+        return positions * prices
+
+    def unrealized_pnl(self) -> np.ndarray:
+        """Нереализованный PnL по аккаунтам"""
+        positions = self._view(self.positions)
+        entry = self._view(self.entry_prices)
+        marks = np.where(self.marks > 0, self.marks, entry)
+        return (positions * (marks - entry)).sum(axis=1)
+
+    def totals(self) -> Dict[str, float]:
+        """Итоги по всему портфелю"""
+        notional = self.notional()
+        return {
+            "accounts": len(self.addresses),
+            "volume": float(self._view(self.volume).sum()),
+            "realized_pnl": float(self._view(self.realized_pnl).sum()),
+            "unrealized_pnl": float(self.unrealized_pnl().sum()),
+            "fees": float(self._view(self.fees).sum()),
+            "gross_exposure": float(np.abs(notional).sum()),
+            "net_exposure": float(notional.sum()),
+        }
+
+    def ticker_net(self) -> Dict[str, float]:
+        """Чистый notional по тикерам"""
+        return dict(zip(self.tickers, self.notional().sum(axis=0).tolist()))
+
+    def group_net_delta(self) -> Dict[int, float]:
+        """Чистая дельта (notional) каждой группы - у нейтральной группы около 0"""
+        groups = self._view(self.groups)
+        mask = groups >= 0
+        if not mask.any():
+            return {}
+
+        net = np.bincount(groups[mask], weights=self.notional()[mask].sum(axis=1))
+        present = np.unique(groups[mask])
+        return dict(zip(present.tolist(), net[present].tolist()))
+
+    def top_exposures(self, n: int = 10) -> List[Tuple[str, float]]:
+        """n аккаунтов с наибольшим валовым notional"""
+        exposure = np.abs(self.notional()).sum(axis=1)
+        if not len(exposure):
+            return []
+
+        n = min(n, len(exposure))
+        top = np.argpartition(exposure, -n)[-n:]
+        top = top[np.argsort(exposure[top])[::-1]]
+        return [(self.addresses[row], float(exposure[row])) for row in top]
+
+    # ---------- снимки ----------
+
+    def snapshot(self) -> PortfolioSnapshot:
+        """Копия текущего состояния для сравнения со следующим запуском"""
+        return PortfolioSnapshot(
+            addresses=list(self.addresses),
+            tickers=list(self.tickers),
+            positions=self._view(self.positions).copy(),
+            realized_pnl=self._view(self.realized_pnl).copy(),
+            volume=self._view(self.volume).copy(),
+            fees=self._view(self.fees).copy(),
+        )
+
+    def _align(self, snapshot: PortfolioSnapshot) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Строки снимка в порядке строк таблицы (нет в снимке - нули)"""
+        rows = np.array([self._rows.get(address, -1) for address in snapshot.addresses], dtype=np.int64)
+        found = rows >= 0
+        cols = np.array([self._cols.get(ticker, -1) for ticker in snapshot.tickers], dtype=np.int64)
+        col_found = cols >= 0
+
+        positions = np.zeros((len(self.addresses), len(self.tickers)))
+        if found.any() and col_found.any():
+            positions[np.ix_(rows[found], cols[col_found])] = snapshot.positions[np.ix_(found, col_found)]
+
+        pnl = np.zeros(len(self.addresses))
+        volume = np.zeros(len(self.addresses))
+        pnl[rows[found]] = snapshot.realized_pnl[found]
+        volume[rows[found]] = snapshot.volume[found]
+        return positions, pnl, volume
+
+    def diff(self, snapshot: Optional[PortfolioSnapshot]) -> Dict:
+        """Изменения с момента снимка: итоги и аккаунты, где что-то поменялось"""
+        if snapshot is None:
+            snapshot = PortfolioSnapshot([], [], np.zeros((0, 0)), np.zeros(0), np.zeros(0), np.zeros(0))
+
+        positions, pnl, volume = self._align(snapshot)
+        position_change = self._view(self.positions) - positions
+        pnl_change = self._view(self.realized_pnl) - pnl
+        volume_change = self._view(self.volume) - volume
+
+        changed = np.flatnonzero(
+            np.any(position_change != 0, axis=1) | (pnl_change != 0) | (volume_change != 0)
+        )
+        return {
+            "changed_accounts": [self.addresses[row] for row in changed],
+            "volume": float(volume_change.sum()),
+            "realized_pnl": float(pnl_change.sum()),
+            "net_position": dict(zip(self.tickers, position_change.sum(axis=0).tolist())),
+        }
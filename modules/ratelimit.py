@@ -0,0 +1,92 @@
+from typing import Dict, Hashable, Optional, Tuple
+from time import monotonic
+import asyncio
+
+
+class TokenBucket:
+    """Token bucket: rate токенов в секунду, не больше capacity про запас"""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated_at = monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def try_acquire(self, tokens: float = 1) -> float:
+        """Взять токены без ожидания. Возвращает 0 или сколько секунд ждать"""
+        self._refill()
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+    async def acquire(self, tokens: float = 1):
+        """Дождаться и взять токены (ожидающие обслуживаются по очереди)"""
+        async with self._lock:
+            while True:
+                wait = self.try_acquire(tokens)
+                if not wait:
+                    return
+                await asyncio.sleep(wait)
+
+
+class RateLimiter:
+    """
+    Ограничение частоты запросов на трёх уровнях:
+    общий на base_url, на прокси и на аккаунт.
+    Запрос тратит weight токенов из каждого уровня (ордера дороже чтения).
+    """
+
+    def __init__(
+            self,
+            global_limit: Tuple[float, float] = (0, 0),
+            proxy_limit: Tuple[float, float] = (0, 0),
+            account_limit: Tuple[float, float] = (0, 0),
+            weights: Optional[Dict[str, float]] = None,
+            default_weight: float = 1,
+    ):
+        self.limits = {
+            "global": global_limit,
+            "proxy": proxy_limit,
+            "account": account_limit,
+        }
+        self.weights = weights or {}
+        self.default_weight = default_weight
+
+        self._buckets: Dict[Tuple[str, Hashable], TokenBucket] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def get_weight(self, endpoint_name: str) -> float:
+        """Вес запроса по шаблону endpoint ("POST /orders")"""
+        return self.weights.get(endpoint_name, self.default_weight)
+
+    def _bucket(self, scope: str, key: Hashable) -> Optional[TokenBucket]:
+        """Bucket уровня scope для ключа (None - уровень выключен)"""
+        rate, burst = self.limits[scope]
+        if not rate:
+            return None
+
+        bucket = self._buckets.get((scope, key))
+        if bucket is None:
+            bucket = TokenBucket(rate=rate, capacity=burst or rate)
+            self._buckets[(scope, key)] = bucket
+        return bucket
+
+    async def acquire(self, base_url: str, proxy: Optional[str], account: str, weight: float = 1):
+        """Дождаться разрешения на запрос"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Локи bucket'ов привязаны к event loop
+            self._buckets.clear()
+            self._loop = loop
+
+        for scope, key in (("account", account), ("proxy", proxy), ("global", base_url)):
+            bucket = self._bucket(scope, key)
+            if bucket is not None:
+                await bucket.acquire(min(weight, bucket.capacity))
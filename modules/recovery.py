@@ -0,0 +1,207 @@
+from typing import Callable, Dict, Iterable, List, Optional, Set
+from loguru import logger
+import asyncio
+from modules.client import EtherealClient, PairAccounts
+from modules.storage import checkpoint_key
+
+
+# Фаза чекпоинта -> что делать с модулем после падения
+RESUME = "resume"   # ордеров ещё не было - просто запустить заново
+UNWIND = "unwind"   # позиция могла открыться - снять ордера, закрыть позиции и запустить заново
+FINISH = "finish"   # модуль закрывался или уже закончил - добить закрытие и убрать из базы
+
+PHASE_ACTIONS = {
+    "started": RESUME,
+    "open": UNWIND,
+    "opened": UNWIND,
+    "close": FINISH,
+    "closed": FINISH,
+    "finished": FINISH,
+}
+
+# Тип чекпоинта -> поле владельца в задаче
+OWNER_FIELDS = {
+    "module": "encoded_apikey",
+    "group": "group_index",
+}
+
+
+class Recovery:
+    """
+    Восстановление после падения по журналу чекпоинтов.
+
+    Проходит только по незавершённым модулям из журнала, а не по всей
+    базе: для каждого сверяет живые открытые ордера и позиции аккаунтов
+    (fetch_open_orders / fetch_positions) и по фазе чекпоинта либо
+    перезапускает модуль, либо закрывает всё и перезапускает, либо
+    дозакрывает и убирает модуль из базы.
+
+    fetch_* бросают APIError вместо пустого списка: ошибка биржи не должна
+    выглядеть как "ордеров и позиций нет", чекпоинт при ней остаётся в
+    журнале до следующего запуска. Так же остаются чекпоинты, владельца
+    которых нет в текущей базе.
+    """
+
+    def __init__(self, db, initialize: Callable[..., EtherealClient], concurrency: int = 1):
+        self.db = db
+        self.initialize = initialize
+        self.concurrency = max(1, concurrency)
+
+        self.finished_keys: Set[str] = set()
+        self.finished_owners: Set[str] = set()
+
+    @staticmethod
+    def plan(state: Dict) -> str:
+        return PHASE_ACTIONS.get(state.get("phase"), UNWIND)
+
+    @staticmethod
+    async def _cancel_orders(client: EtherealClient, state: Dict) -> int:
+        """Снять ордера модуля: известные по id и любые открытые по его тикерам"""
+        order_ids = {leg.get("order_id") for leg in state.get("legs", [])}
+        tickers = set(state.get("tickers", []))
+
+        orders = await client.browser.fetch_open_orders()
+        to_cancel = [
+            order.order_id for order in orders
+            if order.order_id and (order.order_id in order_ids or order.symbol in tickers)
+        ]
+        if not to_cancel:
+            return 0
+        result = await client.browser.cancel_orders(to_cancel)
+        return sum(result.values())
+
+    @staticmethod
+    async def _close_positions(client: EtherealClient, state: Dict) -> int:
+        """Закрыть позиции аккаунта по тикерам модуля маркет ордерами"""
+        tickers = set(state.get("tickers", []))
+        positions = [
+            position for position in await client.browser.fetch_positions()
+            if position.position_amt and position.symbol in tickers
+        ]
+        if not positions:
+            return 0
+
+        results = await client.browser.create_orders([
+            {
+                "type": "MARKET",
+                "quantity": abs(position.position_amt),
+                "side": 1 if position.position_amt > 0 else 0,
+                "ticker": position.symbol,
+            }
+            for position in positions
+        ])
+        failed = [result for result in results if isinstance(result, Exception)]
+        if failed:
+            raise RuntimeError(f"Failed to close {len(failed)} positions: {failed[0]}")
+        return len(results)
+
+    async def _reconcile_module(self, module_data: Dict, state: Dict) -> str:
+        client = self.initialize(module_data)
+        try:
+            canceled = await self._cancel_orders(client, state)
+            closed = await self._close_positions(client, state)
+        finally:
+            await client.browser.close_sessions()
+        return f"canceled {canceled} orders, closed {closed} positions"
+
+    async def _reconcile_group(self, group_data: Dict, state: Dict) -> str:
+        clients = [self.initialize(wallet_data, group_data=group_data) for wallet_data in group_data["wallets_data"]]
+        try:
+            canceled = sum(await asyncio.gather(*[self._cancel_orders(client, state) for client in clients]))
+            # Позиции группы закрываются всеми ногами сразу, с добивкой остатка дельты
+            result = await PairAccounts(clients, group_data).close_legs()
+            if not result["neutral"]:
+                raise RuntimeError(f"residual delta {result['net_delta']:.8f} after close")
+        finally:
+            for client in clients:
+                await client.browser.close_sessions()
+        return f"canceled {canceled} orders, closed positions in {result['time_to_neutral'] or 0:.2f}s"
+
+    async def _finish(self, key: str, state: Dict, data: Dict):
+        """Убрать модуль из базы так же, как это сделал бы run_modules/run_pair"""
+        module_data = {**data, "module_info": {**data["module_info"], "id": state["module_id"], "status": True}}
+        if state.get("kind") == "group":
+            await self.db.remove_group(group_data=module_data)
+            self.finished_owners.add(state["owner"])
+        elif state.get("mode") in [1, 2]:
+            await self.db.remove_module(module_data=module_data)
+            self.finished_keys.add(key)
+        else:
+            await self.db.remove_account(module_data=module_data)
+            self.finished_owners.add(state["owner"])
+
+    async def _recover(self, key: str, state: Dict, data: Optional[Dict], semaphore: asyncio.Semaphore) -> bool:
+        if data is None:
+            # Владельца нет в этой базе (её пересоздали или запущена другая) - сверять не с чем.
+            # Чекпоинт - единственная запись об ордерах и тикерах, он остаётся в журнале
+            logger.warning(
+                f'[-] Recovery | {key} is not in this database, checkpoint kept until a run with its database'
+            )
+            return False
+
+        label = f'Group {data["group_number"]}' if state.get("kind") == "group" else data["label"]
+        action = self.plan(state)
+        async with semaphore:
+            try:
+                if action == RESUME:
+                    text = "restarted, no orders were sent"
+                elif state.get("phase") == "finished":
+                    text = "already done"
+                elif state.get("kind") == "group":
+                    text = await self._reconcile_group(data, state)
+                else:
+                    text = await self._reconcile_module(data, state)
+
+                if action == FINISH:
+                    await self._finish(key, state, data)
+            except Exception as e:
+                # Модуль остаётся в журнале - следующий запуск попробует снова
+                logger.error(f'[-] Recovery | {label} | Failed at phase "{state.get("phase")}": {e}')
+                await self.db.append_report(key=state["owner"], text=f"recovery failed: {e}", success=False)
+                return False
+
+        logger.warning(f'[-] Recovery | {label} | Phase "{state.get("phase")}" -> {action}: {text}')
+        await self.db.append_report(key=state["owner"], text=f"recovered after crash ({action}): {text}", success=True)
+        await self.db.finish_checkpoint(key)
+        return True
+
+    async def run(self, jobs: Iterable[Dict], kind: str) -> List[Dict]:
+        """
+        Восстановить незавершённые модули. jobs - модули/группы текущего запуска,
+        kind - их тип (module / group). Чекпоинты другого типа относятся к другой
+        базе и сверяются только запуском с ней - здесь они остаются в журнале.
+        Возвращает jobs без модулей, завершённых при восстановлении
+        """
+        jobs = list(jobs)
+        owner_field = OWNER_FIELDS[kind]
+        pending = self.db.get_checkpoints()
+
+        other = {key for key, state in pending.items() if state.get("kind", "module") != kind}
+        if other:
+            logger.info(f'[•] Recovery | {len(other)} interrupted modules belong to another database type, skipped')
+            pending = {key: state for key, state in pending.items() if key not in other}
+        if not pending:
+            return jobs
+
+        logger.info(f'[•] Recovery | {len(pending)} modules were interrupted, reconciling')
+        owners = {state.get("owner") for state in pending.values()}
+        by_owner = {job[owner_field]: job for job in jobs if job[owner_field] in owners}
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        results = await asyncio.gather(*[
+            self._recover(key, state, by_owner.get(state.get("owner")), semaphore)
+            for key, state in pending.items()
+        ])
+        failed_owners = {
+            state.get("owner")
+            for state, recovered in zip(pending.values(), results)
+            if not recovered
+        }
+
+        # Неразобранные модули не запускаем, чтобы не торговать поверх открытой позиции
+        return [
+            job for job in jobs
+            if job[owner_field] not in self.finished_owners
+            and job[owner_field] not in failed_owners
+            and checkpoint_key(job[owner_field], job["module_info"]) not in self.finished_keys
+        ]
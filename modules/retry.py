@@ -1,8 +1,10 @@
 import asyncio
 import functools
 from loguru import logger
-from typing import Any, Callable
+from typing import Any, Callable, Dict, Optional
+from random import uniform
 import time
+from modules.metrics import CIRCUIT_STATE, RETRIES
 
 class CustomError(Exception):
     """Пользовательская ошибка"""
@@ -12,53 +14,201 @@ class DataBaseError(CustomError):
     """Ошибка БД"""
     pass
 
+class SettingsError(CustomError):
+    """Некорректные настройки"""
+    pass
+
 class APIError(CustomError):
-    """Ошибка API"""
+    """
+    Ошибка API. network - ответа не было (соединение, прокси, таймаут),
+    sent - запрос мог дойти до биржи (False только если соединение не открылось)
+    """
+
+    def __init__(
+            self,
+            message: str = "",
+            status: Optional[int] = None,
+            retry_after: Optional[float] = None,
+            network: bool = False,
+            sent: bool = True,
+    ):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.network = network
+        self.sent = sent
+
+class CircuitOpenError(APIError):
+    """Endpoint временно отключён circuit breaker'ом"""
     pass
 
-def async_retry(max_retries: int = 3, delay: float = 2.0):
+class RetryPolicy:
+    """
+    Экспоненциальные повторы с full jitter и классификацией ошибок.
+    idempotent=False (создание ордера): повторяется только то, что биржа
+    точно не исполнила - 429 и соединение, которое не открылось
+    """
+
+    def __init__(
+            self,
+            max_retries: int = 3,
+            base_delay: float = 1.0,
+            max_delay: float = 30.0,
+            idempotent: bool = True,
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.idempotent = idempotent
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        """429/5xx/таймауты/сеть - повторять, остальные 4xx и ошибки разбора - нет"""
+        if isinstance(error, CircuitOpenError):
+            return False
+        if isinstance(error, APIError):
+            if error.status is not None:
+                return error.status in (408, 429) or error.status >= 500
+            return error.network
+        return True
+
+    def should_retry(self, error: Exception) -> bool:
+        """Повторять ли вызов с этой политикой"""
+        if not self.is_retryable(error):
+            return False
+        if self.idempotent:
+            return True
+        # Таймаут, обрыв или 5xx: ордер мог создаться, повтор создаст второй
+        return isinstance(error, APIError) and (error.status == 429 or (error.network and not error.sent))
+
+    def get_delay(self, attempt: int, error: Exception = None) -> float:
+        """Пауза перед попыткой attempt + 1"""
+        retry_after = getattr(error, "retry_after", None)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+class CircuitBreaker:
+    """
+    Circuit breaker одного endpoint, общий для всех аккаунтов.
+    После failure_threshold ошибок подряд запросы сразу падают
+    recovery_timeout секунд, затем пропускается один пробный запрос.
+    Ошибки соединения и прокси не считаются: это проблема одного
+    аккаунта, а не деградация API. 429 тоже: лимит свой у каждого аккаунта,
+    его обрабатывают повторы с паузой и bucket'ы RATE_LIMITER.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+
+    def before_call(self):
+        """Проверить, можно ли сейчас делать запрос"""
+        if self.state == self.CLOSED:
+            return
+
+        # OPEN - пора пустить пробный запрос; HALF_OPEN - пробный запрос завис, пустить ещё один
+        if time.monotonic() - self.opened_at >= self.recovery_timeout:
+            self._set_state(self.HALF_OPEN)
+            self.opened_at = time.monotonic()
+            return
+
+        raise CircuitOpenError(f"Circuit open for {self.name}")
+
+    def _set_state(self, state: str):
+        self.state = state
+        CIRCUIT_STATE.set(self.STATE_CODES[state], (self.name,))
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            self._set_state(self.CLOSED)
+        self.failures = 0
+
+    def record_failure(self, error: Exception):
+        """Учитывать только ошибки деградации API, а не 4xx (и 429) и не сеть"""
+        if getattr(error, "network", False):
+            return
+        if getattr(error, "status", None) == 429 or not RetryPolicy.is_retryable(error):
+            if self.state == self.HALF_OPEN:
+                self._set_state(self.CLOSED)
+            return
+
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                logger.warning(f"Circuit opened for {self.name} after {self.failures} failures")
+            self._set_state(self.OPEN)
+            self.opened_at = time.monotonic()
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+def get_breaker(name: str, failure_threshold: int = 5, recovery_timeout: float = 30.0) -> CircuitBreaker:
+    """Общий circuit breaker по имени endpoint"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = CircuitBreaker(name, failure_threshold, recovery_timeout)
+        _breakers[name] = breaker
+    return breaker
+
+def async_retry(max_retries: int = 3, delay: float = 2.0, policy: Optional[RetryPolicy] = None):
     """Декоратор для асинхронных функций с повторами"""
+    policy = policy or RetryPolicy(max_retries=max_retries, base_delay=delay)
+
     def decorator(func: Callable) -> Callable:
+        labels = (func.__qualname__,)
+
         @functools.wraps(func)
         async def wrapper(*args, **kwargs) -> Any:
-            last_exception = None
-            for attempt in range(max_retries):
+            for attempt in range(policy.max_retries):
                 try:
                     return await func(*args, **kwargs)
                 except Exception as e:
-                    last_exception = e
-                    if attempt < max_retries - 1:
-                        wait_time = delay * (attempt + 1)
-                        logger.warning(
-                            f"Retry {attempt + 1}/{max_retries} | "
-                            f"Waiting {wait_time}s | Error: {str(e)[:100]}"
-                        )
-                        await asyncio.sleep(wait_time)
-                    else:
-                        logger.error(f"Failed after {max_retries} retries: {e}")
-            raise last_exception
+                    if attempt >= policy.max_retries - 1 or not policy.should_retry(e):
+                        logger.error(f"Failed after {attempt + 1} attempts: {e}")
+                        raise
+
+                    wait_time = policy.get_delay(attempt, e)
+                    RETRIES.inc(labels)
+                    logger.warning(
+                        f"Retry {attempt + 1}/{policy.max_retries} | "
+                        f"Waiting {wait_time:.2f}s | Error: {str(e)[:100]}"
+                    )
+                    await asyncio.sleep(wait_time)
         return wrapper
     return decorator
 
-def sync_retry(max_retries: int = 3, delay: float = 2.0):
+def sync_retry(max_retries: int = 3, delay: float = 2.0, policy: Optional[RetryPolicy] = None):
     """Декоратор для синхронных функций с повторами"""
+    policy = policy or RetryPolicy(max_retries=max_retries, base_delay=delay)
+
     def decorator(func: Callable) -> Callable:
+        labels = (func.__qualname__,)
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs) -> Any:
-            last_exception = None
-            for attempt in range(max_retries):
+            for attempt in range(policy.max_retries):
                 try:
                     return func(*args, **kwargs)
                 except Exception as e:
-                    last_exception = e
-                    if attempt < max_retries - 1:
-                        wait_time = delay * (attempt + 1)
-                        logger.warning(
-                            f"Retry {attempt + 1}/{max_retries} | "
-                            f"Waiting {wait_time}s | Error: {str(e)[:100]}"
-                        )
-                        time.sleep(wait_time)
-            raise last_exception
+                    if attempt >= policy.max_retries - 1 or not policy.should_retry(e):
+                        raise
+
+                    wait_time = policy.get_delay(attempt, e)
+                    RETRIES.inc(labels)
+                    logger.warning(
+                        f"Retry {attempt + 1}/{policy.max_retries} | "
+                        f"Waiting {wait_time:.2f}s | Error: {str(e)[:100]}"
+                    )
+                    time.sleep(wait_time)
         return wrapper
     return decorator
 
@@ -0,0 +1,171 @@
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterable, List, Optional, Tuple
+from collections import deque
+from loguru import logger
+from time import monotonic
+import asyncio
+from modules.metrics import SCHEDULER_ADDRESS_WAIT, SCHEDULER_WORKER_WAIT
+
+
+class Job:
+    """Задача планировщика: корутина-фабрика + адреса, которые она занимает"""
+
+    __slots__ = ("addresses", "func", "args", "queued", "submitted_at", "ready_at")
+
+    def __init__(self, addresses: Tuple[str, ...], func: Callable[..., Awaitable[Any]], args: Dict):
+        self.addresses = addresses
+        self.func = func
+        self.args = args
+        self.queued = False
+        self.submitted_at = monotonic()
+        self.ready_at = 0.0
+
+
+class Scheduler:
+    """
+    Планировщик модулей с пулом воркеров.
+
+    У каждого адреса своя очередь задач. Задача готова к запуску, когда
+    она первая во всех очередях своих адресов, поэтому один адрес никогда
+    не выполняется параллельно, а локи на каждого ожидающего не нужны.
+    Готовые задачи берутся по FIFO - аккаунты чередуются честно.
+    Количество корутин = количеству воркеров, а не модулей.
+    """
+
+    def __init__(self, concurrency: int):
+        self.concurrency = max(1, concurrency)
+
+        self._queues: Dict[str, Deque[Job]] = {}
+        self._ready: Deque[Job] = deque()
+        self._pending = 0
+        self._running = 0
+
+        self._wakeup: Optional[asyncio.Condition] = None
+        self._workers: List[asyncio.Task] = []
+        self._closed = False
+
+    def submit(self, addresses: Iterable[str], func: Callable[..., Awaitable[Any]], **kwargs):
+        """Добавить задачу, занимающую указанные адреса"""
+        job = Job(tuple(dict.fromkeys(addresses)), func, kwargs)
+
+        for address in job.addresses:
+            self._queues.setdefault(address, deque()).append(job)
+
+        self._pending += 1
+        self._check_ready(job)
+
+    def _is_head(self, job: Job) -> bool:
+        return all(self._queues[address][0] is job for address in job.addresses)
+
+    def _check_ready(self, job: Job):
+        """Поставить задачу в готовые, если все её адреса свободны"""
+        if not job.queued and self._is_head(job):
+            job.queued = True
+            job.ready_at = monotonic()
+            SCHEDULER_ADDRESS_WAIT.observe(job.ready_at - job.submitted_at)
+            self._ready.append(job)
+
+    def _finish(self, job: Job):
+        """Освободить адреса задачи и разбудить следующих"""
+        for address in job.addresses:
+            queue = self._queues[address]
+            queue.popleft()
+            if not queue:
+                del self._queues[address]
+
+        for address in job.addresses:
+            queue = self._queues.get(address)
+            if queue:
+                self._check_ready(queue[0])
+
+    async def _worker(self, index: int):
+        """Воркер: брать готовые задачи пока они есть"""
+        while True:
+            async with self._wakeup:
+                await self._wakeup.wait_for(
+                    lambda: self._closed or (self._ready and index < self.concurrency)
+                )
+                if self._closed:
+                    return
+
+                job = self._ready.popleft()
+                self._running += 1
+                SCHEDULER_WORKER_WAIT.observe(monotonic() - job.ready_at)
+
+            try:
+                await job.func(**job.args)
+            except Exception as e:
+                logger.error(f'[-] Scheduler | Job error: {e}')
+            finally:
+                async with self._wakeup:
+                    self._running -= 1
+                    self._pending -= 1
+                    self._finish(job)
+                    self._wakeup.notify_all()
+
+    def _spawn_workers(self):
+        """Довести количество воркеров до concurrency"""
+        while len(self._workers) < self.concurrency:
+            self._workers.append(asyncio.create_task(self._worker(len(self._workers))))
+
+    async def set_concurrency(self, concurrency: int):
+        """Изменить количество одновременных задач на лету"""
+        self.concurrency = max(1, concurrency)
+        if self._wakeup is None:
+            return
+
+        self._spawn_workers()
+        async with self._wakeup:
+            self._wakeup.notify_all()
+
+    async def run(self):
+        """Выполнить все задачи и дождаться завершения"""
+        self._wakeup = asyncio.Condition()
+        self._closed = False
+        self._spawn_workers()
+
+        try:
+            async with self._wakeup:
+                self._wakeup.notify_all()
+                await self._wakeup.wait_for(lambda: self._pending == 0)
+                self._closed = True
+                self._wakeup.notify_all()
+
+            await asyncio.gather(*self._workers)
+        finally:
+            for worker in self._workers:
+                worker.cancel()
+            self._workers = []
+
+    def take_ready(self) -> Optional[Job]:
+        """Забрать готовую задачу для внешнего исполнителя (координатор)"""
+        if not self._ready:
+            return None
+
+        job = self._ready.popleft()
+        self._running += 1
+        SCHEDULER_WORKER_WAIT.observe(monotonic() - job.ready_at)
+        return job
+
+    def complete(self, job: Job):
+        """Задача, взятая через take_ready, выполнена"""
+        self._running -= 1
+        self._pending -= 1
+        self._finish(job)
+
+    def requeue(self, job: Job):
+        """Вернуть взятую задачу в начало готовых (адреса остаются занятыми ею)"""
+        self._running -= 1
+        job.ready_at = monotonic()
+        self._ready.appendleft(job)
+
+    def is_empty(self) -> bool:
+        return self._pending == 0
+
+    def stats(self) -> Dict[str, int]:
+        """Состояние очереди"""
+        return {
+            "pending": self._pending,
+            "running": self._running,
+            "ready": len(self._ready),
+            "addresses": len(self._queues),
+        }
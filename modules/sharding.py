@@ -0,0 +1,49 @@
+from typing import Dict, List, Sequence
+from hashlib import blake2b
+
+
+def shard_of(key: str, shards: int) -> int:
+    """Стабильный номер шарда ключа (не зависит от PYTHONHASHSEED и запуска)"""
+    digest = blake2b(key.lower().encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+
+def assign_shards(jobs_addresses: Sequence[Sequence[str]], shards: int) -> List[int]:
+    """
+    Шард каждой задачи по её адресам.
+
+    Задачи, у которых есть общий адрес (аккаунт и все его модули, все
+    участники группы, аккаунт в нескольких группах), объединяются в одну
+    компоненту и попадают в один шард - иначе один адрес мог бы
+    выполняться в двух процессах сразу. Шард компоненты - хэш её
+    наименьшего адреса, поэтому распределение детерминировано.
+    """
+    if shards <= 1:
+        return [0] * len(jobs_addresses)
+
+    parent: Dict[str, str] = {}
+
+    def find(address: str) -> str:
+        root = address
+        while parent[root] != root:
+            root = parent[root]
+        while parent[address] != root:
+            parent[address], address = root, parent[address]
+        return root
+
+    for addresses in jobs_addresses:
+        for address in addresses:
+            parent.setdefault(address, address)
+        first = find(addresses[0]) if addresses else None
+        for address in addresses[1:]:
+            root = find(address)
+            if root != first:
+                # Корень - наименьший адрес компоненты
+                if root < first:
+                    root, first = first, root
+                parent[root] = first
+
+    return [
+        shard_of(find(addresses[0]), shards) if addresses else 0
+        for addresses in jobs_addresses
+    ]
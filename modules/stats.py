@@ -0,0 +1,188 @@
+from typing import TYPE_CHECKING, Dict, List, Optional
+from loguru import logger
+from time import time
+import asyncio
+import csv
+import os
+from modules.browser import Browser
+from modules.database import DataBase
+from modules.models import Fill
+from settings import STATS_SETTINGS
+
+if TYPE_CHECKING:
+    from modules.portfolio import PortfolioTable
+
+
+STATS_COLUMNS = ["address", "label", "trades", "volume", "pnl", "fees", "last_fill_at", "updated_at"]
+
+
+def empty_stats(label: str = "") -> Dict:
+    """Начальные агрегаты аккаунта"""
+    return {
+        "label": label,
+        "trades": 0,
+        "volume": 0.0,
+        "pnl": 0.0,
+        "fees": 0.0,
+        "cursor": {"since": 0, "ids": []},
+        "updated_at": 0,
+    }
+
+
+class StatsCollector:
+    """
+    Инкрементальная статистика аккаунтов (режим 5).
+
+    Для каждого адреса хранится курсор - время последней учтённой сделки
+    и id сделок с этим временем. При следующем запуске запрашиваются
+    только сделки новее курсора, и они добавляются к накопленным
+    агрегатам. Если новых сделок нет - один запрос на аккаунт.
+    """
+
+    def __init__(self, db: DataBase, page_size: int = 100):
+        self.db = db
+        self.page_size = page_size
+        self.stats: Dict[str, Dict] = db.get_stats()
+
+    @staticmethod
+    def apply_fills(stats: Dict, fills: List[Fill]):
+        """Добавить сделки к агрегатам и сдвинуть курсор"""
+        cursor = stats["cursor"]
+        seen = set(cursor["ids"])
+
+        for fill in fills:
+            if fill.created_at < cursor["since"] or (fill.created_at == cursor["since"] and fill.fill_id in seen):
+                continue
+
+            stats["trades"] += 1
+            stats["volume"] += fill.notional
+            stats["pnl"] += fill.realized_pnl
+            stats["fees"] += fill.fee
+
+            if fill.created_at > cursor["since"]:
+                cursor["since"] = fill.created_at
+                seen = set()
+            seen.add(fill.fill_id)
+
+        cursor["ids"] = sorted(seen)
+
+    async def update(self, browser: Browser, address: str, label: str = "") -> Dict:
+        """Догрузить новые сделки аккаунта и сохранить агрегаты"""
+        stats = self.stats.get(address)
+        if stats is None or "cursor" not in stats:
+            stats = empty_stats(label)
+
+        new_fills = 0
+        while True:
+            trades_before = stats["trades"]
+            fills = await browser.get_fills(since=stats["cursor"]["since"], limit=self.page_size)
+            self.apply_fills(stats, fills)
+            new_fills += stats["trades"] - trades_before
+
+            # Неполная страница или страница без новых сделок - дальше ничего нет
+            if len(fills) < self.page_size or stats["trades"] == trades_before:
+                break
+
+        stats["label"] = label or stats["label"]
+        changed = bool(new_fills) or not stats["updated_at"]
+
+        if STATS_SETTINGS["positions"]:
+            positions = [
+                [position.symbol, position.position_amt, position.entry_price]
+                for position in await browser.get_positions()
+            ]
+            if positions != stats.get("positions", []):
+                stats["positions"] = positions
+                changed = True
+
+        if changed:
+            stats["updated_at"] = int(time())
+            self.stats[address] = stats
+            self.db.save_stats(address=address, data=stats)
+
+        logger.debug(f'[•] {label} | Stats: {new_fills} new fills, {stats["trades"]} total')
+        return stats
+
+    def set_group(self, address: str, group_number: int, label: str = ""):
+        """Запомнить группу аккаунта (режим 3) для сводки дельты групп в портфеле"""
+        stats = self.stats.get(address)
+        if stats is None or "cursor" not in stats:
+            stats = empty_stats(label)
+        if stats.get("group") == group_number:
+            return
+
+        stats["group"] = group_number
+        self.stats[address] = stats
+        self.db.save_stats(address=address, data=stats)
+
+    def portfolio(self) -> "PortfolioTable":
+        """Таблица портфеля по накопленной статистике"""
+        # numpy грузится только когда портфель действительно нужен
+        from modules.portfolio import PortfolioTable
+        return PortfolioTable.from_stats({
+            address: stats for address, stats in self.stats.items() if "cursor" in stats
+        })
+
+    @staticmethod
+    async def load_marks(table: "PortfolioTable", browser: Browser):
+        """Текущие цены тикеров портфеля (живой стакан или MARKET_CACHE)"""
+        prices = await asyncio.gather(*[browser.get_price(ticker) for ticker in table.tickers], return_exceptions=True)
+        marks = {}
+        for ticker, price in zip(table.tickers, prices):
+            if isinstance(price, Exception):
+                # Без цены notional считается по цене входа
+                logger.warning(f'[-] Portfolio | No mark price for {ticker}: {price}')
+            else:
+                marks[ticker] = price
+        table.set_marks(marks)
+
+    def export_csv(self, file_name: Optional[str] = None) -> str:
+        """Снимок агрегатов всех аккаунтов в CSV, строка на аккаунт"""
+        file_name = file_name or STATS_SETTINGS["csv_file"]
+        tmp_name = f"{file_name}.tmp"
+
+        with open(tmp_name, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(STATS_COLUMNS)
+            for address, stats in sorted(self.stats.items()):
+                if "cursor" not in stats:
+                    continue
+                writer.writerow([
+                    address,
+                    stats["label"],
+                    stats["trades"],
+                    round(stats["volume"], 8),
+                    round(stats["pnl"], 8),
+                    round(stats["fees"], 8),
+                    stats["cursor"]["since"],
+                    stats["updated_at"],
+                ])
+
+        os.replace(tmp_name, file_name)
+        return file_name
+
+
+STATS_COLLECTOR: Optional[StatsCollector] = None
+
+
+def get_stats_collector(db: DataBase) -> StatsCollector:
+    """Общий сборщик статистики для всех аккаунтов режима 5"""
+    global STATS_COLLECTOR
+
+    if STATS_COLLECTOR is None or STATS_COLLECTOR.db is not db:
+        STATS_COLLECTOR = StatsCollector(db=db, page_size=STATS_SETTINGS["page_size"])
+    return STATS_COLLECTOR
+
+
+def save_portfolio_snapshot(table: "PortfolioTable", file_name: Optional[str] = None) -> Dict:
+    """Сохранить снимок портфеля и вернуть изменения с прошлого запуска"""
+    from modules.portfolio import PortfolioSnapshot
+    file_name = file_name or STATS_SETTINGS["snapshot_file"]
+
+    previous = PortfolioSnapshot.load(file_name) if os.path.isfile(file_name) else None
+    changes = table.diff(previous)
+
+    tmp_name = f"{file_name}.tmp"
+    table.snapshot().save(tmp_name)
+    os.replace(tmp_name, file_name)
+    return changes
@@ -0,0 +1,34 @@
+from modules.storage.base import StorageBackend
+from modules.storage.sqlite import SQLiteStorage, migrate_json
+from modules.storage.json_storage import JsonStorage
+from modules.storage.memory import MemoryStorage
+from modules.storage.journal import ReportJournal
+from modules.storage.checkpoint import CheckpointJournal, checkpoint_key
+from modules.retry import DataBaseError
+
+
+BACKENDS = {
+    "sqlite": SQLiteStorage,
+    "json": JsonStorage,
+    "memory": MemoryStorage,
+}
+
+
+def get_storage(backend: str) -> StorageBackend:
+    """Создать хранилище по имени из настроек"""
+    if backend not in BACKENDS:
+        raise DataBaseError(f'Unknown database backend "{backend}", expected one of {list(BACKENDS)}')
+    return BACKENDS[backend]()
+
+
+__all__ = [
+    'StorageBackend',
+    'SQLiteStorage',
+    'JsonStorage',
+    'MemoryStorage',
+    'ReportJournal',
+    'CheckpointJournal',
+    'checkpoint_key',
+    'get_storage',
+    'migrate_json',
+]
@@ -0,0 +1,80 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class StorageBackend(ABC):
+    """
+    Интерфейс хранилища для DataBase.
+
+    Формат modules_db в replace_modules - как у modules.json:
+    {encoded_apikey: {...аккаунт}} или {group_index: {...группа}}.
+    """
+
+    # ---------- modules / groups ----------
+
+    @abstractmethod
+    def replace_modules(self, modules_db: Dict[str, Dict]):
+        """Заменить все модули"""
+
+    @abstractmethod
+    def is_group(self) -> bool:
+        """База создана под дельта-нейтральные группы"""
+
+    @abstractmethod
+    def is_empty(self) -> bool:
+        """В базе нет ни аккаунтов, ни групп"""
+
+    @abstractmethod
+    def get_first_key(self) -> Optional[str]:
+        """Первый зашифрованный ключ (для проверки пароля)"""
+
+    @abstractmethod
+    def get_amounts(self) -> Dict[str, int]:
+        """Количество аккаунтов/групп и модулей"""
+
+    @abstractmethod
+    def get_all_modules(self, unique_wallets: bool = False) -> List[Dict]:
+        """Все модули со статусом to_run (или по одному на аккаунт)"""
+
+    @abstractmethod
+    def get_all_groups(self) -> List[Dict]:
+        """Все группы с модулем to_run"""
+
+    @abstractmethod
+    def finish_module(self, owner: str, module_id: int, success: bool) -> bool:
+        """Удалить выполненный модуль или пометить failed. True - у владельца не осталось to_run"""
+
+    @abstractmethod
+    def finish_owner(self, owner: str, success: bool):
+        """Закрыть все модули аккаунта/группы"""
+
+    # ---------- reports ----------
+
+    @abstractmethod
+    def append_report(self, key: str, text: str, success: Any = True):
+        """Добавить запись в отчёт"""
+
+    @abstractmethod
+    def get_reports(self, key: str) -> List[Tuple[str, Any]]:
+        """Все записи отчёта по ключу"""
+
+    @abstractmethod
+    def delete_reports(self, key: str):
+        """Удалить записи отчёта по ключу"""
+
+    @abstractmethod
+    def clear_reports(self):
+        """Очистить отчёты"""
+
+    # ---------- stats ----------
+
+    @abstractmethod
+    def save_stats(self, address: str, data: Dict):
+        """Сохранить статистику аккаунта"""
+
+    @abstractmethod
+    def get_stats(self) -> Dict[str, Dict]:
+        """Статистика всех аккаунтов"""
+
+    def close(self):
+        """Закрыть хранилище"""
@@ -0,0 +1,137 @@
+from typing import Any, Dict
+from os import path, fsync, replace
+from loguru import logger
+from threading import Lock
+import json
+
+
+def checkpoint_key(owner: str, module_info: Dict) -> str:
+    """Ключ чекпоинта модуля: владелец (encoded apikey / group_index) + id модуля"""
+    return f"{owner}:{module_info['id']}"
+
+
+class CheckpointJournal:
+    """
+    Журнал чекпоинтов модулей (write-ahead log): append-only JSON строки.
+
+    В индексе только модули в процессе выполнения: запись "set" сливает
+    поля в состояние модуля (фаза, ордера, исполненный объём), "done"
+    удаляет модуль. Каждая запись сразу уходит в ОС - падение процесса
+    её не теряет; fsync делает фоновая задача DataBase раз в
+    fsync_interval секунд в отдельном потоке, не под локом базы.
+    Журнал сжимается до живых записей при открытии и когда мёртвых
+    строк становится слишком много, поэтому восстановление читает
+    столько, сколько модулей не завершилось.
+    """
+
+    def __init__(
+            self,
+            file_name: str = 'databases/checkpoints.jsonl',
+            fsync_interval: float = 0.2,
+            compact_lines: int = 10_000,
+    ):
+        self.file_name = file_name
+        self.fsync_interval = fsync_interval
+        self.compact_lines = compact_lines
+        self.index: Dict[str, Dict[str, Any]] = {}
+
+        self._lines = 0
+        self._compact()
+        self._file = open(self.file_name, 'a', encoding="utf-8")
+        self._dirty = False
+        self._sync_lock = Lock()
+
+    def _compact(self):
+        """Прочитать журнал в индекс и переписать только живые модули"""
+        if not path.isfile(self.file_name):
+            return
+
+        lines = 0
+        with open(self.file_name, encoding="utf-8") as f:
+            for line in f:
+                lines += 1
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Недописанная последняя строка после падения
+                    continue
+                self._apply(entry)
+
+        self._lines = len(self.index)
+        if lines == self._lines:
+            return
+
+        self._rewrite()
+        logger.debug(f'Checkpoint journal compacted: {lines} -> {self._lines} entries')
+
+    def _rewrite(self):
+        tmp_name = f"{self.file_name}.tmp"
+        with open(tmp_name, 'w', encoding="utf-8") as f:
+            for key, state in self.index.items():
+                f.write(json.dumps({"op": "set", "key": key, "fields": state}) + '\n')
+            f.flush()
+            fsync(f.fileno())
+        replace(tmp_name, self.file_name)
+        self._lines = len(self.index)
+
+    def _apply(self, entry: Dict):
+        """Применить запись журнала к индексу"""
+        op = entry.get("op")
+        if op == "set":
+            self.index.setdefault(entry["key"], {}).update(entry["fields"])
+        elif op == "done":
+            self.index.pop(entry["key"], None)
+
+    def _write(self, entry: Dict):
+        """Дописать запись в конец журнала"""
+        self._apply(entry)
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        self._dirty = True
+        self._lines += 1
+
+        if self._lines > self.compact_lines + 2 * len(self.index):
+            # Файл меняется под фоновым fsync - ждём его
+            with self._sync_lock:
+                self._file.close()
+                self._rewrite()
+                self._file = open(self.file_name, 'a', encoding="utf-8")
+                self._dirty = False
+
+    @property
+    def dirty(self) -> bool:
+        """Есть записи, ещё не сброшенные fsync"""
+        return self._dirty
+
+    def sync(self):
+        """fsync накопленных записей. Потокобезопасно: вызывается из фоновой задачи DataBase"""
+        with self._sync_lock:
+            if self._dirty and not self._file.closed:
+                # Флаг снимается до fsync: запись, пришедшая во время fsync, попадёт в следующий
+                self._dirty = False
+                fsync(self._file.fileno())
+
+    def save(self, key: str, **fields):
+        """Обновить состояние модуля"""
+        self._write({"op": "set", "key": key, "fields": fields})
+
+    def finish(self, key: str):
+        """Модуль завершён - чекпоинт больше не нужен"""
+        if key in self.index:
+            self._write({"op": "done", "key": key})
+
+    def get(self, key: str) -> Dict[str, Any]:
+        return dict(self.index.get(key, {}))
+
+    def pending(self) -> Dict[str, Dict[str, Any]]:
+        """Незавершённые модули"""
+        return {key: dict(state) for key, state in self.index.items()}
+
+    def close(self):
+        """Сбросить журнал на диск и закрыть файл"""
+        if not self._file.closed:
+            self.sync()
+            with self._sync_lock:
+                self._file.close()
+            if not self.index:
+                self._rewrite()
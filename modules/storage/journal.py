@@ -0,0 +1,112 @@
+from typing import Any, Dict, List, Tuple
+from loguru import logger
+from os import fsync, path, replace
+from threading import Lock
+import json
+
+
+class ReportJournal:
+    """
+    Журнал отчётов: append-only файл с JSON строками.
+
+    Каждая запись - одна строка в конце файла, fsync делается пачкой
+    раз в fsync_interval секунд (group commit) фоновой задачей DataBase
+    в отдельном потоке, а не внутри записи. Чтение идёт
+    из индекса в памяти по ключу (encoded apikey / group_index).
+    При запуске журнал сжимается до живых записей.
+    """
+
+    def __init__(self, file_name: str = 'databases/reports.jsonl', fsync_interval: float = 1.0):
+        self.file_name = file_name
+        self.fsync_interval = fsync_interval
+        self.index: Dict[str, List[Tuple[str, Any]]] = {}
+
+        self._compact()
+        self._file = open(self.file_name, 'a', encoding="utf-8")
+        self._dirty = False
+        self._sync_lock = Lock()
+
+    def _compact(self):
+        """Прочитать журнал в индекс и переписать только живые записи"""
+        if not path.isfile(self.file_name):
+            return
+
+        lines = 0
+        with open(self.file_name, encoding="utf-8") as f:
+            for line in f:
+                lines += 1
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Недописанная последняя строка после падения
+                    continue
+                self._apply(entry)
+
+        live = sum(len(entries) for entries in self.index.values())
+        if live == lines:
+            return
+
+        tmp_name = f"{self.file_name}.tmp"
+        with open(tmp_name, 'w', encoding="utf-8") as f:
+            for key, entries in self.index.items():
+                for text, success in entries:
+                    f.write(json.dumps({"op": "add", "key": key, "text": text, "success": success}) + '\n')
+            f.flush()
+            fsync(f.fileno())
+        replace(tmp_name, self.file_name)
+
+        logger.debug(f'Report journal compacted: {lines} -> {live} entries')
+
+    def _apply(self, entry: Dict):
+        """Применить запись журнала к индексу"""
+        op = entry.get("op")
+        if op == "add":
+            self.index.setdefault(entry["key"], []).append((entry["text"], entry["success"]))
+        elif op == "del":
+            self.index.pop(entry["key"], None)
+        elif op == "clear":
+            self.index.clear()
+
+    def _write(self, entry: Dict):
+        """Дописать запись в конец журнала"""
+        self._apply(entry)
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        self._dirty = True
+
+    @property
+    def dirty(self) -> bool:
+        """Есть записи, ещё не сброшенные fsync"""
+        return self._dirty
+
+    def sync(self):
+        """fsync накопленных записей. Потокобезопасно: вызывается из фоновой задачи DataBase"""
+        with self._sync_lock:
+            if self._dirty and not self._file.closed:
+                # Флаг снимается до fsync: запись, пришедшая во время fsync, попадёт в следующий
+                self._dirty = False
+                fsync(self._file.fileno())
+
+    def append_report(self, key: str, text: str, success: Any = True):
+        """Добавить запись в отчёт"""
+        self._write({"op": "add", "key": key, "text": text, "success": success})
+
+    def get_reports(self, key: str) -> List[Tuple[str, Any]]:
+        """Все записи отчёта по ключу"""
+        return list(self.index.get(key, []))
+
+    def delete_reports(self, key: str):
+        """Удалить записи отчёта по ключу"""
+        if key in self.index:
+            self._write({"op": "del", "key": key})
+
+    def clear_reports(self):
+        """Очистить отчёты"""
+        self._write({"op": "clear"})
+
+    def close(self):
+        """Сбросить журнал на диск и закрыть файл"""
+        if not self._file.closed:
+            self.sync()
+            with self._sync_lock:
+                self._file.close()
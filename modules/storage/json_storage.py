@@ -0,0 +1,70 @@
+from typing import Any, Dict, List, Tuple
+from os import path
+import json
+from modules.storage.memory import MemoryStorage
+
+
+def load_reports(report_db_name: str) -> Dict[str, List[Tuple[str, Any]]]:
+    """
+    Прочитать report.json любого формата: список {text, success},
+    старый словарь {"texts": [...]} и записи-строки (success неизвестен - None)
+    """
+    with open(report_db_name, encoding="utf-8") as f:
+        report_db = json.load(f)
+
+    reports = {}
+    for key, value in report_db.items():
+        entries = value.get("texts", []) if isinstance(value, dict) else value
+        reports[key] = [
+            (entry.get("text", ""), entry.get("success", True)) if isinstance(entry, dict) else (str(entry), None)
+            for entry in entries
+        ]
+    return reports
+
+
+class JsonStorage(MemoryStorage):
+    """
+    Старое хранилище: modules.json, report.json, stats.json.
+    Каждое изменение перезаписывает файл целиком.
+    """
+
+    def __init__(
+            self,
+            modules_db_name: str = 'databases/modules.json',
+            report_db_name: str = 'databases/report.json',
+            stats_db_name: str = 'databases/stats.json',
+    ):
+        super().__init__()
+        self.modules_db_name = modules_db_name
+        self.report_db_name = report_db_name
+        self.stats_db_name = stats_db_name
+
+        # Создать БД если их нет
+        for db_name in [self.modules_db_name, self.report_db_name, self.stats_db_name]:
+            if not path.isfile(db_name):
+                with open(db_name, 'w') as f:
+                    f.write('{}')
+
+        with open(self.modules_db_name, encoding="utf-8") as f:
+            self.modules_db = json.load(f)
+        self.reports = load_reports(self.report_db_name)
+        with open(self.stats_db_name, encoding="utf-8") as f:
+            self.stats = json.load(f)
+
+        if self._assign_ids():
+            self._save_modules()
+
+    def _save_modules(self):
+        with open(self.modules_db_name, 'w', encoding="utf-8") as f:
+            json.dump(self.modules_db, f)
+
+    def _save_reports(self):
+        with open(self.report_db_name, 'w', encoding="utf-8") as f:
+            json.dump({
+                key: [{"text": text, "success": success} for text, success in entries]
+                for key, entries in self.reports.items()
+            }, f)
+
+    def _save_stats(self):
+        with open(self.stats_db_name, 'w', encoding="utf-8") as f:
+            json.dump(self.stats, f)
@@ -0,0 +1,176 @@
+from typing import Any, Dict, List, Optional, Tuple
+from modules.storage.base import StorageBackend
+
+
+class MemoryStorage(StorageBackend):
+    """Хранилище в памяти (для тестов и бенчмарков)"""
+
+    def __init__(self):
+        self.modules_db: Dict[str, Dict] = {}
+        self.reports: Dict[str, List[Tuple[str, Any]]] = {}
+        self.stats: Dict[str, Dict] = {}
+        self._next_id = 1
+
+    # Точки сохранения для наследников (JsonStorage)
+    def _save_modules(self):
+        pass
+
+    def _save_reports(self):
+        pass
+
+    def _save_stats(self):
+        pass
+
+    def _assign_ids(self) -> bool:
+        """Проставить модулям постоянные id. True - были новые"""
+        ids = [
+            module["id"]
+            for value in self.modules_db.values()
+            for module in value.get("modules", [])
+            if "id" in module
+        ]
+        self._next_id = max(ids, default=0) + 1
+
+        changed = False
+        for value in self.modules_db.values():
+            for module in value.get("modules", []):
+                if "id" not in module:
+                    module["id"] = self._next_id
+                    self._next_id += 1
+                    changed = True
+        return changed
+
+    # ---------- modules / groups ----------
+
+    def replace_modules(self, modules_db: Dict[str, Dict]):
+        self.modules_db = {
+            key: {**value, "modules": [dict(module) for module in value.get("modules", [])]}
+            for key, value in modules_db.items()
+        }
+        self._assign_ids()
+        self._save_modules()
+
+    def is_group(self) -> bool:
+        if not self.modules_db:
+            return False
+        return "group_number" in next(iter(self.modules_db.values()))
+
+    def is_empty(self) -> bool:
+        return not self.modules_db
+
+    def get_first_key(self) -> Optional[str]:
+        if not self.modules_db:
+            return None
+        if self.is_group():
+            return next(iter(self.modules_db.values()))["wallets_data"][0]["encoded_apikey"]
+        return next(iter(self.modules_db))
+
+    def get_amounts(self) -> Dict[str, int]:
+        modules_amount = sum(len(value.get("modules", [])) for value in self.modules_db.values())
+        return {
+            "groups_amount" if self.is_group() else "accs_amount": len(self.modules_db),
+            "modules_amount": modules_amount,
+        }
+
+    @staticmethod
+    def _module_info(module: Dict) -> Dict:
+        return {
+            "id": module["id"],
+            "module_name": module["module_name"],
+            "status": module["status"],
+        }
+
+    def get_all_modules(self, unique_wallets: bool = False) -> List[Dict]:
+        all_modules = []
+        for key, value in self.modules_db.items():
+            for module in value.get("modules", []):
+                if module["status"] != "to_run":
+                    continue
+
+                all_modules.append({
+                    "encoded_apikey": key,
+                    "address": value["address"],
+                    "label": value.get("label"),
+                    "proxy": value.get("proxy"),
+                    "module_info": self._module_info(module),
+                })
+                if unique_wallets:
+                    break
+
+        return all_modules
+
+    def get_all_groups(self) -> List[Dict]:
+        all_groups = []
+        for key, value in self.modules_db.items():
+            module = next((m for m in value.get("modules", []) if m["status"] == "to_run"), None)
+            if module is None:
+                continue
+
+            all_groups.append({
+                "group_index": key,
+                "group_number": value["group_number"],
+                "wallets_data": [dict(wallet_data) for wallet_data in value["wallets_data"]],
+                "module_info": self._module_info(module),
+            })
+
+        return all_groups
+
+    def finish_module(self, owner: str, module_id: int, success: bool) -> bool:
+        value = self.modules_db.get(owner)
+        if value is None:
+            return True
+
+        for module in value["modules"]:
+            if module["id"] == module_id:
+                if success:
+                    value["modules"].remove(module)
+                else:
+                    module["status"] = "failed"
+                break
+
+        pending = sum(1 for module in value["modules"] if module["status"] == "to_run")
+        if not value["modules"]:
+            del self.modules_db[owner]
+
+        self._save_modules()
+        return pending == 0
+
+    def finish_owner(self, owner: str, success: bool):
+        value = self.modules_db.get(owner)
+        if value is None:
+            return
+
+        if success:
+            del self.modules_db[owner]
+        else:
+            for module in value["modules"]:
+                if module["status"] == "to_run":
+                    module["status"] = "failed"
+
+        self._save_modules()
+
+    # ---------- reports ----------
+
+    def append_report(self, key: str, text: str, success: Any = True):
+        self.reports.setdefault(key, []).append((text, success))
+        self._save_reports()
+
+    def get_reports(self, key: str) -> List[Tuple[str, Any]]:
+        return list(self.reports.get(key, []))
+
+    def delete_reports(self, key: str):
+        if self.reports.pop(key, None) is not None:
+            self._save_reports()
+
+    def clear_reports(self):
+        self.reports = {}
+        self._save_reports()
+
+    # ---------- stats ----------
+
+    def save_stats(self, address: str, data: Dict):
+        self.stats[address] = data
+        self._save_stats()
+
+    def get_stats(self) -> Dict[str, Dict]:
+        return dict(self.stats)
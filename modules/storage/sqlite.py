@@ -0,0 +1,322 @@
+from typing import Any, Dict, List, Optional, Tuple
+from loguru import logger
+from os import path, replace
+from time import time
+import sqlite3
+import json
+from modules.storage.base import StorageBackend
+from modules.storage.json_storage import load_reports
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS accounts (
+    encoded_apikey TEXT PRIMARY KEY,
+    address TEXT NOT NULL,
+    label TEXT,
+    proxy TEXT,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS groups (
+    group_index TEXT PRIMARY KEY,
+    group_number INTEGER NOT NULL,
+    wallets_data TEXT NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS modules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    owner TEXT NOT NULL,
+    module_name TEXT NOT NULL,
+    status TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS modules_owner ON modules (owner, status);
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL,
+    text TEXT NOT NULL,
+    success TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reports_key ON reports (key);
+CREATE TABLE IF NOT EXISTS stats (
+    address TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    Хранилище модулей, групп, отчётов и статистики на SQLite (WAL).
+
+    Изменение статуса модуля - точечный UPDATE/DELETE по индексу,
+    без перезаписи всей базы.
+    """
+
+    def __init__(self, db_name: str = 'databases/ethereal.db'):
+        self.db_name = db_name
+        self.conn = sqlite3.connect(db_name, isolation_level=None, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        """Закрыть соединение"""
+        self.conn.close()
+
+    # ---------- modules / groups ----------
+
+    def replace_modules(self, modules_db: Dict[str, Dict]):
+        """Заменить все модули (формат как у modules.json)"""
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self.conn.execute("DELETE FROM modules")
+            self.conn.execute("DELETE FROM accounts")
+            self.conn.execute("DELETE FROM groups")
+
+            for position, (key, value) in enumerate(modules_db.items()):
+                if "group_number" in value:
+                    self.conn.execute(
+                        "INSERT INTO groups VALUES (?, ?, ?, ?)",
+                        (key, value["group_number"], json.dumps(value["wallets_data"]), position)
+                    )
+                else:
+                    self.conn.execute(
+                        "INSERT INTO accounts VALUES (?, ?, ?, ?, ?)",
+                        (key, value["address"], value.get("label"), value.get("proxy"), position)
+                    )
+
+                self.conn.executemany(
+                    "INSERT INTO modules (owner, module_name, status) VALUES (?, ?, ?)",
+                    [(key, module["module_name"], module["status"]) for module in value.get("modules", [])]
+                )
+
+    def is_group(self) -> bool:
+        """База создана под дельта-нейтральные группы"""
+        return self.conn.execute("SELECT 1 FROM groups LIMIT 1").fetchone() is not None
+
+    def is_empty(self) -> bool:
+        """В базе нет ни аккаунтов, ни групп"""
+        return (
+            self.conn.execute("SELECT 1 FROM accounts LIMIT 1").fetchone() is None
+            and not self.is_group()
+        )
+
+    def get_first_key(self) -> Optional[str]:
+        """Первый зашифрованный ключ (для проверки пароля)"""
+        row = self.conn.execute(
+            "SELECT encoded_apikey FROM accounts ORDER BY position LIMIT 1"
+        ).fetchone()
+        if row:
+            return row[0]
+
+        row = self.conn.execute("SELECT wallets_data FROM groups ORDER BY position LIMIT 1").fetchone()
+        if row:
+            return json.loads(row[0])[0]["encoded_apikey"]
+
+        return None
+
+    def get_amounts(self) -> Dict[str, int]:
+        """Количество аккаунтов/групп и модулей"""
+        modules_amount = self.conn.execute("SELECT COUNT(*) FROM modules").fetchone()[0]
+
+        groups_amount = self.conn.execute("SELECT COUNT(*) FROM groups").fetchone()[0]
+        if groups_amount:
+            return {"groups_amount": groups_amount, "modules_amount": modules_amount}
+
+        accs_amount = self.conn.execute("SELECT COUNT(*) FROM accounts").fetchone()[0]
+        return {"accs_amount": accs_amount, "modules_amount": modules_amount}
+
+    def get_all_modules(self, unique_wallets: bool = False) -> List[Dict]:
+        """Все модули со статусом to_run (или по одному на аккаунт)"""
+        rows = self.conn.execute(
+            "SELECT m.id, m.module_name, m.status, a.encoded_apikey, a.address, a.label, a.proxy "
+            "FROM modules m JOIN accounts a ON a.encoded_apikey = m.owner "
+            "WHERE m.status = 'to_run' ORDER BY a.position, m.id"
+        ).fetchall()
+
+        seen = set()
+        all_modules = []
+        for row in rows:
+            if unique_wallets:
+                if row["encoded_apikey"] in seen:
+                    continue
+                seen.add(row["encoded_apikey"])
+
+            all_modules.append({
+                "encoded_apikey": row["encoded_apikey"],
+                "address": row["address"],
+                "label": row["label"],
+                "proxy": row["proxy"],
+                "module_info": {
+                    "id": row["id"],
+                    "module_name": row["module_name"],
+                    "status": row["status"],
+                },
+            })
+
+        return all_modules
+
+    def get_all_groups(self) -> List[Dict]:
+        """Все группы с модулем to_run"""
+        rows = self.conn.execute(
+            "SELECT g.group_index, g.group_number, g.wallets_data, m.id, m.module_name, m.status "
+            "FROM groups g JOIN modules m ON m.owner = g.group_index "
+            "WHERE m.status = 'to_run' ORDER BY g.position, m.id"
+        ).fetchall()
+
+        seen = set()
+        all_groups = []
+        for row in rows:
+            if row["group_index"] in seen:
+                continue
+            seen.add(row["group_index"])
+
+            all_groups.append({
+                "group_index": row["group_index"],
+                "group_number": row["group_number"],
+                "wallets_data": json.loads(row["wallets_data"]),
+                "module_info": {
+                    "id": row["id"],
+                    "module_name": row["module_name"],
+                    "status": row["status"],
+                },
+            })
+
+        return all_groups
+
+    def finish_module(self, owner: str, module_id: int, success: bool) -> bool:
+        """Удалить выполненный модуль или пометить failed. True - у владельца не осталось to_run"""
+        with self.conn:
+            self.conn.execute("BEGIN")
+            if success:
+                self.conn.execute("DELETE FROM modules WHERE id = ?", (module_id,))
+            else:
+                self.conn.execute("UPDATE modules SET status = 'failed' WHERE id = ?", (module_id,))
+            self._drop_owner_if_empty(owner)
+
+        return self._pending_count(owner) == 0
+
+    def finish_owner(self, owner: str, success: bool):
+        """Закрыть все модули аккаунта/группы"""
+        with self.conn:
+            self.conn.execute("BEGIN")
+            if success:
+                self.conn.execute("DELETE FROM modules WHERE owner = ?", (owner,))
+            else:
+                self.conn.execute(
+                    "UPDATE modules SET status = 'failed' WHERE owner = ? AND status = 'to_run'",
+                    (owner,)
+                )
+            self._drop_owner_if_empty(owner)
+
+    def _pending_count(self, owner: str) -> int:
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM modules WHERE owner = ? AND status = 'to_run'", (owner,)
+        ).fetchone()[0]
+
+    def _drop_owner_if_empty(self, owner: str):
+        """Удалить аккаунт/группу без модулей"""
+        if self.conn.execute("SELECT 1 FROM modules WHERE owner = ? LIMIT 1", (owner,)).fetchone():
+            return
+        self.conn.execute("DELETE FROM accounts WHERE encoded_apikey = ?", (owner,))
+        self.conn.execute("DELETE FROM groups WHERE group_index = ?", (owner,))
+
+    # ---------- reports ----------
+
+    def append_report(self, key: str, text: str, success: Any = True):
+        """Добавить запись в отчёт"""
+        self.conn.execute(
+            "INSERT INTO reports (key, text, success, created) VALUES (?, ?, ?, ?)",
+            (key, text, json.dumps(success), time())
+        )
+
+    def get_reports(self, key: str) -> List[Tuple[str, Any]]:
+        """Все записи отчёта по ключу"""
+        rows = self.conn.execute(
+            "SELECT text, success FROM reports WHERE key = ? ORDER BY id", (key,)
+        ).fetchall()
+        return [(row["text"], json.loads(row["success"])) for row in rows]
+
+    def delete_reports(self, key: str):
+        """Удалить записи отчёта по ключу"""
+        self.conn.execute("DELETE FROM reports WHERE key = ?", (key,))
+
+    def clear_reports(self):
+        """Очистить отчёты"""
+        self.conn.execute("DELETE FROM reports")
+
+    # ---------- stats ----------
+
+    def save_stats(self, address: str, data: Dict):
+        """Сохранить статистику аккаунта"""
+        self.conn.execute(
+            "INSERT INTO stats (address, data) VALUES (?, ?) "
+            "ON CONFLICT(address) DO UPDATE SET data = excluded.data",
+            (address, json.dumps(data))
+        )
+
+    def get_stats(self) -> Dict[str, Dict]:
+        """Статистика всех аккаунтов"""
+        return {
+            row["address"]: json.loads(row["data"])
+            for row in self.conn.execute("SELECT address, data FROM stats")
+        }
+
+    # ---------- meta ----------
+
+    def get_meta(self, name: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, name: str, value: str):
+        self.conn.execute(
+            "INSERT INTO meta (name, value) VALUES (?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+            (name, value)
+        )
+
+
+def migrate_json(
+        storage: SQLiteStorage,
+        modules_db_name: str = 'databases/modules.json',
+        report_db_name: str = 'databases/report.json',
+        stats_db_name: str = 'databases/stats.json',
+) -> bool:
+    """Однократно импортировать старые JSON базы. True - импорт выполнен"""
+    if storage.get_meta("json_migrated"):
+        return False
+
+    if not any(path.isfile(name) for name in (modules_db_name, report_db_name, stats_db_name)):
+        storage.set_meta("json_migrated", "1")
+        return False
+
+    if path.isfile(modules_db_name):
+        with open(modules_db_name, encoding="utf-8") as f:
+            modules_db = json.load(f)
+        if modules_db:
+            storage.replace_modules(modules_db)
+
+    if path.isfile(report_db_name):
+        for key, entries in load_reports(report_db_name).items():
+            for text, success in entries:
+                storage.append_report(key, text, success)
+
+    if path.isfile(stats_db_name):
+        with open(stats_db_name, encoding="utf-8") as f:
+            stats_db = json.load(f)
+        for address, data in stats_db.items():
+            storage.save_stats(address, data)
+
+    # Старые файлы оставляем рядом, но переименовываем, чтобы не импортировать повторно
+    for name in (modules_db_name, report_db_name, stats_db_name):
+        if path.isfile(name):
+            replace(name, f"{name}.migrated")
+
+    storage.set_meta("json_migrated", "1")
+    logger.info(f'Migrated JSON databases into {storage.db_name}')
+    return True
@@ -0,0 +1,227 @@
+from decimal import Decimal
+from loguru import logger
+from typing import Dict, Iterable, List, Optional
+from time import monotonic
+import aiohttp
+import asyncio
+import json
+from modules.models import OrderBookTop
+
+
+class OrderBook:
+    """Локальный L2 стакан одного тикера"""
+
+    def __init__(self, ticker: str):
+        self.ticker = ticker
+        self.bids: Dict[Decimal, Decimal] = {}
+        self.asks: Dict[Decimal, Decimal] = {}
+        self.seq: Optional[int] = None
+        self.live = False
+        self.updated_at = 0.0
+
+    @staticmethod
+    def _apply_levels(side: Dict[Decimal, Decimal], levels: List):
+        """Применить уровни [price, size], size 0 - удалить уровень"""
+        for price, size in levels:
+            price = Decimal(str(price))
+            size = Decimal(str(size))
+            if size == 0:
+                side.pop(price, None)
+            else:
+                side[price] = size
+
+    def apply_snapshot(self, seq: int, bids: List, asks: List):
+        """Полностью заменить стакан снапшотом"""
+        self.bids.clear()
+        self.asks.clear()
+        self._apply_levels(self.bids, bids)
+        self._apply_levels(self.asks, asks)
+        self.seq = seq
+        self.live = True
+        self.updated_at = monotonic()
+
+    def apply_delta(self, seq: int, bids: List, asks: List) -> bool:
+        """Применить дельту. False - пропущен номер, нужен resync"""
+        if not self.live or self.seq is None or seq != self.seq + 1:
+            self.live = False
+            return False
+
+        self._apply_levels(self.bids, bids)
+        self._apply_levels(self.asks, asks)
+        self.seq = seq
+        self.updated_at = monotonic()
+        return True
+
+    def best_bid(self) -> Decimal:
+        return max(self.bids) if self.bids else Decimal("0")
+
+    def best_ask(self) -> Decimal:
+        return min(self.asks) if self.asks else Decimal("0")
+
+    def top(self) -> OrderBookTop:
+        """Лучшие цены в формате Browser.get_order_book"""
+        return OrderBookTop(bid=self.best_bid(), ask=self.best_ask())
+
+    def mid_price(self) -> Optional[Decimal]:
+        """Средняя цена между лучшими bid и ask"""
+        if not self.bids or not self.asks:
+            return None
+        return (self.best_bid() + self.best_ask()) / 2
+
+
+class MarketStream:
+    """
+    Подписка на стаканы через websocket.
+
+    Поток: snapshot, затем delta с последовательными seq. При пропуске
+    seq стакан помечается не живым и новый снапшот запрашивается один
+    раз: дельты до его прихода отбрасываются. Если снапшот не пришёл за
+    max_age, запрос повторяется.
+    """
+
+    def __init__(
+            self,
+            url: str,
+            max_age: float = 5.0,
+            reconnect_delay: float = 1.0,
+            max_reconnect_delay: float = 30.0,
+    ):
+        self.url = url
+        self.max_age = max_age
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+
+        self.books: Dict[str, OrderBook] = {}
+        self.resyncs = 0
+        self._resyncing: Dict[str, float] = {}
+        self._ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def get_book(self, ticker: str) -> Optional[OrderBook]:
+        """Вернуть стакан, если он живой и не устарел"""
+        book = self.books.get(ticker)
+        if book is None or not book.live:
+            return None
+        if monotonic() - book.updated_at > self.max_age:
+            return None
+        return book
+
+    async def start(self, tickers: Iterable[str]):
+        """Запустить фоновую подписку"""
+        for ticker in tickers:
+            self.books.setdefault(ticker, OrderBook(ticker))
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Остановить подписку"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        for book in self.books.values():
+            book.live = False
+
+    async def _subscribe(self, ticker: str):
+        """Запросить снапшот + дельты по тикеру"""
+        await self._ws.send_str(json.dumps({
+            "type": "subscribe",
+            "channel": "book",
+            "ticker": ticker,
+        }))
+
+    async def _run(self):
+        """Цикл подключения с переподключением"""
+        delay = self.reconnect_delay
+
+        while True:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(self.url, heartbeat=15) as ws:
+                        self._ws = ws
+                        self._resyncing.clear()
+                        delay = self.reconnect_delay
+
+                        for ticker in self.books:
+                            await self._subscribe(ticker)
+
+                        async for msg in ws:
+                            if msg.type == aiohttp.WSMsgType.TEXT:
+                                await self._handle(json.loads(msg.data))
+                            elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Market stream error: {e}")
+            finally:
+                self._ws = None
+                for book in self.books.values():
+                    book.live = False
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _handle(self, message: Dict):
+        """Обработать сообщение стрима"""
+        book = self.books.get(message.get("ticker"))
+        if book is None:
+            return
+
+        msg_type = message.get("type")
+        seq = int(message.get("seq", 0))
+
+        if msg_type == "snapshot":
+            self._resyncing.pop(book.ticker, None)
+            book.apply_snapshot(seq, message.get("bids", []), message.get("asks", []))
+        elif msg_type == "delta":
+            requested_at = self._resyncing.get(book.ticker)
+            if requested_at is not None:
+                # Снапшот уже запрошен - дельты до него бесполезны
+                if monotonic() - requested_at < self.max_age:
+                    return
+                logger.debug(f"Market stream | {book.ticker} snapshot not received in {self.max_age}s, resubscribe")
+                self._resyncing[book.ticker] = monotonic()
+                await self._subscribe(book.ticker)
+                return
+
+            if not book.apply_delta(seq, message.get("bids", []), message.get("asks", [])):
+                self.resyncs += 1
+                self._resyncing[book.ticker] = monotonic()
+                logger.debug(f"Market stream | {book.ticker} sequence gap, resync")
+                await self._subscribe(book.ticker)
+
+
+MARKET_STREAM: Optional[MarketStream] = None
+
+
+def get_live_book(ticker: str) -> Optional[OrderBook]:
+    """Живой стакан из общего стрима (None - читать через REST)"""
+    if MARKET_STREAM is None:
+        return None
+    return MARKET_STREAM.get_book(ticker)
+
+
+async def start_market_stream(url: str, tickers: Iterable[str], max_age: float = 5.0) -> MarketStream:
+    """Запустить общий стрим, который читает Browser"""
+    global MARKET_STREAM
+
+    if MARKET_STREAM is None or MARKET_STREAM.url != url:
+        MARKET_STREAM = MarketStream(url=url, max_age=max_age)
+
+    await MARKET_STREAM.start(tickers)
+    return MARKET_STREAM
+
+
+async def stop_market_stream():
+    """Остановить общий стрим"""
+    global MARKET_STREAM
+
+    if MARKET_STREAM is not None:
+        await MARKET_STREAM.stop()
+        MARKET_STREAM = None
@@ -0,0 +1,243 @@
+from typing import Dict, Optional, Set
+from loguru import logger
+import aiohttp
+import asyncio
+from modules.codec import loads
+from modules.browser import Browser
+from modules.models import Order
+from modules.monitor import DELTA_MONITOR
+from modules.pool import SESSION_POOL
+from settings import ORDER_TRACKER_SETTINGS, ETHEREAL_WS_URL
+
+
+class OrderTracker:
+    """
+    Отслеживание исполнения ордеров всех аккаунтов.
+
+    Вместо get_order_status на каждый ордер каждый интервал - один
+    fetch_open_orders на аккаунт: ордер, пропавший из открытых, проверяется
+    одним запросом статуса. Если список открытых ордеров получить не
+    удалось, сверка аккаунта пропускается до следующего опроса.
+
+    Если включён стрим ордеров, опрос аккаунта приостанавливается, только
+    когда стрим реально прислал обновление ордера этого аккаунта:
+    подписка без авторизации может молчать, и тогда опрос продолжает
+    работать как без стрима.
+
+    Аккаунты различаются по адресу (label у аккаунтов может совпадать).
+    """
+
+    def __init__(self, poll_interval: float = 2.0, ws_url: Optional[str] = None):
+        self.poll_interval = poll_interval
+        self.ws_url = ws_url
+
+        self._browsers: Dict[str, Browser] = {}
+        self._futures: Dict[str, asyncio.Future] = {}
+        self._orders: Dict[str, Order] = {}
+        self._by_account: Dict[str, Set[str]] = {}
+        self._owners: Dict[str, str] = {}
+        self._pollers: Dict[str, asyncio.Task] = {}
+        self._streams: Dict[str, asyncio.Task] = {}
+        self._stream_live: Set[str] = set()
+        self._waiters: Dict[str, int] = {}
+
+        self.polls = 0
+        self.status_checks = 0
+
+    def track(self, browser: Browser, order: Order) -> asyncio.Future:
+        """Начать отслеживать ордер. Future завершится финальным Order"""
+        future = self._futures.get(order.order_id)
+        if future is not None:
+            return future
+
+        account = browser.address or browser.label
+        future = asyncio.get_running_loop().create_future()
+        self._futures[order.order_id] = future
+        self._orders[order.order_id] = order
+        self._browsers[account] = browser
+        self._by_account.setdefault(account, set()).add(order.order_id)
+        self._owners[order.order_id] = account
+
+        if self.ws_url and account not in self._streams:
+            self._streams[account] = asyncio.create_task(self._run_stream(account))
+
+        poller = self._pollers.get(account)
+        if poller is None or poller.done():
+            self._pollers[account] = asyncio.create_task(self._poll(account))
+        return future
+
+    async def wait_filled(self, order_id: str, timeout: Optional[float] = None) -> Optional[Order]:
+        """
+        Дождаться финального статуса ордера (filled/canceled/...).
+        None - не дождались за timeout. Ордер перестаёт отслеживаться,
+        когда сдался последний ожидающий - остальные ждут дальше
+        """
+        future = self._futures.get(order_id)
+        if future is None:
+            raise KeyError(f"Order {order_id} is not tracked")
+
+        self._waiters[order_id] = self._waiters.get(order_id, 0) + 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            return None
+        finally:
+            self._waiters[order_id] -= 1
+            if not self._waiters[order_id]:
+                del self._waiters[order_id]
+                if not future.done():
+                    self._forget(order_id)
+
+    def _forget(self, order_id: str):
+        """Убрать ордер из отслеживания (ожидающие future получают None)"""
+        future = self._futures.pop(order_id, None)
+        if future is not None and not future.done():
+            future.set_result(None)
+        self._orders.pop(order_id, None)
+
+        account = self._owners.pop(order_id, None)
+        order_ids = self._by_account.get(account)
+        if order_ids is not None:
+            order_ids.discard(order_id)
+            if not order_ids:
+                del self._by_account[account]
+
+    def _resolve(self, order: Order):
+        """Ордер в финальном статусе - разбудить ожидающих"""
+        future = self._futures.get(order.order_id)
+        if future is not None and not future.done():
+            future.set_result(order)
+        self._forget(order.order_id)
+
+    def _update(self, order: Order):
+        """Применить свежее состояние ордера"""
+        if order.order_id not in self._orders:
+            return
+
+        known = self._orders[order.order_id]
+        filled = order.executed_qty - known.executed_qty
+        if filled > 0:
+            # Новые исполнения - в монитор дельты
+            address = self._browsers[self._owners[order.order_id]].address
+            side = order.side or known.side
+            if address:
+                DELTA_MONITOR.on_fill(address, order.symbol or known.symbol, filled if side == "BUY" else -filled)
+
+        order.side = order.side or known.side
+        order.symbol = order.symbol or known.symbol
+        if order.is_final:
+            self._resolve(order)
+        else:
+            self._orders[order.order_id] = order
+
+    async def _poll(self, account: str):
+        """Опрос открытых ордеров аккаунта, пока у него есть отслеживаемые ордера"""
+        browser = self._browsers[account]
+
+        while self._by_account.get(account):
+            await asyncio.sleep(self.poll_interval)
+            if account in self._stream_live:
+                continue
+
+            try:
+                await self._poll_once(browser, account)
+            except Exception as e:
+                logger.warning(f'[-] Tracker | {account} poll failed: {e}')
+
+        self._pollers.pop(account, None)
+        self._browsers.pop(account, None)
+        stream = self._streams.pop(account, None)
+        if stream:
+            stream.cancel()
+
+    async def _poll_once(self, browser: Browser, account: str):
+        """Один запрос открытых ордеров + сверка с отслеживаемыми"""
+        self.polls += 1
+        try:
+            open_orders = {order.order_id: order for order in await browser.fetch_open_orders()}
+        except Exception as e:
+            # get_open_orders вернул бы [] - и каждый ордер ушёл бы на проверку статуса
+            logger.warning(f'[-] Tracker | {account} open orders unavailable, skipping this poll: {e}')
+            return
+
+        for order_id in list(self._by_account.get(account, ())):
+            order = open_orders.get(order_id)
+            if order is not None:
+                self._update(order)
+                continue
+
+            # Пропал из открытых: исполнен, отменён или ещё не виден в списке
+            self.status_checks += 1
+            try:
+                self._update(await browser.get_order_status(order_id, self._orders[order_id].symbol or ""))
+            except KeyError:
+                pass
+            except Exception as e:
+                logger.warning(f'[-] Tracker | Failed to check order {order_id}: {e}')
+
+    async def _run_stream(self, account: str):
+        """Стрим ордеров аккаунта (переподключение с паузой)"""
+        browser = self._browsers[account]
+        delay = 1
+
+        while True:
+            try:
+                session = await SESSION_POOL.acquire(self.ws_url, browser.proxy)
+                try:
+                    async with session.ws_connect(self.ws_url, proxy=browser.proxy, heartbeat=15) as ws:
+                        # Обновления чужих ордеров отбрасывает _update
+                        await ws.send_json({"type": "subscribe", "channel": "orders"})
+                        delay = 1
+
+                        async for msg in ws:
+                            if msg.type == aiohttp.WSMsgType.TEXT:
+                                message = loads(msg.data.encode())
+                                if message.get("channel") == "orders":
+                                    order = Order.from_response(message.get("data", {}))
+                                    if self._owners.get(order.order_id) == account and account not in self._stream_live:
+                                        # Стрим доставляет ордера аккаунта - опрос больше не нужен
+                                        logger.debug(f'Tracker | {account} user stream is live, polling paused')
+                                        self._stream_live.add(account)
+                                    self._update(order)
+                            elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                                break
+                finally:
+                    await SESSION_POOL.release(self.ws_url, browser.proxy)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.debug(f'Tracker | {account} user stream error: {e}')
+            finally:
+                # Пока стрима нет - работает опрос
+                self._stream_live.discard(account)
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 30)
+
+    async def close(self):
+        """Остановить опрос и стримы"""
+        tasks = list(self._pollers.values()) + list(self._streams.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        for order_id in list(self._futures):
+            self._forget(order_id)
+        self._pollers.clear()
+        self._streams.clear()
+        self._browsers.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Нагрузка на API: запросы списков и точечные проверки"""
+        return {
+            "tracked": len(self._futures),
+            "accounts": len(self._by_account),
+            "polls": self.polls,
+            "status_checks": self.status_checks,
+        }
+
+
+ORDER_TRACKER = OrderTracker(
+    poll_interval=ORDER_TRACKER_SETTINGS["poll_interval"],
+    ws_url=ETHEREAL_WS_URL if ORDER_TRACKER_SETTINGS["user_stream"] else None,
+)
@@ -1,3 +1,5 @@
+from importlib import import_module
+from typing import TYPE_CHECKING
 from modules.utils.helpers import (
     round_cut,
     async_sleep,
@@ -5,8 +7,32 @@ from modules.utils.helpers import (
     get_address,
     sleeping,
 )
-from modules.utils.logging import TgReport, WindowName
-from modules.utils.ui import choose_mode
+
+# TgReport тянет aiohttp, choose_mode - inquirer: грузятся при первом обращении
+_LAZY = {
+    'TgReport': 'modules.utils.logging',
+    'WindowName': 'modules.utils.logging',
+    'choose_mode': 'modules.utils.ui',
+}
+
+if TYPE_CHECKING:
+    from modules.utils.logging import TgReport, WindowName
+    from modules.utils.ui import choose_mode
+
+
+def __getattr__(name: str):
+    module_name = _LAZY.get(name)
+    if module_name is None:
+        raise AttributeError(f"module 'modules.utils' has no attribute '{name}'")
+
+    value = getattr(import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY))
+
 
 __all__ = [
     'round_cut',
@@ -1,42 +1,160 @@
 from loguru import logger
-from typing import Optional
-import requests
-from datetime import datetime
+from typing import List, Optional
+from random import uniform
+from time import monotonic
+import asyncio
+from modules.pool import SessionPool
+from modules.ratelimit import TokenBucket
 
 
 class TgReport:
-    """Отправка отчётов в Telegram"""
+    """
+    Отправка отчётов в Telegram.
 
-    def __init__(self):
-        from settings import TG_BOT_TOKEN, TG_USER_ID
+    send_log только кладёт текст в очередь. Фоновая задача раз в
+    flush_interval склеивает накопленные логи в одно сообщение и
+    отправляет его с ограничением частоты и повторами.
+
+    У отчётов свой пул сессий с проверкой сертификатов: в запросе токен
+    бота, и настройка verify_ssl пула биржи на него не действует.
+    """
+
+    max_length = 4000
+
+    def __init__(self, api_url: str = "https://api.telegram.org"):
+        from settings import TG_BOT_TOKEN, TG_USER_ID, TG_SETTINGS
         self.bot_token = TG_BOT_TOKEN
         self.user_ids = TG_USER_ID or []
+        self.api_url = api_url.rstrip('/')
+
+        self.flush_interval = TG_SETTINGS["flush_interval"]
+        self.max_retries = TG_SETTINGS["max_retries"]
+        self.bucket = TokenBucket(rate=TG_SETTINGS["messages_per_second"])
+
+        self.pool = SessionPool(limit_per_proxy=2, verify_ssl=True)
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def queue_size(self) -> int:
+        """Логов в очереди на отправку"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def _ensure_worker(self):
+        """Запустить фоновую отправку в текущем event loop"""
+        if self._task is None or self._task.done() or self._task.get_loop() is not asyncio.get_running_loop():
+            self._queue = asyncio.Queue()
+            self._task = asyncio.create_task(self._worker())
 
     async def send_log(self, logs: str):
-        """Отправить логи в Telegram"""
+        """Поставить логи в очередь на отправку в Telegram"""
         if not self.bot_token or not self.user_ids:
             return
 
         if logs == 'No actions':
             return
 
-        try:
-            url = f"https://api.telegram.org/bot{self.bot_token}/sendMessage"
+        self._ensure_worker()
+        self._queue.put_nowait(logs)
 
-            # Разбить большие сообщения
-            max_length = 4000
-            messages = [logs[i:i + max_length] for i in range(0, len(logs), max_length)]
+    async def close(self, timeout: float = 30):
+        """Дослать очередь и остановить фоновую задачу"""
+        if self._task is None or self._task.done():
+            return
 
-            for message in messages:
-                for user_id in self.user_ids:
-                    payload = {
-                        "chat_id": user_id,
-                        "text": message,
-                        "parse_mode": "HTML"
-                    }
-                    requests.post(url, json=payload, timeout=10)
+        self._queue.put_nowait(None)
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Telegram queue not drained in {timeout}s, {self._queue.qsize()} logs dropped")
+            self._task.cancel()
+        self._task = None
+        await self.pool.close_all()
+
+    async def _worker(self):
+        """Собирать логи за flush_interval и отправлять одним сообщением"""
+        while True:
+            logs = await self._queue.get()
+            if logs is None:
+                return
+
+            batch = [logs]
+            stop = False
+            deadline = monotonic() + self.flush_interval
+            while (timeout := deadline - monotonic()) > 0:
+                try:
+                    logs = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if logs is None:
+                    stop = True
+                    break
+                batch.append(logs)
+
+            await self._flush(batch)
+            if stop:
+                return
+
+    def _split(self, batch: List[str]) -> List[str]:
+        """Склеить логи в сообщения не длиннее max_length"""
+        messages = []
+        current = ""
+        for logs in batch:
+            for i in range(0, len(logs), self.max_length):
+                chunk = logs[i:i + self.max_length]
+                if current and len(current) + len(chunk) + 2 > self.max_length:
+                    messages.append(current)
+                    current = ""
+                current = f"{current}\n\n{chunk}" if current else chunk
+        if current:
+            messages.append(current)
+        return messages
+
+    async def _flush(self, batch: List[str]):
+        """Отправить пачку логов всем пользователям"""
+        try:
+            session = await self.pool.acquire(self.api_url)
         except Exception as e:
             logger.warning(f"Failed to send Telegram message: {e}")
+            return
+
+        try:
+            for message in self._split(batch):
+                for user_id in self.user_ids:
+                    await self._send(session, user_id, message)
+        finally:
+            await self.pool.release(self.api_url)
+
+    async def _send(self, session, user_id: int, message: str):
+        """Отправить одно сообщение с повторами"""
+        url = f"{self.api_url}/bot{self.bot_token}/sendMessage"
+        payload = {
+            "chat_id": user_id,
+            "text": message,
+            "parse_mode": "HTML"
+        }
+
+        for attempt in range(self.max_retries):
+            await self.bucket.acquire()
+            try:
+                async with session.post(url, json=payload) as response:
+                    if response.status == 200:
+                        return
+
+                    data = await response.json(content_type=None)
+                    if response.status == 429:
+                        wait = data.get("parameters", {}).get("retry_after", 1)
+                    elif response.status >= 500:
+                        wait = uniform(0, 2 ** attempt)
+                    else:
+                        logger.warning(f"Failed to send Telegram message: {data.get('description')}")
+                        return
+            except Exception as e:
+                wait = uniform(0, 2 ** attempt)
+                logger.debug(f"Telegram send error: {e}")
+
+            await asyncio.sleep(wait)
+
+        logger.warning(f"Failed to send Telegram message after {self.max_retries} retries")
 
 
 class WindowName:
@@ -1,5 +1,4 @@
 from loguru import logger
-from inquirer import prompt, List, Confirm
 from typing import Optional
 
 
@@ -17,6 +16,8 @@ class ModeChoice:
 
 def choose_mode() -> ModeChoice:
     """Выбрать режим работы софта"""
+    # inquirer нужен только интерактивному меню - не грузим его в cli.py
+    from inquirer import prompt, List
 
     logger.info("=" * 60)
     logger.info("🤖 ETHEREAL TRADING BOT")
@@ -61,6 +62,7 @@ def choose_mode() -> ModeChoice:
 
 def confirm_action(message: str) -> bool:
     """Подтвердить действие"""
+    from inquirer import prompt, Confirm
     questions = [
         Confirm(
             'confirm',
@@ -0,0 +1,129 @@
+from cryptography.fernet import Fernet, InvalidToken
+from concurrent.futures import ProcessPoolExecutor
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional
+from hashlib import md5, scrypt
+from os import urandom
+
+
+VERSION_PREFIX = "v2$"
+SCRYPT_PARAMS = {"n": 2 ** 14, "r": 8, "p": 1}
+
+
+def _decrypt_chunk(password: bytes, tokens: List[str]) -> List[str]:
+    """Расшифровать пачку токенов в дочернем процессе"""
+    vault = KeyVault(password.decode(), process_pool_threshold=0)
+    try:
+        return [vault._decrypt_token(token) for token in tokens]
+    finally:
+        vault.close()
+
+
+class KeyVault:
+    """
+    Хранилище расшифрованных ключей.
+
+    Пароль вводится один раз, ключи расшифровываются пачкой и лежат
+    в ограниченном LRU словаре, который затирается при закрытии.
+
+    Форматы токенов:
+        gAAAA...            - v1, Fernet(md5(password)), старые базы
+        v2$<salt>$gAAAA...  - v2, Fernet(scrypt(password, salt))
+    """
+
+    def __init__(
+            self,
+            password: str,
+            kdf: str = "scrypt",
+            max_cached: int = 100_000,
+            process_pool_threshold: int = 50_000,
+    ):
+        self._password = bytearray(password.encode())
+        self.kdf = kdf
+        self.max_cached = max_cached
+        self.process_pool_threshold = process_pool_threshold
+
+        self._legacy_key = Fernet(urlsafe_b64encode(md5(bytes(self._password)).hexdigest().encode()))
+        self._scrypt_keys: Dict[bytes, Fernet] = {}
+        self._salt: Optional[bytes] = None
+        self._cache: "OrderedDict[str, bytearray]" = OrderedDict()
+
+    def _scrypt_key(self, salt: bytes) -> Fernet:
+        """Fernet ключ из scrypt (считается один раз на соль)"""
+        key = self._scrypt_keys.get(salt)
+        if key is None:
+            raw = scrypt(bytes(self._password), salt=salt, dklen=32, **SCRYPT_PARAMS)
+            key = Fernet(urlsafe_b64encode(raw))
+            self._scrypt_keys[salt] = key
+        return key
+
+    def encrypt(self, plaintext: str) -> str:
+        """Зашифровать ключ текущей версией формата"""
+        if self.kdf == "md5":
+            return self._legacy_key.encrypt(plaintext.encode()).decode()
+
+        # Одна соль на хранилище - scrypt считается один раз
+        if self._salt is None:
+            self._salt = urandom(16)
+        token = self._scrypt_key(self._salt).encrypt(plaintext.encode()).decode()
+        return f"{VERSION_PREFIX}{urlsafe_b64encode(self._salt).decode()}${token}"
+
+    def _decrypt_token(self, token: str) -> str:
+        """Расшифровать токен без кэша"""
+        if token.startswith(VERSION_PREFIX):
+            salt, fernet_token = token[len(VERSION_PREFIX):].split('$', 1)
+            return self._scrypt_key(urlsafe_b64decode(salt)).decrypt(fernet_token).decode()
+        return self._legacy_key.decrypt(token).decode()
+
+    def _remember(self, token: str, plaintext: str):
+        """Положить результат в LRU кэш"""
+        self._cache[token] = bytearray(plaintext.encode())
+        if len(self._cache) > self.max_cached:
+            _, evicted = self._cache.popitem(last=False)
+            evicted[:] = bytes(len(evicted))
+
+    def decrypt(self, token: str) -> str:
+        """Расшифровать ключ (с кэшем)"""
+        cached = self._cache.get(token)
+        if cached is not None:
+            self._cache.move_to_end(token)
+            return cached.decode()
+
+        plaintext = self._decrypt_token(token)
+        self._remember(token, plaintext)
+        return plaintext
+
+    def decrypt_many(self, tokens: Iterable[str]) -> Dict[str, str]:
+        """Расшифровать пачку ключей, большие пачки - в пуле процессов"""
+        unique = list(dict.fromkeys(tokens))
+        missing = [token for token in unique if token not in self._cache]
+
+        if self.process_pool_threshold and len(missing) >= self.process_pool_threshold:
+            chunk_size = max(1, len(missing) // 8)
+            chunks = [missing[i:i + chunk_size] for i in range(0, len(missing), chunk_size)]
+
+            with ProcessPoolExecutor() as executor:
+                results = executor.map(_decrypt_chunk, [bytes(self._password)] * len(chunks), chunks)
+                for chunk, plaintexts in zip(chunks, results):
+                    for token, plaintext in zip(chunk, plaintexts):
+                        self._remember(token, plaintext)
+        else:
+            for token in missing:
+                self._remember(token, self._decrypt_token(token))
+
+        return {token: self.decrypt(token) for token in unique}
+
+    def check(self, token: str):
+        """Проверить пароль на токене. InvalidToken - пароль неверный"""
+        self.decrypt(token)
+
+    def close(self):
+        """Затереть пароль и расшифрованные ключи в памяти"""
+        for plaintext in self._cache.values():
+            plaintext[:] = bytes(len(plaintext))
+        self._cache.clear()
+
+        self._password[:] = bytes(len(self._password))
+        self._scrypt_keys.clear()
+
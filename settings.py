@@ -5,6 +5,24 @@
 SHUFFLE_WALLETS = True  # Перемешивать кошельки в очереди
 RETRY = 3               # Количество повторов при ошибках
 THREADS = 1             # Количество одновременно работающих аккаунтов
+PROCESSES = 1           # Процессов для аккаунтов (шарды по адресу, THREADS делятся между ними, не больше THREADS), --processes N
+DB_BACKEND = "sqlite"   # Хранилище базы: sqlite / json / memory
+
+REPORT_JOURNAL = {
+    "enable": True,         # Писать отчёты в append-only журнал (databases/reports.jsonl)
+    "fsync_interval": 1.0,  # Секунд между fsync журнала
+}
+
+CHECKPOINTS = {
+    "enable": True,         # Чекпоинты модулей для восстановления после падения (databases/checkpoints.jsonl)
+    "fsync_interval": 0.2,  # Секунд между fsync журнала
+}
+
+VAULT_SETTINGS = {
+    "kdf": "scrypt",                   # Шифрование новых баз: scrypt / md5 (старый формат)
+    "max_cached": 100_000,             # Макс. расшифрованных ключей в памяти
+    "process_pool_threshold": 50_000,  # С какого количества ключей расшифровывать в пуле процессов
+}
 
 # ============================================
 # 💰 ТОКЕНЫ ДЛЯ ТОРГОВЛИ
@@ -86,6 +104,9 @@ CANCEL_ORDERS = {
 PAIR_SETTINGS = {
     "pair_amount": [3, 3],      # Аккаунтов в паре
     "position_hold": [40, 120], # Секунд держать позицию
+    "max_leg_skew": 0.5,        # Макс. разброс отправки ног группы, секунд
+    "fill_timeout": 30,         # Секунд ждать исполнения ног, потом добивать дельту маркетом
+    "neutral_tolerance": 1e-8,  # Допустимый остаток дельты (в монетах)
 }
 
 # ============================================
@@ -104,9 +125,147 @@ SLEEP_AFTER_ACC = [10, 30]           # После каждого аккаунт
 TG_BOT_TOKEN = ''    # Токен бота (пусто = отключено)
 TG_USER_ID = []      # ID пользователей [123456, 789012]
 
+TG_SETTINGS = {
+    "flush_interval": 5,        # Секунд копить логи перед отправкой одним сообщением
+    "messages_per_second": 1,   # Лимит сообщений в секунду
+    "max_retries": 5,           # Повторов при ошибках Telegram
+}
+
 # ============================================
 # 🌐 API ETHEREAL
 # ============================================
 
 ETHEREAL_API_URL = "https://api.ethereal.trade"  # Mainnet
 # ETHEREAL_API_URL = "https://api.etherealtest.net"  # Testnet
+
+ETHEREAL_WS_URL = "wss://ws.ethereal.trade/v1/stream"  # Websocket стрим стаканов
+
+# Повторы запросов: экспоненциальная пауза со случайным jitter, 4xx не повторяются
+RETRY_SETTINGS = {
+    "max_retries": 3,   # Попыток на запрос
+    "base_delay": 1,    # Базовая пауза, секунд (1, 2, 4, ... * random)
+    "max_delay": 30,    # Максимальная пауза, секунд
+}
+
+# Общий на endpoint circuit breaker: после серии ошибок запросы сразу падают
+CIRCUIT_BREAKER = {
+    "failure_threshold": 5,  # Ошибок подряд до отключения endpoint
+    "recovery_timeout": 30,  # Секунд до пробного запроса
+}
+
+# Лимиты запросов (token bucket): [запросов в секунду, запас], 0 - без лимита
+RATE_LIMITS = {
+    "global": [30, 60],   # На весь API
+    "proxy": [10, 20],    # На один прокси
+    "account": [5, 10],   # На один аккаунт
+    "weights": {          # Стоимость запроса в токенах (по умолчанию 1)
+        "POST /orders": 3,
+        "POST /orders/batch": 10,
+        "POST /orders/cancel": 5,
+        "DELETE /orders/{id}": 2,
+    },
+}
+
+# Массовые операции с ордерами (режим 4, ноги парной торговли)
+BULK_ORDERS = {
+    "cancel_endpoint": "/orders/cancel",  # Batch отмена ("" - только одиночные запросы)
+    "create_endpoint": "/orders/batch",   # Batch создание ("" - только одиночные запросы)
+    "batch_size": 50,                     # Ордеров в одном batch запросе
+    "concurrency": 10,                    # Параллельных запросов, если batch не поддерживается
+}
+
+# ============================================
+# 🔌 ПУЛ СОЕДИНЕНИЙ
+# ============================================
+
+POOL_SETTINGS = {
+    "limit_per_proxy": 5,     # Макс. одновременных соединений через один прокси. Аккаунты без прокси
+                              # делят один лимит: не больше 5 соединений на всех сразу
+    "idle_timeout": 60,       # Секунд до закрытия неиспользуемой сессии
+    "keepalive_timeout": 30,  # Секунд держать keep-alive соединение
+    "verify_ssl": True,       # Проверять сертификаты API (Telegram проверяется всегда)
+}
+
+# ============================================
+# 🗃️ КЭШ РЫНОЧНЫХ ДАННЫХ
+# ============================================
+
+MARKET_CACHE_SETTINGS = {
+    "enable": True,       # Общий кэш цен/стаканов для всех аккаунтов
+    "ttl": 1.0,           # Секунд жизни цены и стакана по умолчанию
+    "tickers_ttl": {      # Свой TTL для отдельных тикеров
+        # "BTCUSD": 0.5,
+    },
+    "products_ttl": 300,  # Секунд жизни списка продуктов
+}
+
+# ============================================
+# 📡 WEBSOCKET СТРИМ СТАКАНОВ (Режимы 2, 3)
+# ============================================
+
+STREAM_SETTINGS = {
+    "enable": False,  # Читать цены и стаканы из websocket вместо REST
+    "max_age": 5,     # Секунд без обновлений, после которых стакан считается устаревшим
+}
+
+# ============================================
+# 🔔 ОТСЛЕЖИВАНИЕ ОРДЕРОВ
+# ============================================
+
+ORDER_TRACKER_SETTINGS = {
+    "poll_interval": 2,     # Секунд между запросами открытых ордеров аккаунта
+    "user_stream": False,   # Получать статусы ордеров из приватного websocket (опрос - запасной путь)
+}
+
+# ============================================
+# 📊 СТАТИСТИКА (Режим 5)
+# ============================================
+
+STATS_SETTINGS = {
+    "page_size": 100,                     # Сделок за один запрос
+    "csv_file": "databases/stats.csv",    # Снимок агрегатов всех аккаунтов
+    "snapshot_file": "databases/portfolio.npz",  # Снимок портфеля для сравнения запусков
+    "positions": False,                   # Запрашивать позиции (+1 запрос на аккаунт) для экспозиции
+    "top_exposures": 5,                   # Аккаунтов с наибольшей экспозицией в сводке
+}
+
+# ============================================
+# ⚖️ МОНИТОР ДЕЛЬТЫ
+# ============================================
+
+DELTA_MONITOR_SETTINGS = {
+    "enable": False,          # HTTP сервер с живой дельтой (/delta и /metrics)
+    "host": "127.0.0.1",
+    "port": 8686,
+    "thresholds": {           # Порог дисбаланса по тикеру, в монетах
+        # "BTCUSD": 0.001,
+    },
+    "default_threshold": 0,   # Порог для остальных тикеров (0 - не проверять)
+    "action": "alert",        # "alert" - лог + Telegram, "hedge" - ещё и выровнять группу маркет ордером
+    "hedge_delay": 45,        # Секунд дисбаланс должен держаться до авто-хеджа (больше fill_timeout)
+    "hedge_cooldown": 30,     # Секунд между авто-хеджами одной группы по тикеру
+    "poll_interval": 10,      # Секунд между опросами позиций работающей группы (0 - не опрашивать)
+}
+
+# ============================================
+# 📈 МЕТРИКИ
+# ============================================
+
+METRICS_SETTINGS = {
+    "enable": False,          # HTTP /metrics в формате Prometheus
+    "host": "127.0.0.1",
+    "port": 8687,
+    "summary_interval": 300,  # Секунд между сводками метрик в логе (0 - выключено)
+}
+
+# ============================================
+# 🖧 РАСПРЕДЕЛЁННЫЙ ЗАПУСК
+# ============================================
+
+DISTRIBUTED_SETTINGS = {
+    "enable": False,                # Этот запуск - координатор: раздаёт модули воркерам (python main.py worker)
+    "address": "127.0.0.1:8790",    # host:port или unix:/path/to.sock
+    "token": "",                    # Общий секрет координатора и воркеров, обязателен (см. README)
+    "lease_ttl": 60,                # Секунд без heartbeat, после которых задача уходит другому воркеру
+    "heartbeat": 15,                # Секунд между heartbeat'ами воркера
+}
@@ -0,0 +1,126 @@
+"""
+Координатор на unix сокете и несколько процессов-воркеров на одной машине.
+Файл же - точка входа воркера: python tests/test_distributed.py ADDRESS NAME LOG
+"""
+from collections import Counter, defaultdict
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN = "test-token"
+JOBS = 30
+ADDRESSES = 6
+
+
+class FakeDataBase:
+    def __init__(self):
+        self.removed = []
+
+    async def remove_module(self, module_data: dict):
+        self.removed.append(module_data["id"])
+
+
+def _record(log: str, *event):
+    with open(log, "a") as f:
+        f.write(json.dumps([*event, time.time()]) + "\n")
+
+
+async def _worker(address: str, name: str, log: str):
+    from modules.distributed import Connection, RemoteDataBase, Worker
+
+    connection = Connection(address, name, token=TOKEN)
+    await connection.connect()
+    db = RemoteDataBase(connection)
+
+    async def module(module_data: dict, mode: int):
+        _record(log, "start", module_data["id"], module_data["address"], name)
+        await asyncio.sleep(random.uniform(0.05, 0.15))
+        _record(log, "end", module_data["id"], module_data["address"], name)
+        await db.remove_module(module_data=module_data)
+
+    try:
+        await Worker(connection, {"module": module}, concurrency=2, heartbeat=0.5, wait_interval=0.05).run()
+    finally:
+        await connection.close()
+
+
+def _read_log(log: str):
+    if not os.path.exists(log):
+        return []
+    with open(log) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def _run(tmp_path):
+    from modules.distributed import Coordinator
+
+    address = f"unix:{tmp_path / 'coordinator.sock'}"
+    log = str(tmp_path / "events.jsonl")
+
+    db = FakeDataBase()
+    coordinator = Coordinator(db, address, token=TOKEN, lease_ttl=2, mode=1)
+    for job_id in range(JOBS):
+        job_address = f"0x{job_id % ADDRESSES:040x}"
+        coordinator.submit([job_address], "module", module_data={"id": job_id, "address": job_address}, mode=1)
+    await coordinator.start()
+    serve = asyncio.create_task(coordinator.serve())
+
+    def spawn(name: str):
+        return asyncio.create_subprocess_exec(sys.executable, os.path.abspath(__file__), address, name, log, cwd=ROOT)
+
+    # w0 убивается посреди первой задачи: его аренда держит адрес до lease_ttl
+    workers = {"w0": await spawn("w0")}
+    killed_at = None
+    for _ in range(500):
+        if any(event[0] == "start" for event in _read_log(log)):
+            workers["w0"].kill()
+            killed_at = time.time()
+            break
+        await asyncio.sleep(0.01)
+
+    for name in ("w1", "w2"):
+        workers[name] = await spawn(name)
+
+    await asyncio.wait_for(serve, timeout=60)
+    for process in workers.values():
+        await asyncio.wait_for(process.wait(), timeout=10)
+    return db, coordinator, _read_log(log), killed_at
+
+
+def test_jobs_complete_once_without_address_overlap(tmp_path):
+    db, coordinator, events, killed_at = asyncio.run(_run(tmp_path))
+    assert killed_at is not None
+
+    # Каждая задача завершена ровно один раз
+    ended = Counter(event[1] for event in events if event[0] == "end")
+    assert sorted(ended) == list(range(JOBS))
+    assert set(ended.values()) == {1}
+    assert sorted(db.removed) == list(range(JOBS))
+    assert coordinator.completed == JOBS
+
+    # Интервалы одного адреса не пересекаются; задача убитого воркера - до момента kill
+    intervals = defaultdict(list)
+    started = {}
+    for kind, job_id, job_address, name, at in events:
+        if kind == "start":
+            started[(job_id, name)] = at
+        else:
+            intervals[job_address].append((started.pop((job_id, name)), at))
+    assert started and coordinator.expired == len(started)
+    for (job_id, name), at in started.items():
+        assert name == "w0"
+        intervals[f"0x{job_id % ADDRESSES:040x}"].append((at, killed_at))
+
+    for job_address, spans in intervals.items():
+        spans.sort()
+        for (_, previous_end), (next_start, _) in zip(spans, spans[1:]):
+            assert next_start >= previous_end, f"{job_address} ran concurrently"
+
+
+if __name__ == "__main__":
+    sys.path.insert(0, ROOT)
+    asyncio.run(_worker(*sys.argv[1:4]))
@@ -0,0 +1,28 @@
+"""
+Бюджет холодного импорта (modules.importtime): каждый модуль меряется в чистом процессе.
+"""
+import subprocess
+import sys
+
+import pytest
+
+from modules.importtime import IMPORT_BUDGETS, ROOT, check
+
+HEAVY = ("aiohttp", "cryptography", "numpy", "inquirer")
+
+
+@pytest.mark.parametrize("module", list(IMPORT_BUDGETS))
+def test_import_within_budget(module):
+    seconds, budget = check({module: IMPORT_BUDGETS[module]}, runs=3)[module]
+    assert seconds > 0, f"{module} not found in -X importtime output"
+    assert seconds <= budget, f"{module} imports in {seconds * 1000:.1f} ms, budget {budget * 1000:.0f} ms"
+
+
+@pytest.mark.parametrize("module", ["modules", "cli"])
+def test_light_imports_skip_heavy_dependencies(module):
+    result = subprocess.run(
+        [sys.executable, "-c", f"import sys, {module}; print(' '.join(sys.modules))"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    loaded = set(result.stdout.split())
+    assert not loaded & set(HEAVY), f"{module} pulls {sorted(loaded & set(HEAVY))}"
@@ -0,0 +1,144 @@
+"""
+Арифметика хеджа LegExecutor на фейковом браузере и трекере ордеров.
+"""
+from itertools import count
+import asyncio
+
+import pytest
+
+import modules.legs as legs_module
+from modules.legs import Leg, LegExecutor
+from modules.models import Order
+
+_ids = count(1)
+EVENTS = []
+
+
+class FakeBrowser:
+    def __init__(self, status_error: bool = False, create_error: bool = False):
+        self.session = object()
+        self.status_error = status_error
+        self.create_error = create_error
+        self.created = []
+        self.canceled = []
+        self.final = {}
+
+    async def initialize(self):
+        pass
+
+    async def create_order(self, order_data: dict) -> Order:
+        if self.create_error:
+            self.create_error = False
+            raise RuntimeError("API Error 400: insufficient margin")
+        self.created.append(order_data)
+        EVENTS.append(("order", order_data["type"]))
+        return Order(f"o{next(_ids)}", symbol=order_data["ticker"])
+
+    async def cancel_order(self, order_id: str, ticker: str):
+        self.canceled.append(order_id)
+
+    async def get_order_status(self, order_id: str, ticker: str) -> Order:
+        if self.status_error:
+            raise RuntimeError("API Error 503")
+        return self.final[order_id]
+
+
+class FakeClient:
+    def __init__(self, browser: FakeBrowser):
+        self.browser = browser
+
+
+class FakeTracker:
+    """
+    fills: порядковый номер ноги -> (задержка, исполнено, статус).
+    status None - за fill_timeout не исполнилась, wait_filled вернёт None
+    """
+
+    def __init__(self, fills: dict):
+        self.fills = fills
+        self.orders = {}
+        self.resolved = []
+
+    def track(self, browser: FakeBrowser, order: Order):
+        self.orders[order.order_id] = (browser, len(self.orders))
+
+    async def wait_filled(self, order_id: str, timeout: float = None):
+        browser, index = self.orders[order_id]
+        delay, filled, status = self.fills[index]
+        browser.final[order_id] = Order(order_id, status=status or "CANCELED", executed_qty=filled)
+        await asyncio.sleep(delay)
+        self.resolved.append(index)
+        EVENTS.append(("resolved", index))
+        if status is None:
+            return None
+        return Order(order_id, status=status, executed_qty=filled)
+
+
+def _run(monkeypatch, orders, fills, status_error=False, failed_leg=None):
+    EVENTS.clear()
+    tracker = FakeTracker(fills)
+    monkeypatch.setattr(legs_module, "ORDER_TRACKER", tracker)
+    browsers = [
+        FakeBrowser(status_error=status_error, create_error=index == failed_leg)
+        for index in range(len(orders))
+    ]
+    legs = [Leg(FakeClient(browser), order_data) for browser, order_data in zip(browsers, orders)]
+    executor = LegExecutor(max_skew=1, fill_timeout=1)
+    result = asyncio.run(executor.execute(legs))
+    # Ордера после исходной ноги - хеджи/добор (у упавшей ноги исходного ордера нет)
+    return result, [
+        browser.created[int(index != failed_leg):] for index, browser in enumerate(browsers)
+    ], tracker
+
+
+def _order(side: int, quantity: float, ticker: str = "BTC") -> dict:
+    return {"type": "LIMIT", "side": side, "quantity": quantity, "ticker": ticker}
+
+
+def test_final_partial_fill_is_topped_up_before_other_legs_finish(monkeypatch):
+    result, hedges, _ = _run(
+        monkeypatch,
+        [_order(0, 1.0), _order(1, 1.0)],
+        {0: (0.0, 0.6, "CANCELED"), 1: (0.2, 1.0, "FILLED")},
+    )
+    assert hedges[0] == [{"type": "MARKET", "quantity": pytest.approx(0.4), "side": 0, "ticker": "BTC"}]
+    assert hedges[1] == []
+    assert EVENTS[2:] == [("resolved", 0), ("order", "MARKET"), ("resolved", 1)]
+    assert result["neutral"] and result["net_deltas"] == {"BTC": pytest.approx(0.0)}
+
+
+def test_residual_is_hedged_per_ticker(monkeypatch):
+    # BTC: шорт исполнился на 0.7 после таймаута - добираем его; ETH нейтрален
+    result, hedges, _ = _run(
+        monkeypatch,
+        [_order(0, 1.0), _order(1, 1.0), _order(0, 2.0, "ETH"), _order(1, 2.0, "ETH")],
+        {0: (0.0, 1.0, "FILLED"), 1: (0.0, 0.7, None), 2: (0.0, 2.0, "FILLED"), 3: (0.0, 2.0, "FILLED")},
+    )
+    assert hedges[1] == [{"type": "MARKET", "quantity": pytest.approx(0.3), "side": 1, "ticker": "BTC"}]
+    assert hedges[0] == hedges[2] == hedges[3] == []
+    assert result["neutral"]
+
+
+def test_overfilled_side_is_reduced_when_deficit_leg_failed(monkeypatch):
+    # Шорт не отправился: добирать некому, лонг уменьшается на весь объём
+    result, hedges, _ = _run(
+        monkeypatch,
+        [_order(0, 1.0), _order(1, 1.0)],
+        {0: (0.0, 1.0, "FILLED")},
+        failed_leg=1,
+    )
+    assert hedges[0] == [{"type": "MARKET", "quantity": pytest.approx(1.0), "side": 1, "ticker": "BTC"}]
+    assert hedges[1] == []
+    assert result["neutral"] and result["failed_legs"] == 1
+
+
+def test_unknown_fill_is_not_hedged(monkeypatch):
+    result, hedges, _ = _run(
+        monkeypatch,
+        [_order(0, 1.0), _order(1, 1.0)],
+        {0: (0.0, 1.0, "FILLED"), 1: (0.0, 1.0, None)},
+        status_error=True,
+    )
+    assert hedges == [[], []]
+    assert not result["neutral"]
+    assert result["unknown_legs"] == 1
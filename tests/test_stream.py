@@ -0,0 +1,145 @@
+"""
+MarketStream против локального websocket сервера (aiohttp.web): снапшот и
+дельты, resync по пропуску seq и переход Browser на REST по max_age.
+"""
+from decimal import Decimal
+from time import monotonic
+import asyncio
+
+from aiohttp import web
+
+from modules.browser import Browser
+from modules.pool import SESSION_POOL
+from modules.stream import get_live_book, start_market_stream, stop_market_stream
+
+TICKER = "BTCUSD"
+
+
+class FakeExchange:
+    """ws /v1/stream: подписки записываются, сообщения шлёт тест. GET /orderbooks - REST стакан"""
+
+    def __init__(self):
+        self.subscribes = []
+        self.sockets = []
+        self.rest_calls = 0
+        self.runner = None
+        self.url = None
+
+    async def stream(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.sockets.append(ws)
+        async for msg in ws:
+            message = msg.json()
+            if message.get("type") == "subscribe":
+                self.subscribes.append(message["ticker"])
+        return ws
+
+    async def orderbook(self, request: web.Request) -> web.Response:
+        self.rest_calls += 1
+        return web.json_response({"bids": [["90", "1"]], "asks": [["91", "1"]]})
+
+    async def send(self, **message):
+        await self.sockets[-1].send_json({"ticker": TICKER, **message})
+
+    async def __aenter__(self) -> "FakeExchange":
+        app = web.Application()
+        app.router.add_get("/v1/stream", self.stream)
+        app.router.add_get(f"/orderbooks/{TICKER}", self.orderbook)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}"
+        return self
+
+    async def __aexit__(self, *exc):
+        await stop_market_stream()
+        await SESSION_POOL.close_all()
+        await self.runner.shutdown()
+        await self.runner.cleanup()
+
+
+async def _wait_until(condition, timeout: float = 2.0):
+    deadline = monotonic() + timeout
+    while not condition():
+        assert monotonic() < deadline, "condition not met in time"
+        await asyncio.sleep(0.01)
+
+
+async def _connected(exchange: FakeExchange, max_age: float = 5.0):
+    stream = await start_market_stream(
+        url=exchange.url.replace("http", "ws") + "/v1/stream",
+        tickers=[TICKER],
+        max_age=max_age,
+    )
+    await _wait_until(lambda: exchange.subscribes)
+    return stream
+
+
+def test_snapshot_and_deltas_build_the_book():
+    async def run():
+        async with FakeExchange() as exchange:
+            await _connected(exchange)
+            await exchange.send(type="snapshot", seq=1, bids=[["100", "1"], ["99", "2"]], asks=[["101", "1"]])
+            await _wait_until(lambda: get_live_book(TICKER) is not None)
+
+            # Уровень 100 удалён, 101 сменился на 100.5
+            await exchange.send(type="delta", seq=2, bids=[["100", "0"]], asks=[["101", "0"], ["100.5", "3"]])
+            await _wait_until(lambda: get_live_book(TICKER).seq == 2)
+            book = get_live_book(TICKER)
+            return book.best_bid(), book.best_ask(), book.mid_price()
+
+    assert asyncio.run(run()) == (Decimal("99"), Decimal("100.5"), Decimal("99.75"))
+
+
+def test_sequence_gap_resubscribes_once_and_waits_for_snapshot():
+    async def run():
+        async with FakeExchange() as exchange:
+            stream = await _connected(exchange)
+            await exchange.send(type="snapshot", seq=1, bids=[["100", "1"]], asks=[["101", "1"]])
+            await _wait_until(lambda: get_live_book(TICKER) is not None)
+
+            # seq 3 после 1: стакан не живой, снапшот запрошен один раз, следующие дельты отброшены
+            for seq in (3, 4, 5):
+                await exchange.send(type="delta", seq=seq, bids=[["100", "9"]], asks=[])
+            await _wait_until(lambda: len(exchange.subscribes) == 2)
+            await asyncio.sleep(0.1)
+            stale = get_live_book(TICKER)
+
+            await exchange.send(type="snapshot", seq=10, bids=[["98", "1"]], asks=[["99", "1"]])
+            await _wait_until(lambda: get_live_book(TICKER) is not None)
+            await exchange.send(type="delta", seq=11, bids=[["98.5", "1"]], asks=[])
+            await _wait_until(lambda: get_live_book(TICKER).seq == 11)
+            return stale, exchange.subscribes, stream.resyncs, get_live_book(TICKER).best_bid()
+
+    stale, subscribes, resyncs, best_bid = asyncio.run(run())
+    assert stale is None
+    assert subscribes == [TICKER, TICKER]
+    assert resyncs == 1
+    assert best_bid == Decimal("98.5")
+
+
+def test_stale_book_falls_back_to_rest():
+    async def run():
+        async with FakeExchange() as exchange:
+            await _connected(exchange, max_age=0.2)
+            await exchange.send(type="snapshot", seq=1, bids=[["100", "1"]], asks=[["101", "1"]])
+            await _wait_until(lambda: get_live_book(TICKER) is not None)
+
+            browser = Browser(private_key="", label="test", base_url=exchange.url)
+            live = await browser.get_order_book(TICKER)
+            calls_while_live = exchange.rest_calls
+
+            # Стрим молчит дольше max_age - стакан устарел, Browser идёт в REST
+            await asyncio.sleep(0.3)
+            stale = await browser.get_order_book(TICKER)
+            await browser.close_sessions()
+            return live, calls_while_live, stale, exchange.rest_calls
+
+    live, calls_while_live, stale, rest_calls = asyncio.run(run())
+    assert (live.bid, live.ask) == (Decimal("100"), Decimal("101"))
+    assert calls_while_live == 0
+    assert (stale.bid, stale.ask) == (Decimal("90"), Decimal("91"))
+    assert rest_calls == 1
@@ -0,0 +1,104 @@
+"""
+TgReport против локального stub сервера Telegram Bot API (aiohttp.web).
+"""
+from time import monotonic
+import asyncio
+
+from aiohttp import web
+
+from modules.ratelimit import TokenBucket
+from modules.utils.logging import TgReport
+
+TOKEN = "123:test"
+
+
+class StubTelegram:
+    """sendMessage: записывает сообщения, первые rate_limited ответов - 429"""
+
+    def __init__(self, rate_limited: int = 0, retry_after: float = 0.1):
+        self.rate_limited = rate_limited
+        self.retry_after = retry_after
+        self.requests = []
+        self.delivered = []
+        self.runner = None
+        self.url = None
+
+    async def send_message(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        self.requests.append((monotonic(), payload))
+        if self.rate_limited:
+            self.rate_limited -= 1
+            return web.json_response(
+                {"ok": False, "parameters": {"retry_after": self.retry_after}},
+                status=429,
+            )
+        self.delivered.append((monotonic(), payload))
+        return web.json_response({"ok": True})
+
+    async def __aenter__(self) -> "StubTelegram":
+        app = web.Application()
+        app.router.add_post(f"/bot{TOKEN}/sendMessage", self.send_message)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self.runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}"
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.runner.cleanup()
+
+
+def _report(url: str, user_ids=(1,), flush_interval: float = 0.2, rate: float = 100) -> TgReport:
+    report = TgReport(api_url=url)
+    report.bot_token = TOKEN
+    report.user_ids = list(user_ids)
+    report.flush_interval = flush_interval
+    report.max_retries = 3
+    report.bucket = TokenBucket(rate=rate, capacity=1)
+    return report
+
+
+def test_logs_within_flush_interval_are_sent_as_one_message():
+    async def run():
+        async with StubTelegram() as stub:
+            report = _report(stub.url)
+            for text in ("first", "second", "third"):
+                await report.send_log(text)
+            await report.send_log("No actions")
+            await report.close()
+            return stub
+
+    stub = asyncio.run(run())
+    assert [payload["text"] for _, payload in stub.delivered] == ["first\n\nsecond\n\nthird"]
+
+
+def test_messages_are_paced_by_token_bucket():
+    async def run():
+        async with StubTelegram() as stub:
+            # Одно сообщение на трёх пользователей - три запроса через bucket 5/с
+            report = _report(stub.url, user_ids=(1, 2, 3), flush_interval=0.01, rate=5)
+            await report.send_log("paced")
+            await report.close()
+            return stub
+
+    stub = asyncio.run(run())
+    sent = [at for at, _ in stub.delivered]
+    assert [payload["chat_id"] for _, payload in stub.delivered] == [1, 2, 3]
+    gaps = [later - earlier for earlier, later in zip(sent, sent[1:])]
+    assert min(gaps) >= 0.15
+
+
+def test_rate_limited_message_is_retried_after_retry_after():
+    async def run():
+        async with StubTelegram(rate_limited=1, retry_after=0.3) as stub:
+            report = _report(stub.url, flush_interval=0.01)
+            await report.send_log("retry me")
+            await report.close()
+            return stub
+
+    stub = asyncio.run(run())
+    assert len(stub.requests) == 2
+    assert [payload["text"] for _, payload in stub.delivered] == ["retry me"]
+    assert stub.requests[1][0] - stub.requests[0][0] >= 0.25